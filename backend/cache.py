@@ -1,79 +1,344 @@
 from functools import wraps
 import json
-from typing import Any, Callable, Optional, TypeVar, cast
-from redis import Redis
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple, TypeVar, Union, cast
+from redis.asyncio import ConnectionPool, Redis
 from datetime import timedelta
+import asyncio
+import inspect
+import logging
 import os
+import time
+
+from services.cache_analytics import cache_analytics
+from services.popularity import request_popularity
+from services.cache_lock import RecomputeLock, RECOMPUTE_SUFFIX, should_refresh_early, wait_for_value
+from services.cache_tags import add_tags, pop_tagged_keys
+
+logger = logging.getLogger(__name__)
 
 # Type variables for better type hints
 T = TypeVar('T', bound=Callable[..., Any])
 
+# Freshness of a value returned by get_or_revalidate
+FRESH = 'fresh'
+STALE = 'stale'
+MISS = 'miss'
+
 class RedisCache:
-    def __init__(self):
-        self.redis = Redis.from_url(
-            os.getenv('REDIS_CACHE_URL', 'redis://redis-cache:6379/1'),
-            decode_responses=True
-        )
+    def __init__(self, url: Optional[str] = None, max_connections: int = 50):
+        self.url = url or os.getenv('REDIS_CACHE_URL', 'redis://redis-cache:6379/1')
+        self.max_connections = int(os.getenv('REDIS_CACHE_MAX_CONNECTIONS', max_connections))
         self.default_timeout = timedelta(minutes=30)
+        self.lock_timeout = float(os.getenv('CACHE_LOCK_TIMEOUT', '30'))
+        self.lock_wait_timeout = float(os.getenv('CACHE_LOCK_WAIT_TIMEOUT', '10'))
+        self.refresh_beta = float(os.getenv('CACHE_EARLY_REFRESH_BETA', '1.0'))
+        self._redis: Optional[Redis] = None
+        # Strong references to in-flight background refreshes
+        self._refreshes: Set[asyncio.Task] = set()
+
+    @property
+    def redis(self) -> Redis:
+        """Async client over a shared connection pool, created on first use"""
+        if self._redis is None:
+            pool = ConnectionPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                decode_responses=True
+            )
+            self._redis = Redis(connection_pool=pool)
+        return self._redis
 
     def cached(
         self,
-        timeout: Optional[int] = None,
+        timeout: Optional[Union[int, Callable[..., Any]]] = None,
         key_prefix: str = '',
-        unless: Optional[Callable[..., bool]] = None
+        unless: Optional[Callable[..., bool]] = None,
+        tags: Optional[Callable[..., Iterable[str]]] = None,
+        exclude: Iterable[str] = ('db', 'request')
     ) -> Callable[[T], T]:
+        """Cache an async function's result
+
+        tags, if given, is called as tags(result, *args, **kwargs) and returns
+        the tags to register the entry under (see invalidate). timeout may be a
+        function (sync or async) called as timeout(cache_key, *args, **kwargs)
+        when the value is stored, returning the TTL in seconds. Keyword
+        arguments named in exclude, such as injected sessions and requests,
+        are left out of the cache key.
+        """
+        exclude = frozenset(exclude)
         def decorator(f: T) -> T:
             @wraps(f)
             async def wrapper(*args: Any, **kwargs: Any) -> Any:
                 if unless and unless(*args, **kwargs):
                     return await f(*args, **kwargs)
 
-                cache_key = self._make_cache_key(f, key_prefix, args, kwargs)
-                cached_value = self.redis.get(cache_key)
+                cache_key = self._make_cache_key(f, key_prefix, args, kwargs, exclude)
+                request_popularity.add(cache_key)
+                cache_timeout = timeout if timeout is not None else self.default_timeout
+
+                started = time.perf_counter()
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    cached_value, ttl_ms, recompute_ms = await (
+                        pipe.get(cache_key).pttl(cache_key).get(f"{cache_key}{RECOMPUTE_SUFFIX}").execute()
+                    )
+                self._record_lookup(cache_key, cached_value, time.perf_counter() - started, ttl_ms)
+                refresh = cached_value is not None and should_refresh_early(
+                    ttl_ms / 1000, int(recompute_ms or 0) / 1000, self.refresh_beta
+                )
+                if cached_value is not None and not refresh:
+                    return json.loads(cached_value)
+
+                # One worker recomputes; the rest serve the current value or wait for the new one
+                lock = RecomputeLock(self.redis, cache_key, self.lock_timeout)
+                if await lock.acquire():
+                    try:
+                        return await self._recompute(f, args, kwargs, cache_key, cache_timeout, tags)
+                    finally:
+                        await lock.release()
 
                 if cached_value is not None:
                     return json.loads(cached_value)
 
-                value = await f(*args, **kwargs)
-                cache_timeout = timeout if timeout is not None else self.default_timeout
-                self.redis.setex(
-                    cache_key,
-                    cache_timeout,
-                    json.dumps(value)
-                )
-                return value
+                value = await wait_for_value(lambda: self.get(cache_key), self.lock_wait_timeout)
+                if value is not None:
+                    return value
+                return await self._recompute(f, args, kwargs, cache_key, cache_timeout, tags)
 
             return cast(T, wrapper)
         return decorator
 
+    async def _recompute(
+        self,
+        f: Callable[..., Any],
+        args: tuple[Any, ...],
+        kwargs: dict[str, Any],
+        cache_key: str,
+        cache_timeout: Union[int, timedelta, Callable[..., Any]],
+        tags: Optional[Callable[..., Iterable[str]]] = None
+    ) -> Any:
+        started = time.monotonic()
+        value = await f(*args, **kwargs)
+        recompute_ms = int((time.monotonic() - started) * 1000)
+        if callable(cache_timeout):
+            cache_timeout = cache_timeout(cache_key, *args, **kwargs)
+            if inspect.isawaitable(cache_timeout):
+                cache_timeout = await cache_timeout
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.setex(cache_key, cache_timeout, self._encode(cache_key, value))
+            pipe.setex(f"{cache_key}{RECOMPUTE_SUFFIX}", cache_timeout, recompute_ms)
+            if tags:
+                add_tags(pipe, cache_key, tags(value, *args, **kwargs), self._seconds(cache_timeout))
+            await pipe.execute()
+        return value
+
+    async def get_or_revalidate(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        soft_ttl: int,
+        hard_ttl: int,
+        tags: Optional[Callable[[Any], Iterable[str]]] = None
+    ) -> Tuple[Any, str, int]:
+        """Stale-while-revalidate lookup.
+
+        Values younger than soft_ttl are served as fresh. Between soft_ttl and
+        hard_ttl (the Redis expiry) they are served as stale while one worker
+        cluster-wide refreshes them in the background. Past hard_ttl the caller
+        waits for fetch. Returns (value, freshness, age in seconds).
+        """
+        envelope = await self.get(key)
+        if envelope is not None:
+            age = max(int(time.time() - envelope['stored_at']), 0)
+            if age < soft_ttl:
+                return envelope['value'], FRESH, age
+            lock = RecomputeLock(self.redis, key, self.lock_timeout)
+            if await lock.acquire():
+                task = asyncio.create_task(self._revalidate(key, fetch, hard_ttl, tags, lock))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+            return envelope['value'], STALE, age
+
+        lock = RecomputeLock(self.redis, key, self.lock_timeout)
+        if await lock.acquire():
+            try:
+                return await self.set_fresh(key, await fetch(), hard_ttl, tags), MISS, 0
+            finally:
+                await lock.release()
+
+        envelope = await wait_for_value(lambda: self.get(key), self.lock_wait_timeout)
+        if envelope is not None:
+            return envelope['value'], FRESH, max(int(time.time() - envelope['stored_at']), 0)
+        return await self.set_fresh(key, await fetch(), hard_ttl, tags), MISS, 0
+
+    async def _revalidate(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        hard_ttl: int,
+        tags: Optional[Callable[[Any], Iterable[str]]],
+        lock: RecomputeLock
+    ) -> None:
+        try:
+            await self.set_fresh(key, await fetch(), hard_ttl, tags)
+        except Exception as e:
+            # The stale value keeps being served until hard_ttl; the next request retries
+            logger.error(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            await lock.release()
+
+    async def get_age(self, key: str) -> Optional[float]:
+        """Seconds since a get_or_revalidate value was stored, or None if absent."""
+        envelope = await self.get(key)
+        return max(time.time() - envelope['stored_at'], 0) if envelope is not None else None
+
+    async def set_fresh(
+        self,
+        key: str,
+        value: Any,
+        hard_ttl: int,
+        tags: Optional[Callable[[Any], Iterable[str]]] = None
+    ) -> Any:
+        """Store a value for get_or_revalidate, stamped as fresh."""
+        await self.set(
+            key,
+            {'value': value, 'stored_at': time.time()},
+            expire=hard_ttl,
+            tags=tags(value) if tags else None
+        )
+        return value
+
     def _make_cache_key(
         self,
         f: Callable[..., Any],
         key_prefix: str,
         args: tuple[Any, ...],
-        kwargs: dict[str, Any]
+        kwargs: dict[str, Any],
+        exclude: frozenset[str] = frozenset()
     ) -> str:
         key_parts = [key_prefix] if key_prefix else []
         key_parts.append(f.__module__ or '')
         key_parts.append(f.__name__)
         key_parts.extend(str(arg) for arg in args)
-        key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()))
+        key_parts.extend(f"{k}:{v}" for k, v in sorted(kwargs.items()) if k not in exclude)
         return ':'.join(key_parts)
 
-    def invalidate(self, pattern: str) -> None:
-        """Invalidate all keys matching the pattern."""
-        for key in self.redis.scan_iter(pattern):
-            self.redis.delete(key)
+    @staticmethod
+    def _encode(key: str, value: Any) -> str:
+        data = json.dumps(value)
+        cache_analytics.record_write('redis_cache', key, len(data))
+        return data
+
+    @staticmethod
+    def _record_lookup(key: str, value: Optional[str], latency: float, ttl_ms: int) -> None:
+        cache_analytics.record_lookup(
+            'redis_cache', key, value is not None, latency, ttl_ms / 1000 if value is not None else None
+        )
+
+    async def get(self, key: str) -> Any:
+        """Get a single cached value, or None on a miss."""
+        started = time.perf_counter()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            value, ttl_ms = await pipe.get(key).pttl(key).execute()
+        self._record_lookup(key, value, time.perf_counter() - started, ttl_ms)
+        return json.loads(value) if value is not None else None
+
+    @staticmethod
+    def _seconds(expire: Union[int, timedelta]) -> int:
+        return int(expire.total_seconds()) if isinstance(expire, timedelta) else int(expire)
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        expire: Optional[Union[int, timedelta]] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """Cache a single value, optionally registered under tags."""
+        cache_timeout = expire if expire is not None else self.default_timeout
+        if not tags:
+            await self.redis.setex(key, cache_timeout, self._encode(key, value))
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.setex(key, cache_timeout, self._encode(key, value))
+            add_tags(pipe, key, tags, self._seconds(cache_timeout))
+            await pipe.execute()
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Get several cached values in one round trip; misses are omitted."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self.redis.mget(keys)
+        for key, value in zip(keys, values):
+            cache_analytics.record_lookup('redis_cache', key, value is not None)
+        return {
+            key: json.loads(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    async def set_many(
+        self,
+        mapping: Dict[str, Any],
+        expire: Optional[Union[int, timedelta]] = None
+    ) -> None:
+        """Cache several values in one pipelined round trip."""
+        if not mapping:
+            return
+        cache_timeout = expire if expire is not None else self.default_timeout
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.setex(key, cache_timeout, self._encode(key, value))
+            await pipe.execute()
 
-    def get_stats(self) -> dict[str, Any]:
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete several keys in one round trip."""
+        keys = list(keys)
+        if not keys:
+            return 0
+        return await self.redis.unlink(*keys)
+
+    async def invalidate(self, *tags: str, batch_size: int = 500) -> int:
+        """Invalidate every key registered under any of the tags."""
+        keys = await pop_tagged_keys(self.redis, tags)
+        if not keys:
+            return 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start:start + batch_size]
+                pipe.unlink(*batch, *(f"{key}{RECOMPUTE_SUFFIX}" for key in batch))
+            await pipe.execute()
+        return len(keys)
+
+    async def get_version(self, name: str) -> Optional[int]:
+        """Current value of a data version counter, or None if never bumped."""
+        value = await self.redis.get(f"data_version:{name}")
+        return int(value) if value is not None else None
+
+    async def bump_version(self, *names: str) -> None:
+        """Mark data as changed, e.g. so HTTP ETags derived from it change."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.incr(f"data_version:{name}")
+            await pipe.execute()
+
+    async def get_stats(self) -> dict[str, Any]:
         """Get cache statistics."""
-        info = self.redis.info()
+        info = await self.redis.info()
         return {
             'hits': info.get('keyspace_hits', 0),
             'misses': info.get('keyspace_misses', 0),
             'keys': info.get('db1', {}).get('keys', 0),
-            'memory_used': info.get('used_memory_human', '0B')
+            'memory_used': info.get('used_memory_human', '0B'),
+            'prefixes': cache_analytics.snapshot('redis_cache')
         }
 
+    async def close(self) -> None:
+        """Close the client and its connection pool."""
+        if self._redis is not None:
+            await self._redis.close()
+            await self._redis.connection_pool.disconnect()
+            self._redis = None
+
 # Global cache instance
 cache = RedisCache()
@@ -1,6 +1,8 @@
 import os
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy import create_engine, MetaData, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -26,8 +28,9 @@ def wait_for_db(url, max_retries=5, retry_interval=5):
     
     for attempt in range(max_retries):
         try:
-            engine = create_engine(url)
-            engine.connect()
+            engine = create_engine(url, pool_pre_ping=True)
+            with engine.connect():
+                pass
             logger.info("Successfully connected to database!")
             return engine
         except OperationalError as e:
@@ -113,7 +116,12 @@ def parse_db_url(url):
         return None
 
 def get_database_url():
-    """Get database URL with fallback logic."""
+    """Get database engine with fallback logic.
+
+    Internal and external URLs are probed in parallel and the first one to
+    connect wins, so an unreachable internal host no longer delays the
+    external fallback by a full retry cycle.
+    """
     internal_url = os.getenv("INTERNAL_DATABASE_URL")
     external_url = os.getenv("EXTERNAL_DATABASE_URL")
     
@@ -126,38 +134,95 @@ def get_database_url():
     if external_url:
         urls_to_try.append(("external", external_url))
     
+    def probe(url_type, url):
+        parsed = urlparse(url)
+        logger.info(f"Attempting connection using {url_type} URL...")
+        logger.info(f"Connection info ({url_type}):")
+        logger.info(f"User: {parsed.username}")
+        logger.info(f"Host: {parsed.hostname}")
+        logger.info(f"Database: {parsed.path[1:]}")  # Remove leading /
+        return wait_for_db(url)
+    
+    def dispose_late_winner(future):
+        # A slower probe that also connected is not needed any more
+        if not future.cancelled() and future.exception() is None:
+            future.result().dispose()
+    
     last_error = None
-    for url_type, url in urls_to_try:
-        try:
-            logger.info(f"Attempting connection using {url_type} URL...")
-            parsed = urlparse(url)
-            logger.info(f"Connection info ({url_type}):")
-            logger.info(f"User: {parsed.username}")
-            logger.info(f"Host: {parsed.hostname}")
-            logger.info(f"Database: {parsed.path[1:]}")  # Remove leading /
-            engine = wait_for_db(url)
+    executor = ThreadPoolExecutor(max_workers=len(urls_to_try), thread_name_prefix="db-probe")
+    try:
+        futures = {executor.submit(probe, url_type, url): url_type for url_type, url in urls_to_try}
+        for future in as_completed(futures):
+            url_type = futures[future]
+            try:
+                engine = future.result()
+            except Exception as e:
+                last_error = e
+                logger.warning(f"Failed to connect using {url_type} URL: {str(e)}")
+                continue
+            
             logger.info(f"Successfully connected using {url_type} URL")
+            for other in futures:
+                if other is not future:
+                    other.cancel()
+                    other.add_done_callback(dispose_late_winner)
             return engine
-        except Exception as e:
-            last_error = e
-            logger.warning(f"Failed to connect using {url_type} URL: {str(e)}")
+    finally:
+        executor.shutdown(wait=False)
     
     raise last_error
 
-# Create database engine
-try:
-    engine = get_database_url()
-except Exception as e:
-    logger.error(f"Failed to initialize database: {str(e)}")
-    raise
+class LazySessionMaker(sessionmaker):
+    """Session factory that connects the engine on first use"""
+    
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None and "bind" not in local_kw:
+            get_engine()
+        return super().__call__(**local_kw)
+
+_engine = None
+_engine_lock = threading.Lock()
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factory; it is bound once the engine exists
+SessionLocal = LazySessionMaker(autocommit=False, autoflush=False)
 
 # Create base class for declarative models
 Base = declarative_base()
 metadata = MetaData()
 
+def get_engine():
+    """Get the database engine, connecting on first call"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                try:
+                    _engine = get_database_url()
+                except Exception as e:
+                    logger.error(f"Failed to initialize database: {str(e)}")
+                    raise
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def is_engine_ready() -> bool:
+    """Whether the engine has connected, without triggering a connection"""
+    return _engine is not None
+
+def dispose_engine():
+    """Close all pooled connections"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+            SessionLocal.configure(bind=None)
+
+def __getattr__(name):
+    # Keep `database.engine` working without connecting at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 def get_db():
     """Get database session."""
     db = SessionLocal()
@@ -8,6 +8,27 @@ CREATE INDEX IF NOT EXISTS idx_price_history_hotel_id ON price_history(hotel_id)
 CREATE INDEX IF NOT EXISTS idx_hotels_city_price ON hotels(city, price);
 CREATE INDEX IF NOT EXISTS idx_price_history_hotel_date ON price_history(hotel_id, date);
 
+-- Latest-price columns maintained by the ingestion path
+ALTER TABLE hotels ADD COLUMN IF NOT EXISTS current_price_at TIMESTAMP;
+ALTER TABLE hotels ADD COLUMN IF NOT EXISTS current_price_provider VARCHAR;
+ALTER TABLE price_history ADD COLUMN IF NOT EXISTS currency VARCHAR;
+ALTER TABLE price_history ADD COLUMN IF NOT EXISTS provider VARCHAR;
+CREATE INDEX IF NOT EXISTS ix_hotels_city_current_price ON hotels(city, current_price);
+CREATE INDEX IF NOT EXISTS ix_price_history_hotel_timestamp ON price_history(hotel_id, timestamp);
+
+-- Backfill latest prices from existing history
+UPDATE hotels h
+SET current_price = latest.price,
+    current_price_at = latest.timestamp,
+    current_price_provider = latest.provider
+FROM (
+    SELECT DISTINCT ON (hotel_id) hotel_id, price, timestamp, provider
+    FROM price_history
+    ORDER BY hotel_id, timestamp DESC
+) latest
+WHERE h.id = latest.hotel_id
+  AND (h.current_price_at IS NULL OR h.current_price_at < latest.timestamp);
+
 -- Optimize full-text search
 CREATE EXTENSION IF NOT EXISTS pg_trgm;
 CREATE INDEX IF NOT EXISTS idx_hotels_name_trgm ON hotels USING gin(name gin_trgm_ops);
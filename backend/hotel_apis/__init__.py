@@ -1,10 +1,10 @@
 """
 Hotel APIs Package
 """
-from .base import BaseHotelAPI
+from .base import BaseHotelAPI, ProviderError
 from .expedia import ExpediaAPI
 from .booking import BookingAPI
 from .hotels import HotelsComAPI
 from .amadeus import AmadeusAPI
 
-__all__ = ['BaseHotelAPI', 'ExpediaAPI', 'BookingAPI', 'HotelsComAPI', 'AmadeusAPI']
+__all__ = ['BaseHotelAPI', 'ProviderError', 'ExpediaAPI', 'BookingAPI', 'HotelsComAPI', 'AmadeusAPI']
@@ -4,7 +4,7 @@ Amadeus API Integration
 from typing import Dict, List, Optional
 from datetime import datetime
 import requests
-from .base import BaseHotelAPI
+from .base import BaseHotelAPI, ProviderError
 
 class AmadeusAPI(BaseHotelAPI):
     """Amadeus API client implementation"""
@@ -77,7 +77,7 @@ class AmadeusAPI(BaseHotelAPI):
             return self._normalize_hotels(data["data"])
         except Exception as e:
             self.logger.error(f"Error searching hotels: {str(e)}")
-            return []
+            raise ProviderError(str(e)) from e
 
     def get_hotel_details(self, hotel_id: str) -> Optional[Dict]:
         """
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import datetime, timedelta
 from database import get_db
 from services.analytics_service import AnalyticsService
+from services.export_service import PriceExportService, MEDIA_TYPES
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -16,6 +19,31 @@ async def get_price_history(
     analytics = AnalyticsService(db)
     return analytics.get_price_history(hotel_id, days)
 
+@router.get("/export/price-history")
+async def export_price_history(
+    hotel_id: Optional[int] = None,
+    city: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days: Optional[int] = None,
+    format: str = Query("ndjson", enum=list(MEDIA_TYPES))
+):
+    """Stream a bulk price history export as NDJSON, CSV or Arrow IPC"""
+    if hotel_id is None and not city:
+        raise HTTPException(status_code=400, detail="hotel_id or city is required")
+    if days and not start:
+        start = datetime.utcnow() - timedelta(days=days)
+        
+    exporter = PriceExportService()
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        exporter.stream(format, hotel_id=hotel_id, city=city, start=start, end=end),
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="price_history.{extension}"'
+        }
+    )
+
 @router.get("/price-trends/{hotel_id}")
 async def get_price_trends(
     hotel_id: int,
@@ -3,6 +3,10 @@ from typing import List, Dict, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
+class ProviderError(Exception):
+    """A provider call failed, as opposed to succeeding with no results"""
+    pass
+
 class HotelPrice(BaseModel):
     provider: str
     price: float
@@ -1,7 +1,7 @@
 import aiohttp
 from typing import List, Dict, Optional
 from datetime import datetime
-from .base import BaseHotelAPI, HotelPrice
+from .base import BaseHotelAPI, HotelPrice, ProviderError
 import os
 import json
 import logging
@@ -76,8 +76,8 @@ class ExpediaAPI(BaseHotelAPI):
         }
         
         response = await self._make_request("properties/search", "POST", data)
-        if not response:
-            return []
+        if response is None:
+            raise ProviderError("Expedia search request failed")
             
         return [
             {
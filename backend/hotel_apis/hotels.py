@@ -4,7 +4,7 @@ Hotels.com API Integration
 from typing import Dict, List, Optional
 from datetime import datetime
 import requests
-from .base import BaseHotelAPI
+from .base import BaseHotelAPI, ProviderError
 
 class HotelsComAPI(BaseHotelAPI):
     """Hotels.com API client implementation"""
@@ -57,7 +57,7 @@ class HotelsComAPI(BaseHotelAPI):
             return self._normalize_hotels(data["properties"])
         except Exception as e:
             self.logger.error(f"Error searching hotels: {str(e)}")
-            return []
+            raise ProviderError(str(e)) from e
 
     def get_hotel_details(self, hotel_id: str) -> Optional[Dict]:
         """
@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Request, Response, WebSocket, status
 from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.docs import get_swagger_ui_html
+from fastapi.openapi.utils import get_openapi
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, timedelta
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
 import logging
 import json
 import os
@@ -35,12 +38,24 @@ from pydantic import BaseModel, EmailStr
 import uvicorn
 import asyncio
 from services.rate_limit_service import RateLimiter, RateLimitMiddleware
-from redis import Redis
+from middleware.http_cache import HTTPCacheMiddleware
+from redis import Redis, asyncio as aioredis
 from services.api_key_service import APIKeyService
 from services.oauth_service import OAuthService
-from services.cache_service import CacheService
+from services.cache_service import CacheService, flush_cache_writes
+from services.cache_tags import city_prices_version, city_tag, hotel_tag, hotel_result_tags
 from services.email_verification_service import EmailVerificationService
 from services.price_tracking_service import PriceTrackingService
+from services.password_hasher import PasswordHasherBusy, password_hasher
+from services.response_cache import response_cache
+from services.ttl_policy import ttl_policy
+from services.search_warming_service import (
+    SearchWarmingService,
+    fetch_hotel_search,
+    hotel_search_key,
+    HOTEL_SEARCH_SOFT_TTL,
+    HOTEL_SEARCH_HARD_TTL
+)
 from services.health_service import HealthService
 import sys
 from ddtrace import patch_all
@@ -76,9 +91,94 @@ logging.basicConfig(
     ]
 )
 
-app = FastAPI(
-    title="Hotel Tracker API",
-    description="""
+@lru_cache
+def get_redis_client() -> Redis:
+    """Shared Redis client, created on first use"""
+    return Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=int(os.getenv("REDIS_DB", 0)),
+        decode_responses=True
+    )
+
+@lru_cache
+def get_async_redis_client() -> aioredis.Redis:
+    """Shared asyncio Redis client for per-request work, created on first use"""
+    return aioredis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=int(os.getenv("REDIS_DB", 0)),
+        decode_responses=True
+    )
+
+@lru_cache
+def get_monitoring_service() -> MonitoringService:
+    """Monitoring service, created on first use inside the running event loop"""
+    return MonitoringService()
+
+@lru_cache
+def get_cache_service() -> CacheService:
+    return CacheService(database.SessionLocal(), get_monitoring_service())
+
+@lru_cache
+def get_rate_limiter() -> RateLimiter:
+    return RateLimiter(get_async_redis_client())
+
+@lru_cache
+def get_health_service() -> HealthService:
+    return HealthService(database.SessionLocal, get_redis_client())
+
+async def init_database(max_backoff: float = 30.0):
+    """Connect the database engine, retrying with exponential backoff until it succeeds"""
+    backoff = 1.0
+    while True:
+        try:
+            return await asyncio.to_thread(database.get_engine)
+        except Exception as e:
+            logger.warning(f"Database not available yet, retrying in {backoff:.0f}s: {str(e)}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+async def update_metrics(app: FastAPI):
+    """Background task to update metrics once the database is reachable"""
+    await app.state.db_init
+    monitoring_service = get_monitoring_service()
+    while True:
+        await monitoring_service.update_system_metrics()
+        await monitoring_service.update_application_metrics(next(get_db()))
+        await asyncio.sleep(15)  # Update every 15 seconds
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serve as soon as the code is imported; connect to the database in the background"""
+    app.state.db_init = asyncio.create_task(init_database())
+    metrics_task = asyncio.create_task(update_metrics(app))
+    try:
+        yield
+    finally:
+        metrics_task.cancel()
+        app.state.db_init.cancel()
+        if get_redis_client.cache_info().currsize:
+            get_redis_client().close()
+        if get_rate_limiter.cache_info().currsize:
+            await get_rate_limiter().close()
+        if get_async_redis_client.cache_info().currsize:
+            await get_async_redis_client().close()
+        await cache.cache.close()
+        await response_cache.close()
+        await oauth_service.close()
+        password_hasher.close()
+        if database.is_engine_ready():
+            await flush_cache_writes()
+        await asyncio.to_thread(database.dispose_engine)
+
+router = APIRouter()
+
+def create_app() -> FastAPI:
+    """Build the application; nothing here touches the network"""
+    app = FastAPI(
+        title="Hotel Tracker API",
+        description="""
     🏨 A modern API for tracking hotel prices and availability across multiple platforms.
     
     ## Features
@@ -95,121 +195,117 @@ app = FastAPI(
     2. Use `/api/hotels/search` to find hotels in your chosen city
     3. Track prices using `/api/hotels/{hotel_id}/prices`
     """,
-    version="1.0.0",
-    docs_url="/api/docs",
-    redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json",
-    contact={
-        "name": "Hotel Tracker Support",
-        "url": "https://hoteltracker.org/support",
-        "email": "support@hoteltracker.org",
-    },
-    license_info={
-        "name": "MIT",
-        "url": "https://opensource.org/licenses/MIT",
-    }
-)
+        version="1.0.0",
+        docs_url="/api/docs",
+        redoc_url="/api/redoc",
+        openapi_url="/api/openapi.json",
+        contact={
+            "name": "Hotel Tracker Support",
+            "url": "https://hoteltracker.org/support",
+            "email": "support@hoteltracker.org",
+        },
+        license_info={
+            "name": "MIT",
+            "url": "https://opensource.org/licenses/MIT",
+        },
+        lifespan=lifespan
+    )
 
-# Security configurations
-ALLOWED_HOSTS = [
-    "hoteltracker.org",
-    "api.hoteltracker.org",
-    "www.hoteltracker.org",
-    "localhost",
-    "127.0.0.1"
-]
-
-CORS_ORIGINS = [
-    "https://hoteltracker.org",
-    "https://api.hoteltracker.org",
-    "https://www.hoteltracker.org",
-    "http://localhost:3000",
-    "http://localhost:8000"
-]
-
-# Add security middleware
-app.add_middleware(
-    SecurityHeaders,
-    allowed_hosts=ALLOWED_HOSTS,
-    hsts_max_age=31536000
-)
+    # Security configurations
+    ALLOWED_HOSTS = [
+        "hoteltracker.org",
+        "api.hoteltracker.org",
+        "www.hoteltracker.org",
+        "localhost",
+        "127.0.0.1"
+    ]
 
-# Configure CORS
-cors_config = CORSConfig(allowed_origins=CORS_ORIGINS)
-app.add_middleware(
-    CORSMiddleware,
-    **cors_config.get_cors_config()
-)
+    CORS_ORIGINS = [
+        "https://hoteltracker.org",
+        "https://api.hoteltracker.org",
+        "https://www.hoteltracker.org",
+        "http://localhost:3000",
+        "http://localhost:8000"
+    ]
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    # Add security middleware
+    app.add_middleware(
+        SecurityHeaders,
+        allowed_hosts=ALLOWED_HOSTS,
+        hsts_max_age=31536000
+    )
 
-# Security middleware
-if os.getenv("ENVIRONMENT") == "production":
-    # Force HTTPS
-    app.add_middleware(HTTPSRedirectMiddleware)
-    
-    # Trusted hosts
+    # Configure CORS
+    cors_config = CORSConfig(allowed_origins=CORS_ORIGINS)
     app.add_middleware(
-        TrustedHostMiddleware,
-        allowed_hosts=[
-            "hoteltracker.org",
-            "api.hoteltracker.org",
-            "www.hoteltracker.org",
-            "hotel-tracker-api.onrender.com"
-        ]
+        CORSMiddleware,
+        **cors_config.get_cors_config()
     )
 
-# Security headers
-app.add_middleware(
-    SecurityHeadersMiddleware,
-    content_security_policy={
-        "default-src": "'self'",
-        "img-src": ["'self'", "data:", "https:"],
-        "script-src": ["'self'", "'unsafe-inline'"],
-        "style-src": ["'self'", "'unsafe-inline'"],
-    },
-    strict_transport_security={"max-age": 31536000, "includeSubDomains": True},
-    x_frame_options="DENY",
-    x_content_type_options="nosniff",
-    x_xss_protection="1; mode=block",
-    referrer_policy="strict-origin-when-cross-origin"
-)
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
-# Metrics
-REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency')
-MEMORY_USAGE = Gauge('memory_usage_bytes', 'Memory usage in bytes')
-CPU_USAGE = Gauge('cpu_usage_percent', 'CPU usage percentage')
+    # Security middleware
+    if os.getenv("ENVIRONMENT") == "production":
+        # Force HTTPS
+        app.add_middleware(HTTPSRedirectMiddleware)
+    
+        # Trusted hosts
+        app.add_middleware(
+            TrustedHostMiddleware,
+            allowed_hosts=[
+                "hoteltracker.org",
+                "api.hoteltracker.org",
+                "www.hoteltracker.org",
+                "hotel-tracker-api.onrender.com"
+            ]
+        )
 
-# Initialize monitoring service
-monitoring_service = MonitoringService(SessionLocal())
+    # Security headers
+    app.add_middleware(
+        SecurityHeadersMiddleware,
+        content_security_policy={
+            "default-src": "'self'",
+            "img-src": ["'self'", "data:", "https:"],
+            "script-src": ["'self'", "'unsafe-inline'"],
+            "style-src": ["'self'", "'unsafe-inline'"],
+        },
+        strict_transport_security={"max-age": 31536000, "includeSubDomains": True},
+        x_frame_options="DENY",
+        x_content_type_options="nosniff",
+        x_xss_protection="1; mode=block",
+        referrer_policy="strict-origin-when-cross-origin"
+    )
 
-# Add PrometheusMiddleware
-app.add_middleware(PrometheusMiddleware, monitoring_service=monitoring_service)
+    # Request metrics and rate limiting resolve their services on first request
+    app.add_middleware(PrometheusMiddleware, monitoring_service_factory=get_monitoring_service)
+    app.add_middleware(RateLimitMiddleware, rate_limiter_factory=get_rate_limiter)
+    app.add_middleware(HTTPCacheMiddleware)
+    app.middleware("http")(log_requests)
+    app.middleware("http")(error_handling_middleware)
+    app.add_exception_handler(HTTPException, http_exception_handler)
 
-# Initialize Redis client
-redis_client = Redis(
-    host=os.getenv("REDIS_HOST", "localhost"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    db=int(os.getenv("REDIS_DB", 0)),
-    decode_responses=True
-)
+    app.include_router(router)
+    app.include_router(analytics_router)
+    app.include_router(city_router)
 
-# Initialize cache service
-cache_service = CacheService(redis_client)
+    # Mount static files
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize rate limiter
-rate_limiter = RateLimiter(redis_client)
+    app.openapi = partial(custom_openapi, app)
+    return app
 
-# Add rate limit middleware
-app.add_middleware(RateLimitMiddleware, rate_limiter=rate_limiter)
+# Metrics
+REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency')
+MEMORY_USAGE = Gauge('memory_usage_bytes', 'Memory usage in bytes')
+CPU_USAGE = Gauge('cpu_usage_percent', 'CPU usage percentage')
 
 # Initialize API key service
 api_key_service = APIKeyService()
@@ -220,11 +316,10 @@ oauth_service = OAuthService()
 # Initialize email verification service
 email_verification_service = EmailVerificationService()
 
-# Initialize health service
-health_service = HealthService(SessionLocal(), redis_client)
+# Counts searches for the cache warmer
+search_warming_service = SearchWarmingService()
 
-# Add custom middleware for request logging
-@app.middleware("http")
+# Custom middleware for request logging
 async def log_requests(request: Request, call_next):
     start_time = time.time()
     
@@ -248,7 +343,6 @@ async def log_requests(request: Request, call_next):
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
-@app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
@@ -269,7 +363,7 @@ class SearchParams(BaseModel):
     rooms: int = 1
     timezone: Optional[str]
 
-@app.get("/")
+@router.get("/")
 async def root():
     """
     🏠 Welcome to Hotel Tracker API
@@ -284,7 +378,7 @@ async def root():
         "timestamp": datetime.utcnow().isoformat()
     }
 
-@app.get("/api/locations/search")
+@router.get("/api/locations/search")
 async def search_locations(
     query: str,
     limit: Optional[int] = 10
@@ -295,27 +389,24 @@ async def search_locations(
     try:
         # Use cache if available
         cache_key = f"location_search:{query}:{limit}"
-        cached_result = await cache.get(cache_key)
+        cached_result = await cache.cache.get(cache_key)
         if cached_result:
-            return json.loads(cached_result)
+            return cached_result
 
         # Query database
         result = await database.search_locations(query, limit)
         
         # Cache the result
-        await cache.set(cache_key, json.dumps(result), expire=3600)
+        await cache.cache.set(cache_key, result, expire=3600)
         
         return result
     except Exception as e:
         logger.error(f"Error searching locations: {str(e)}")
         raise HTTPException(status_code=500, detail="Error searching locations")
 
-@app.get("/api/hotels/search")
-@cache_service.cached(
-    prefix="hotel_search",
-    ttl=timedelta(minutes=5)
-)
+@router.get("/api/hotels/search")
 async def search_hotels(
+    request: Request,
     city: str,
     checkin: str,
     checkout: str,
@@ -324,6 +415,11 @@ async def search_hotels(
 ):
     """
     Search for hotels in a specific city
+    
+    Cached results are served immediately; once older than the soft TTL they
+    are refreshed in the background. The X-Cache header (fresh, stale or miss)
+    and Age header say how fresh the results are. Fresh results are also kept
+    as ready-to-send response bodies until they reach the soft TTL.
     """
     try:
         # Validate dates
@@ -335,26 +431,36 @@ async def search_hotels(
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-        # Use cache if available
-        cache_key = f"hotel_search:{city}:{checkin}:{checkout}:{guests}:{rooms}"
-        cached_result = await cache.get(cache_key)
-        if cached_result:
-            return json.loads(cached_result)
-
-        # Query database
-        result = await database.search_hotels(city, checkin, checkout, guests, rooms)
-        
-        # Cache the result
-        await cache.set(cache_key, json.dumps(result), expire=1800)
-        
-        return result
+        search_warming_service.record_search_later(city, checkin, checkout, guests, rooms)
+        cache_key = hotel_search_key(city, checkin, checkout, guests, rooms)
+        cached_response = await response_cache.get(cache_key, request, headers={"X-Cache": cache.FRESH})
+        if cached_response is not None:
+            return cached_response
+
+        soft_ttl = await ttl_policy.ttl(cache_key, HOTEL_SEARCH_SOFT_TTL, city=city)
+        result, freshness, age = await cache.cache.get_or_revalidate(
+            cache_key,
+            lambda: fetch_hotel_search(city, checkin_date, checkout_date, guests, rooms),
+            soft_ttl=soft_ttl,
+            hard_ttl=HOTEL_SEARCH_HARD_TTL,
+            tags=lambda hotels: hotel_result_tags(hotels, city)
+        )
+        return await response_cache.set(
+            cache_key,
+            result,
+            request,
+            ttl=soft_ttl - age if freshness != cache.STALE else 0,
+            stored_at=time.time() - age,
+            tags=hotel_result_tags(result, city),
+            headers={"X-Cache": freshness}
+        )
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error searching hotels: {str(e)}")
         raise HTTPException(status_code=500, detail="Error searching hotels")
 
-@app.get("/health", tags=["Monitoring"])
+@router.get("/health", tags=["Monitoring"])
 async def health_check():
     """
     Get complete health status of all system components.
@@ -368,42 +474,71 @@ async def health_check():
         - System resources
         - Network
     """
-    return await health_service.get_complete_health_status()
+    return await get_health_service().get_complete_health_status()
 
-@app.get("/health/database", tags=["Monitoring"])
+@router.get("/health/database", tags=["Monitoring"])
 async def database_health():
     """Check database health status"""
-    return await health_service.check_database()
+    return await get_health_service().check_database()
 
-@app.get("/health/redis", tags=["Monitoring"])
+@router.get("/health/redis", tags=["Monitoring"])
 async def redis_health():
     """Check Redis health status"""
-    return await health_service.check_redis()
+    return await get_health_service().check_redis()
 
-@app.get("/health/external", tags=["Monitoring"])
+@router.get("/health/external", tags=["Monitoring"])
 async def external_services_health():
     """Check external services health status"""
-    return await health_service.check_external_services()
+    return await get_health_service().check_external_services()
 
-@app.get("/health/system", tags=["Monitoring"])
+@router.get("/health/system", tags=["Monitoring"])
 async def system_health():
     """Check system resources health status"""
-    return health_service.check_system_resources()
+    return get_health_service().check_system_resources()
 
-@app.get("/health/network", tags=["Monitoring"])
+@router.get("/health/network", tags=["Monitoring"])
 async def network_health():
     """Check network health status"""
-    return health_service.check_network()
+    return get_health_service().check_network()
 
-@app.get("/metrics")
+@router.get("/ready", tags=["Monitoring"])
+async def readiness_check(request: Request):
+    """
+    Readiness probe for load balancers and autoscalers.
+    
+    Returns 200 once the database engine has connected and Redis answers,
+    503 while the instance is still warming up. The engine connection is
+    retried in the background until it succeeds.
+    """
+    db_init = request.app.state.db_init
+    components = {"database": "connecting", "redis": "unknown"}
+    if db_init.done():
+        if db_init.cancelled() or db_init.exception():
+            components["database"] = "unavailable"
+        else:
+            components["database"] = "connected"
+    
+    try:
+        await asyncio.to_thread(get_redis_client().ping)
+        components["redis"] = "connected"
+    except Exception as e:
+        components["redis"] = f"unavailable: {str(e)}"
+    
+    ready = all(status == "connected" for status in components.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "components": components}
+    )
+
+@router.get("/metrics")
 async def metrics():
     return Response(
         generate_latest(),
         media_type=CONTENT_TYPE_LATEST
     )
 
-@app.get("/health")
-async def health_check():
+@router.get("/health")
+async def health_check(request: Request):
     """
     💓 API Health Check
     
@@ -428,14 +563,14 @@ async def health_check():
         status["status"] = "degraded"
 
     try:
-        await cache.redis.ping()
+        await cache.cache.redis.ping()
         status["components"]["redis"] = "healthy"
     except Exception as e:
         status["components"]["redis"] = f"unhealthy: {str(e)}"
         status["status"] = "degraded"
 
     try:
-        celery_inspect = app.celery_app.control.inspect()
+        celery_inspect = request.app.celery_app.control.inspect()
         if celery_inspect.active():
             status["components"]["celery"] = "healthy"
         else:
@@ -448,7 +583,7 @@ async def health_check():
     return status
 
 # Monitoring endpoints
-@app.get("/metrics", tags=["Monitoring"])
+@router.get("/metrics", tags=["Monitoring"])
 async def get_metrics():
     """
     Get Prometheus metrics.
@@ -464,11 +599,11 @@ async def get_metrics():
     Requires admin authentication.
     """
     return Response(
-        content=monitoring_service.get_metrics(),
+        content=get_monitoring_service().get_metrics(),
         media_type="text/plain"
     )
 
-@app.get("/health", tags=["Monitoring"])
+@router.get("/health", tags=["Monitoring"])
 async def health_check():
     """
     Get system health status.
@@ -481,9 +616,9 @@ async def health_check():
     
     Status will be 'warning' if any resource usage is above 90%.
     """
-    return await monitoring_service.get_health_check()
+    return await get_monitoring_service().get_health_check()
 
-@app.get("/metrics/business", tags=["Monitoring"])
+@router.get("/metrics/business", tags=["Monitoring"])
 async def get_business_metrics(
     current_user: User = Depends(auth_service.get_current_admin_user)
 ):
@@ -498,6 +633,7 @@ async def get_business_metrics(
     
     Requires admin authentication.
     """
+    monitoring_service = get_monitoring_service()
     return {
         "active_users": monitoring_service.active_users._value.get(),
         "hotel_searches": {
@@ -523,13 +659,12 @@ async def get_business_metrics(
     }
 
 # Error handling middleware
-@app.middleware("http")
 async def error_handling_middleware(request: Request, call_next):
     try:
         response = await call_next(request)
         return response
     except Exception as e:
-        monitoring_service.log_error(e, {
+        get_monitoring_service().log_error(e, {
             "path": request.url.path,
             "method": request.method,
             "client_ip": request.client.host,
@@ -570,7 +705,7 @@ class TokenData(BaseModel):
     username: str | None = None
 
 # Auth endpoints
-@app.post("/auth/register", response_model=UserResponse, tags=["Authentication"])
+@router.post("/auth/register", response_model=UserResponse, tags=["Authentication"])
 async def register_user(
     user: UserCreate,
     db: Session = Depends(get_db)
@@ -625,7 +760,7 @@ async def register_user(
         
     return new_user
 
-@app.post("/auth/login", response_model=Token, tags=["Authentication"])
+@router.post("/auth/login", response_model=Token, tags=["Authentication"])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -642,8 +777,16 @@ async def login(
     
     Raises:
     - 401: Invalid credentials
+    - 503: Too many logins in progress; retry after the Retry-After delay
     """
-    user = await auth_service.authenticate_user(form_data.username, form_data.password, db)
+    try:
+        user = await auth_service.authenticate_user(form_data.username, form_data.password, db)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -655,9 +798,9 @@ async def login(
     user.last_login = datetime.utcnow()
     db.commit()
     
-    return auth_service.create_tokens(user.id)
+    return await auth_service.create_tokens(user.id)
 
-@app.post("/auth/refresh", response_model=Token, tags=["Authentication"])
+@router.post("/auth/refresh", response_model=Token, tags=["Authentication"])
 async def refresh_token(
     refresh_token: str,
     db: Session = Depends(get_db)
@@ -667,7 +810,7 @@ async def refresh_token(
     """
     return await auth_service.refresh_access_token(refresh_token, db)
 
-@app.get("/auth/me", response_model=UserResponse, tags=["Authentication"])
+@router.get("/auth/me", response_model=UserResponse, tags=["Authentication"])
 async def get_current_user_info(
     current_user: User = Depends(auth_service.get_current_active_user)
 ):
@@ -676,22 +819,24 @@ async def get_current_user_info(
     """
     return current_user
 
-@app.post("/auth/logout", tags=["Authentication"])
+@router.post("/auth/logout", tags=["Authentication"])
 async def logout(
     current_user: User = Depends(auth_service.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
-    Logout user
+    Logout user, revoking their access and refresh tokens
     """
-    # In a real implementation, you might want to blacklist the token
-    # For now, we'll just update the last_login
-    current_user.last_login = datetime.utcnow()
+    # current_user may be a cached, detached copy, so update the row directly
+    db.query(User).filter(User.id == current_user.id).update(
+        {User.last_login: datetime.utcnow()}, synchronize_session=False
+    )
     db.commit()
+    await auth_service.logout(current_user.id)
     return {"message": "Successfully logged out"}
 
 # Email verification endpoints
-@app.post("/auth/verify-email/send", tags=["Authentication"])
+@router.post("/auth/verify-email/send", tags=["Authentication"])
 async def send_verification_email(
     current_user: User = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
@@ -725,7 +870,7 @@ async def send_verification_email(
         
     return {"message": "Verification email sent"}
 
-@app.get("/auth/verify-email", tags=["Authentication"])
+@router.get("/auth/verify-email", tags=["Authentication"])
 async def verify_email(
     token: str,
     db: Session = Depends(get_db)
@@ -747,6 +892,7 @@ async def verify_email(
             status_code=400,
             detail="Invalid or expired verification token"
         )
+    await auth_service.invalidate_user(user.id)
         
     return {
         "message": "Email verified successfully",
@@ -759,7 +905,7 @@ async def verify_email(
         }
     }
 
-@app.get("/auth/verify-email/status", tags=["Authentication"])
+@router.get("/auth/verify-email/status", tags=["Authentication"])
 async def get_verification_status(
     current_user: User = Depends(auth_service.get_current_user)
 ):
@@ -776,21 +922,21 @@ async def get_verification_status(
     }
 
 # OAuth endpoints
-@app.get("/auth/login/google", tags=["OAuth"])
+@router.get("/auth/login/google", tags=["OAuth"])
 async def google_login():
     """
     Get Google OAuth login URL
     """
     return {"url": await oauth_service.get_google_auth_url()}
 
-@app.get("/auth/login/github", tags=["OAuth"])
+@router.get("/auth/login/github", tags=["OAuth"])
 async def github_login():
     """
     Get GitHub OAuth login URL
     """
     return {"url": await oauth_service.get_github_auth_url()}
 
-@app.get("/auth/callback/google", tags=["OAuth"])
+@router.get("/auth/callback/google", tags=["OAuth"])
 async def google_callback(
     code: str,
     db: Session = Depends(get_db)
@@ -810,7 +956,7 @@ async def google_callback(
         }
     }
 
-@app.get("/auth/callback/github", tags=["OAuth"])
+@router.get("/auth/callback/github", tags=["OAuth"])
 async def github_callback(
     code: str,
     db: Session = Depends(get_db)
@@ -830,7 +976,7 @@ async def github_callback(
         }
     }
 
-@app.post("/auth/refresh/oauth", tags=["OAuth"])
+@router.post("/auth/refresh/oauth", tags=["OAuth"])
 async def refresh_oauth_token(
     provider: str,
     refresh_token: str,
@@ -842,7 +988,7 @@ async def refresh_oauth_token(
     return await oauth_service.refresh_oauth_token(provider, refresh_token)
 
 # Rate limit endpoints
-@app.get("/api/rate-limits", tags=["Rate Limiting"])
+@router.get("/api/rate-limits", tags=["Rate Limiting"])
 async def get_rate_limits(
     request: Request,
     current_user: User = Depends(auth_service.get_current_active_user)
@@ -850,7 +996,7 @@ async def get_rate_limits(
     """
     Get current rate limit usage
     """
-    return rate_limiter.get_usage_stats(request)
+    return await get_rate_limiter().get_usage_stats(request)
 
 # API Key models
 class APIKeyCreate(BaseModel):
@@ -874,7 +1020,7 @@ class APIKeyCreateResponse(APIKeyResponse):
     api_key: str
 
 # API Key endpoints
-@app.post("/api/keys", response_model=APIKeyCreateResponse, tags=["API Keys"])
+@router.post("/api/keys", response_model=APIKeyCreateResponse, tags=["API Keys"])
 async def create_api_key(
     key_data: APIKeyCreate,
     current_user: User = Depends(auth_service.get_current_active_user),
@@ -891,7 +1037,7 @@ async def create_api_key(
         key_data.scopes
     )
 
-@app.get("/api/keys", response_model=List[APIKeyResponse], tags=["API Keys"])
+@router.get("/api/keys", response_model=List[APIKeyResponse], tags=["API Keys"])
 async def list_api_keys(
     current_user: User = Depends(auth_service.get_current_active_user),
     db: Session = Depends(get_db)
@@ -901,7 +1047,7 @@ async def list_api_keys(
     """
     return await api_key_service.list_api_keys(db, current_user)
 
-@app.delete("/api/keys/{key_id}", tags=["API Keys"])
+@router.delete("/api/keys/{key_id}", tags=["API Keys"])
 async def revoke_api_key(
     key_id: int,
     current_user: User = Depends(auth_service.get_current_active_user),
@@ -915,7 +1061,7 @@ async def revoke_api_key(
         raise HTTPException(status_code=404, detail="API key not found")
     return {"message": "API key revoked successfully"}
 
-@app.get("/api/keys/scopes", tags=["API Keys"])
+@router.get("/api/keys/scopes", tags=["API Keys"])
 async def get_available_scopes(
     current_user: User = Depends(auth_service.get_current_active_user)
 ):
@@ -925,7 +1071,7 @@ async def get_available_scopes(
     return api_key_service.get_available_scopes()
 
 # Example of protected endpoint requiring API key
-@app.get("/api/protected/hotels", response_model=List[Dict], tags=["Protected Endpoints"])
+@router.get("/api/protected/hotels", response_model=List[Dict], tags=["Protected Endpoints"])
 async def list_hotels_api(
     api_key: str = Depends(api_key_service.require_api_key)
 ):
@@ -935,7 +1081,7 @@ async def list_hotels_api(
     return [{"message": "This endpoint requires a valid API key"}]
 
 # WebSocket endpoints
-@app.websocket("/api/ws/prices/{city}")
+@router.websocket("/api/ws/prices/{city}")
 async def websocket_endpoint(websocket: WebSocket, city: str, db: Session = Depends(get_db)):
     _, _, _, _, price_tracking_service = get_services(db)
     await price_tracking_service.connect_client(websocket, city)
@@ -949,26 +1095,32 @@ async def websocket_endpoint(websocket: WebSocket, city: str, db: Session = Depe
         await price_tracking_service.disconnect_client(websocket, city)
 
 # Price tracking endpoints
-@app.get("/api/prices/statistics/{city}")
-async def get_price_statistics(city: str, db: Session = Depends(get_db)):
+PRICE_STATISTICS_RESPONSE_TTL = int(os.getenv("PRICE_STATISTICS_RESPONSE_TTL", "60"))
+
+@router.get("/api/prices/statistics/{city}")
+async def get_price_statistics(city: str, request: Request, db: Session = Depends(get_db)):
     try:
+        # Keyed on the city's own price version, so only ingest in this city retires it
+        version = await cache.cache.get_version(city_prices_version(city)) or 0
+        cache_key = f"price_statistics:{city.strip().lower()}:{version}"
+        cached_response = await response_cache.get(cache_key, request)
+        if cached_response is not None:
+            return cached_response
+
         _, _, _, _, price_tracking_service = get_services(db)
-        return await price_tracking_service.get_price_statistics(city)
+        stats = await price_tracking_service.get_price_statistics(city)
+        return await response_cache.set(
+            cache_key,
+            stats,
+            request,
+            # An empty result is also what a failed query returns; don't keep it
+            ttl=PRICE_STATISTICS_RESPONSE_TTL if stats else 0,
+            tags=[city_tag(city)]
+        )
     except Exception as e:
         logger.error(f"Error getting price statistics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# Background task to update metrics
-@app.on_event("startup")
-async def start_metrics_collection():
-    async def update_metrics():
-        while True:
-            await monitoring_service.update_system_metrics()
-            await monitoring_service.update_application_metrics(next(get_db()))
-            await asyncio.sleep(15)  # Update every 15 seconds
-    
-    asyncio.create_task(update_metrics())
-
 # Alert preference models
 class AlertPreferenceCreate(BaseModel):
     hotel_id: int
@@ -990,7 +1142,7 @@ class AlertPreferenceResponse(BaseModel):
     push_enabled: bool
 
 # Alert routes
-@app.post("/api/alerts", response_model=AlertPreferenceResponse, tags=["Alerts"])
+@router.post("/api/alerts", response_model=AlertPreferenceResponse, tags=["Alerts"])
 async def create_alert(
     alert: AlertPreferenceCreate,
     db: Session = Depends(get_db),
@@ -1012,7 +1164,7 @@ async def create_alert(
         push_enabled=alert.push_enabled
     )
 
-@app.get("/api/alerts/notifications", response_model=List[dict], tags=["Alerts"])
+@router.get("/api/alerts/notifications", response_model=List[dict], tags=["Alerts"])
 async def get_notifications(
     db: Session = Depends(get_db),
     limit: int = 50,
@@ -1034,7 +1186,7 @@ async def get_notifications(
     } for n in notifications]
 
 # Background task to check price alerts
-@app.post("/api/alerts/check", tags=["Alerts"])
+@router.post("/api/alerts/check", tags=["Alerts"])
 async def check_alerts(
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
@@ -1057,7 +1209,7 @@ class ChatResponse(BaseModel):
     error: Optional[str] = None
 
 # Chatbot routes
-@app.post("/api/chat", response_model=ChatResponse, tags=["Chatbot"])
+@router.post("/api/chat", response_model=ChatResponse, tags=["Chatbot"])
 async def chat_with_ai(
     chat_message: ChatMessage,
     db: Session = Depends(get_db),
@@ -1073,7 +1225,7 @@ async def chat_with_ai(
         city_id=chat_message.city_id
     )
 
-@app.get("/api/chat/recommendations", tags=["Chatbot"])
+@router.get("/api/chat/recommendations", tags=["Chatbot"])
 async def get_recommendations(
     city_id: Optional[int] = None,
     max_price: Optional[float] = None,
@@ -1091,7 +1243,7 @@ async def get_recommendations(
     )
 
 # City routes
-@app.get("/api/cities", response_model=List[dict], tags=["Cities"])
+@router.get("/api/cities", response_model=List[dict], tags=["Cities"])
 async def get_cities(db: Session = Depends(get_db)):
     """
     Get list of available cities
@@ -1099,7 +1251,7 @@ async def get_cities(db: Session = Depends(get_db)):
     cities = db.query(City).all()
     return [{"id": city.id, "name": city.name} for city in cities]
 
-@app.get("/api/cities/nearest", tags=["Cities"])
+@router.get("/api/cities/nearest", tags=["Cities"])
 async def get_nearest_city(lat: float, lon: float, db: Session = Depends(get_db)):
     """
     Get nearest city based on coordinates
@@ -1118,7 +1270,7 @@ async def get_nearest_city(lat: float, lon: float, db: Session = Depends(get_db)
     nearest_city = min(distances, key=lambda x: x[0])[1]
     return {"id": nearest_city.id, "name": nearest_city.name}
 
-@app.get("/api/hotels", tags=["Hotels"])
+@router.get("/api/hotels", tags=["Hotels"])
 async def get_hotels(city_id: int, db: Session = Depends(get_db)):
     """
     Get hotels for a specific city
@@ -1137,10 +1289,11 @@ async def get_hotels(city_id: int, db: Session = Depends(get_db)):
         "amenities": hotel.amenities
     } for hotel in hotels]
 
-@app.get("/api/hotels/{hotel_id}/prices", tags=["Hotels"])
-@cache_service.cached(
-    prefix="hotel_prices",
-    ttl=timedelta(minutes=30)
+@router.get("/api/hotels/{hotel_id}/prices", tags=["Hotels"])
+@cache.cache.cached(
+    key_prefix="hotel_prices",
+    timeout=lambda key, hotel_id=None, **_: ttl_policy.ttl(key, timedelta(minutes=30), hotel_id=hotel_id),
+    tags=lambda result, hotel_id=None, **_: [hotel_tag(hotel_id)]
 )
 async def get_hotel_prices(
     hotel_id: int,
@@ -1154,41 +1307,38 @@ async def get_hotel_prices(
     # Existing price history logic here
     pass
 
-@app.get("/api/cache/stats", tags=["Cache"])
+@router.get("/api/cache/stats", tags=["Cache"])
 async def get_cache_stats(
     current_user: User = Depends(auth_service.get_current_active_user)
 ):
     """
-    Get cache statistics
+    Get cache statistics, broken down by tier and key prefix
     """
-    return await cache_service.get_stats()
+    stats = await get_cache_service().get_stats()
+    stats["redis_cache"] = await cache.cache.get_stats()
+    return stats
 
-@app.post("/api/cache/clear/{pattern}", tags=["Cache"])
+@router.post("/api/cache/clear/{tag}", tags=["Cache"])
 async def clear_cache(
-    pattern: str,
+    tag: str,
     current_user: User = Depends(auth_service.get_current_active_user)
 ):
     """
-    Clear cache by pattern
+    Clear every cache entry registered under a tag, e.g. hotel:42, city:paris or provider:expedia
     """
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized")
-    cleared = await cache_service.clear_pattern(pattern)
+    cleared = await cache.cache.invalidate(tag)
+    cleared += await get_cache_service().invalidate(tag)
     return {"cleared_keys": cleared}
 
-app.include_router(analytics_router)
-app.include_router(city_router)
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
 # Custom Swagger UI
-@app.get("/docs", include_in_schema=False)
-async def custom_swagger_ui_html():
+@router.get("/docs", include_in_schema=False)
+async def custom_swagger_ui_html(request: Request):
     return get_swagger_ui_html(
-        openapi_url=app.openapi_url,
-        title=f"{app.title} - Swagger UI",
-        oauth2_redirect_url=app.swagger_ui_oauth2_redirect_url,
+        openapi_url=request.app.openapi_url,
+        title=f"{request.app.title} - Swagger UI",
+        oauth2_redirect_url=request.app.swagger_ui_oauth2_redirect_url,
         swagger_js_url="/static/swagger-ui-bundle.js",
         swagger_css_url="/static/swagger-ui.css",
         swagger_favicon_url="/static/favicon.png",
@@ -1201,7 +1351,7 @@ async def custom_swagger_ui_html():
     )
 
 # Hotel endpoints with detailed documentation
-@app.get(
+@router.get(
     "/api/hotels/search",
     response_model=List[Dict],
     tags=["Hotels"],
@@ -1239,9 +1389,10 @@ async def custom_swagger_ui_html():
         }
     }
 )
-@cache_service.cached(
-    prefix="hotel_search",
-    ttl=timedelta(minutes=5)
+@cache.cache.cached(
+    key_prefix="hotel_search",
+    timeout=lambda key, location=None, **_: ttl_policy.ttl(key, timedelta(minutes=5), city=location),
+    tags=lambda result, location=None, **_: hotel_result_tags(result, location)
 )
 async def search_hotels(
     query: str = Query(
@@ -1329,7 +1480,7 @@ async def search_hotels(
     pass
 
 # Custom OpenAPI documentation
-def custom_openapi():
+def custom_openapi(app: FastAPI):
     if app.openapi_schema:
         return app.openapi_schema
         
@@ -1370,9 +1521,8 @@ def custom_openapi():
     app.openapi_schema = openapi_schema
     return app.openapi_schema
 
-app.openapi = custom_openapi
-
 def get_services(db: Session = Depends(get_db)):
+    monitoring_service = get_monitoring_service()
     cache_service = CacheService(db, monitoring_service)
     hotel_service = HotelService(db, cache_service)
     alert_service = AlertService(db, monitoring_service)
@@ -1380,6 +1530,8 @@ def get_services(db: Session = Depends(get_db)):
     price_tracking_service = PriceTrackingService(db, cache_service, monitoring_service)
     return hotel_service, alert_service, chatbot_service, cache_service, price_tracking_service
 
+app = create_app()
+
 if __name__ == "__main__":
     ssl_context = SSLConfig.get_ssl_context()
     uvicorn.run(
@@ -0,0 +1,136 @@
+from typing import List, Optional, Pattern, Tuple
+import hashlib
+import logging
+import re
+import time
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.types import ASGIApp
+
+import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """HTTP caching rules for a route
+
+    With a version_key, the ETag is derived from that data version counter,
+    so a matching If-None-Match is answered before the endpoint runs. The
+    ETag also rolls over every max_age seconds, for responses that depend on
+    the clock (e.g. "last 30 days"). Without one, the ETag is a hash of the
+    response body.
+    """
+
+    def __init__(self, cache_control: str, version_key: Optional[str] = None, max_age: int = 60):
+        self.cache_control = cache_control
+        self.version_key = version_key
+        self.max_age = max_age
+
+
+def public_policy(max_age: int, version_key: Optional[str] = None, stale: int = 0) -> CachePolicy:
+    cache_control = f"public, max-age={max_age}"
+    if stale:
+        cache_control += f", stale-while-revalidate={stale}"
+    return CachePolicy(cache_control, version_key, max_age)
+
+
+# Public data that nginx and browsers may cache; every other JSON GET is private
+DEFAULT_POLICIES: List[Tuple[Pattern, CachePolicy]] = [
+    (re.compile(r"^/api/cities$"), public_policy(3600)),
+    (re.compile(r"^/api/hotels$"), public_policy(60, version_key="prices")),
+    (re.compile(r"^/api/hotels/search$"), public_policy(60, stale=300)),
+    (re.compile(r"^/api/prices/statistics/[^/]+$"), public_policy(60, version_key="prices")),
+    (re.compile(r"^/analytics/price-history/\d+$"), public_policy(300, version_key="prices")),
+]
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class HTTPCacheMiddleware(BaseHTTPMiddleware):
+    """ETag / 304 handling and Cache-Control for JSON GET endpoints"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        policies: Optional[List[Tuple[Pattern, CachePolicy]]] = None,
+        default_cache_control: str = DEFAULT_CACHE_CONTROL
+    ):
+        super().__init__(app)
+        self.policies = policies if policies is not None else DEFAULT_POLICIES
+        self.default_cache_control = default_cache_control
+
+    def _policy_for(self, path: str) -> Optional[CachePolicy]:
+        for pattern, policy in self.policies:
+            if pattern.match(path):
+                return policy
+        return None
+
+    async def _version_etag(self, request: Request, policy: CachePolicy) -> Optional[str]:
+        try:
+            version = await cache.cache.get_version(policy.version_key)
+        except Exception as e:
+            logger.warning(f"Data version lookup failed for {policy.version_key}: {str(e)}")
+            return None
+        if version is None:
+            return None
+        epoch = int(time.time() // policy.max_age)
+        digest = hashlib.sha256(
+            f"{policy.version_key}:{version}:{epoch}:{request.url.path}?{request.url.query}".encode()
+        ).hexdigest()
+        return f'"v-{digest[:32]}"'
+
+    def _not_modified(self, etag: str, cache_control: str) -> Response:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        if request.method != "GET":
+            return await call_next(request)
+
+        policy = self._policy_for(request.url.path)
+        cache_control = policy.cache_control if policy else self.default_cache_control
+        if_none_match = request.headers.get("if-none-match")
+
+        etag = None
+        if policy and policy.version_key:
+            etag = await self._version_etag(request, policy)
+            if etag and etag_matches(if_none_match, etag):
+                return self._not_modified(etag, cache_control)
+
+        response = await call_next(request)
+        if response.status_code != 200 or not response.headers.get("content-type", "").startswith("application/json"):
+            return response
+
+        if "cache-control" not in response.headers:
+            response.headers["Cache-Control"] = cache_control
+        if etag is None and "etag" in response.headers:
+            # Pre-serialized responses carry the ETag computed when they were cached
+            if etag_matches(if_none_match, response.headers["etag"]):
+                return self._not_modified(response.headers["etag"], response.headers["Cache-Control"])
+            return response
+        if etag is None:
+            # Buffer the (JSON, so bounded) body to hash it
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            if etag_matches(if_none_match, etag):
+                return self._not_modified(etag, response.headers["Cache-Control"])
+            response = Response(
+                content=body,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                media_type=response.media_type
+            )
+        response.headers["ETag"] = etag
+        return response
@@ -1,16 +1,18 @@
 from typing import Optional
 from fastapi import Request, Response
-import time
-from redis import Redis
+from redis import asyncio as aioredis
 import os
 from fastapi.responses import JSONResponse
 
+from services.rate_limit_service import GCRALimiter
+
 class RateLimiter:
     def __init__(self):
-        self.redis = Redis.from_url(
+        self.redis = aioredis.from_url(
             os.getenv('REDIS_URL', 'redis://redis:6379/0'),
             decode_responses=True
         )
+        self.limiter = GCRALimiter(self.redis)
         
         # Rate limit configurations
         self.rate_limits = {
@@ -38,45 +40,27 @@ class RateLimiter:
         
         # Get rate limit configuration
         limit_config = self.rate_limits.get(limit_key, self.rate_limits["default"])
-        requests_limit = limit_config["requests"]
-        window = limit_config["window"]
-        
-        # Create Redis key
-        redis_key = f"rate_limit:{client_ip}:{endpoint}:{limit_key}"
-        
-        # Get current count and timestamp
-        current_time = int(time.time())
-        window_start = current_time - window
-        
-        # Remove old requests
-        self.redis.zremrangebyscore(redis_key, 0, window_start)
         
-        # Count requests in current window
-        request_count = self.redis.zcard(redis_key)
+        result = await self.limiter.hit(
+            f"{client_ip}:{endpoint}:{limit_key}",
+            limit_config["requests"],
+            limit_config["window"]
+        )
         
-        if request_count >= requests_limit:
+        headers = result.headers()
+        if not result.allowed:
             return JSONResponse(
                 status_code=429,
                 content={
                     "error": "Too Many Requests",
                     "message": "Rate limit exceeded. Please try again later.",
-                    "retry_after": window - (current_time - int(self.redis.zrange(redis_key, 0, 0)[0]))
-                }
+                    "retry_after": int(headers["Retry-After"])
+                },
+                headers=headers
             )
         
-        # Add current request
-        self.redis.zadd(redis_key, {str(current_time): current_time})
-        self.redis.expire(redis_key, window)
-        
         # Add rate limit headers
-        remaining = requests_limit - request_count - 1
-        reset_time = current_time + window
-        
-        request.state.rate_limit_headers = {
-            "X-RateLimit-Limit": str(requests_limit),
-            "X-RateLimit-Remaining": str(remaining),
-            "X-RateLimit-Reset": str(reset_time)
-        }
+        request.state.rate_limit_headers = headers
         
         return None
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -13,6 +13,8 @@ class Hotel(Base):
     amenities = Column(JSON)
     rating = Column(Float)
     current_price = Column(Float)
+    current_price_at = Column(DateTime, nullable=True)
+    current_price_provider = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -20,6 +22,20 @@ class Hotel(Base):
     price_history = relationship("PriceHistory", back_populates="hotel")
     alerts = relationship("PriceAlert", back_populates="hotel")
     
+    __table_args__ = (
+        Index("ix_hotels_city_current_price", "city", "current_price"),
+    )
+    
+    def apply_price(self, price: float, provider: str = None, observed_at: datetime = None):
+        """Update the latest-price columns unless a newer observation is already stored"""
+        observed_at = observed_at or datetime.utcnow()
+        if self.current_price_at and self.current_price_at > observed_at:
+            return False
+        self.current_price = price
+        self.current_price_at = observed_at
+        self.current_price_provider = provider
+        return True
+    
     def __repr__(self):
         return f"<Hotel {self.name}>"
 
@@ -29,14 +45,39 @@ class PriceHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     hotel_id = Column(Integer, ForeignKey("hotels.id"), nullable=False)
     price = Column(Float, nullable=False)
+    currency = Column(String, nullable=True)
+    provider = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     hotel = relationship("Hotel", back_populates="price_history")
     
+    __table_args__ = (
+        Index("ix_price_history_hotel_timestamp", "hotel_id", "timestamp"),
+    )
+    
     def __repr__(self):
         return f"<PriceHistory {self.hotel_id}:{self.price}>"
 
+class PriceHistoryRollup(Base):
+    __tablename__ = "price_history_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    hotel_id = Column(Integer, ForeignKey("hotels.id"), nullable=False)
+    resolution = Column(String, nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    avg_price = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("hotel_id", "resolution", "bucket_start", name="uq_price_history_rollup_bucket"),
+    )
+    
+    def __repr__(self):
+        return f"<PriceHistoryRollup {self.hotel_id}:{self.resolution}:{self.bucket_start}>"
+
 class PriceAlert(Base):
     __tablename__ = "price_alerts"
     
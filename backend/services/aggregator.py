@@ -1,18 +1,44 @@
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Union
 from datetime import datetime
 import asyncio
+import os
 from hotel_apis import ExpediaAPI, BookingAPI, HotelsComAPI, AmadeusAPI
 from models import Hotel, PriceHistory
 from sqlalchemy.orm import Session
+from prometheus_client import Counter
 import logging
 
+import cache
+from services.cache_service import CacheService
+from services.cache_tags import city_prices_version, hotel_tag, hotel_result_tags, provider_hotel_tag, provider_tag
+from services.ttl_policy import ttl_policy
+
 logger = logging.getLogger(__name__)
 
+# Seconds each provider's search results stay cached; override with PROVIDER_CACHE_TTL_<NAME>
+PROVIDER_CACHE_TTLS = {
+    'expedia': 600,
+    'booking': 300,
+    'hotels': 600,
+    'amadeus': 900
+}
+
+# Negative entries: a provider with nothing for a query, or one that just failed, is not asked again until these expire
+PROVIDER_EMPTY_CACHE_TTL = int(os.getenv("PROVIDER_EMPTY_CACHE_TTL", "900"))
+PROVIDER_ERROR_CACHE_TTL = int(os.getenv("PROVIDER_ERROR_CACHE_TTL", "60"))
+
+provider_calls_suppressed_total = Counter(
+    'provider_calls_suppressed_total',
+    'Provider search calls skipped because of a cached empty or error result',
+    ['provider', 'reason']
+)
+
 class HotelAggregator:
     """Aggregates hotel data from multiple providers"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache_service: Optional[CacheService] = None):
         self.db = db
+        self.cache_service = cache_service
         self.providers = {}
         self._initialize_providers()
         
@@ -46,36 +72,131 @@ class HotelAggregator:
         guests: int,
         rooms: int = 1
     ) -> List[Dict]:
-        """Search for hotels across all providers"""
+        """Search for hotels across all providers
         
-        tasks = []
-        for provider in self.providers.values():
-            tasks.append(
-                provider.search_hotels(
-                    location=location,
-                    check_in=check_in,
-                    check_out=check_out,
-                    guests=guests,
-                    rooms=rooms
-                )
+        Each provider's results are cached on their own, so only providers whose
+        segment is missing or expired are called. Empty results and failures
+        are cached too, for shorter times.
+        """
+        keys = self._segment_keys(location, check_in, check_out, guests, rooms)
+        segments = await self._get_segments(keys)
+        for name, segment in segments.items():
+            if isinstance(segment, dict):
+                provider_calls_suppressed_total.labels(provider=name, reason='error').inc()
+            elif not segment:
+                provider_calls_suppressed_total.labels(provider=name, reason='empty').inc()
+        
+        missing = [name for name in self.providers if name not in segments]
+        if missing:
+            results = await asyncio.gather(
+                *(
+                    self.providers[name].search_hotels(
+                        location=location,
+                        check_in=check_in,
+                        check_out=check_out,
+                        guests=guests,
+                        rooms=rooms
+                    )
+                    for name in missing
+                ),
+                return_exceptions=True
             )
             
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+            fetched = {}
+            for name, provider_results in zip(missing, results):
+                if isinstance(provider_results, Exception):
+                    logger.warning(f"Search failed for provider {name}: {str(provider_results)}")
+                    fetched[name] = {'error': str(provider_results)}
+                else:
+                    fetched[name] = provider_results
+            await self._store_segments(keys, fetched, location)
+            segments.update(fetched)
+            
+        # Merge in provider order so results are stable; error markers carry no hotels
+        return self._merge(
+            segments[name] for name in self.providers
+            if isinstance(segments.get(name), list)
+        )
+        
+    async def stale_providers(
+        self,
+        location: str,
+        check_in: datetime,
+        check_out: datetime,
+        guests: int,
+        rooms: int = 1
+    ) -> List[str]:
+        """Providers a search_all_providers call would have to hit right now"""
+        keys = self._segment_keys(location, check_in, check_out, guests, rooms)
+        segments = await self._get_segments(keys)
+        return [name for name in self.providers if name not in segments]
+        
+    def _segment_keys(
+        self,
+        location: str,
+        check_in: datetime,
+        check_out: datetime,
+        guests: int,
+        rooms: int
+    ) -> Dict[str, str]:
+        return {
+            name: f"provider_search:{name}:{location}:{check_in:%Y-%m-%d}:{check_out:%Y-%m-%d}:{guests}:{rooms}"
+            for name in self.providers
+        }
+        
+    def provider_cache_ttl(self, name: str) -> int:
+        return int(os.getenv(f"PROVIDER_CACHE_TTL_{name.upper()}", PROVIDER_CACHE_TTLS.get(name, 600)))
         
-        # Combine and deduplicate results
+    async def _get_segments(self, keys: Dict[str, str]) -> Dict[str, Union[List[Dict], Dict]]:
+        """Cached provider results, or {'error': ...} markers, by provider name"""
+        try:
+            cached = await cache.cache.get_many(keys.values())
+        except Exception as e:
+            logger.error(f"Error reading provider search cache: {str(e)}")
+            return {}
+        return {name: cached[key] for name, key in keys.items() if key in cached}
+        
+    def _segment_ttl(self, name: str, segment: Union[List[Dict], Dict]) -> int:
+        if isinstance(segment, dict):
+            return PROVIDER_ERROR_CACHE_TTL
+        if not segment:
+            return PROVIDER_EMPTY_CACHE_TTL
+        return self.provider_cache_ttl(name)
+        
+    async def _store_segments(
+        self,
+        keys: Dict[str, str],
+        segments: Dict[str, Union[List[Dict], Dict]],
+        location: str
+    ):
+        try:
+            await asyncio.gather(*(
+                cache.cache.set(
+                    keys[name],
+                    segment,
+                    expire=self._segment_ttl(name, segment),
+                    tags=(
+                        hotel_result_tags(segment if isinstance(segment, list) else None, location)
+                        | {provider_tag(name)}
+                    )
+                )
+                for name, segment in segments.items()
+            ))
+        except Exception as e:
+            logger.error(f"Error writing provider search cache: {str(e)}")
+            
+    @staticmethod
+    def _merge(segments: Iterable[List[Dict]]) -> List[Dict]:
+        """Combine and deduplicate provider results, keeping the lowest price"""
         hotels = {}
-        for provider_results in results:
-            if isinstance(provider_results, Exception):
-                continue
-                
+        for provider_results in segments:
             for hotel in provider_results:
                 hotel_id = hotel['hotel_id']
                 if hotel_id not in hotels:
-                    hotels[hotel_id] = hotel
-                else:
-                    # Update with lowest price
-                    if hotel['price'] < hotels[hotel_id]['price']:
-                        hotels[hotel_id].update(hotel)
+                    # Copy so cached segments are never mutated
+                    hotels[hotel_id] = dict(hotel)
+                elif hotel['price'] < hotels[hotel_id]['price']:
+                    hotels[hotel_id].update(hotel)
                         
         return list(hotels.values())
         
@@ -136,10 +257,46 @@ class HotelAggregator:
                 hotel_id=hotel.id,
                 price=best_price.price,
                 currency=best_price.currency,
-                provider=best_price.provider
+                provider=best_price.provider,
+                timestamp=best_price.timestamp
             )
             self.db.add(price_history)
+            
+            # Keep the latest-price columns in step with the history
+            previous_price = hotel.current_price
+            price_applied = hotel.apply_price(best_price.price, best_price.provider, best_price.timestamp)
             self.db.commit()
+            if price_applied:
+                await ttl_policy.record_price(hotel.id, hotel.city, previous_price, best_price.price)
+            
+            # Evict only the cached searches and analytics that include this hotel
+            await self.invalidate_hotel(hotel.id, hotel_id, city=hotel.city)
+            
+    async def invalidate_hotel(
+        self,
+        hotel_id: int,
+        provider_hotel_id: Optional[str] = None,
+        city: Optional[str] = None
+    ):
+        """Drop cache entries tagged with the hotel after a price change
+        
+        Provider results are tagged with the provider's hotel id, so pass it
+        as well to evict cached searches and provider segments. Passing the
+        city retires that city's price statistics too.
+        """
+        tags = [hotel_tag(hotel_id)]
+        if provider_hotel_id is not None:
+            tags.append(provider_hotel_tag(provider_hotel_id))
+        versions = ["prices"]
+        if city:
+            versions.append(city_prices_version(city))
+        try:
+            await cache.cache.invalidate(*tags)
+            await cache.cache.bump_version(*versions)
+            if self.cache_service:
+                await self.cache_service.invalidate(*tags)
+        except Exception as e:
+            logger.error(f"Error invalidating cache for hotel {hotel_id}: {str(e)}")
             
     async def close(self):
         """Close all provider connections"""
@@ -2,7 +2,8 @@ from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from models import PriceHistory, Hotel, Analytics
+from models import PriceHistory, PriceHistoryRollup, Hotel, Analytics
+from services.archive_service import PriceArchiveService
 import pandas as pd
 import numpy as np
 from sklearn.linear_model import LinearRegression
@@ -11,12 +12,76 @@ import logging
 logger = logging.getLogger(__name__)
 
 class AnalyticsService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, archive_service: Optional[PriceArchiveService] = None):
         self.db = db
+        self.archive_service = archive_service
+
+    def get_raw_price_frame(
+        self,
+        hotel_ids: Optional[List[int]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> pd.DataFrame:
+        """Raw price observations (hotel_id, price, timestamp) for long-range analysis
+
+        Archived months are read column-projected from the Parquet archive;
+        rows not archived yet come from Postgres. Archived rows are deleted
+        from Postgres, so the two never overlap.
+        """
+        columns = ["hotel_id", "price", "timestamp"]
+        frames = []
+        if self.archive_service:
+            archived = self.archive_service.read_history_frame(
+                columns=columns, hotel_ids=hotel_ids, start=start, end=end
+            )
+            # Parquet keeps microseconds; match the nanosecond frame built from the database
+            frames.append(archived.astype({'timestamp': 'datetime64[ns]'}))
+
+        query = self.db.query(PriceHistory.hotel_id, PriceHistory.price, PriceHistory.timestamp)
+        if hotel_ids:
+            query = query.filter(PriceHistory.hotel_id.in_(hotel_ids))
+        if start:
+            query = query.filter(PriceHistory.timestamp >= start)
+        if end:
+            query = query.filter(PriceHistory.timestamp < end)
+        frames.append(pd.DataFrame(query.all(), columns=columns))
+
+        frame = pd.concat(frames, ignore_index=True)
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+        return frame.sort_values(['hotel_id', 'timestamp'], ignore_index=True)
+
+    def train_price_model(self, days: int = 730) -> int:
+        """Retrain the price predictor on daily average prices per hotel, returning the training rows"""
+        # Imported here so request handlers don't load the stored model
+        from analytics.price_analyzer import price_analyzer
+
+        frame = self.get_raw_price_frame(start=datetime.utcnow() - timedelta(days=days))
+        if frame.empty:
+            return 0
+        daily = (
+            frame.assign(date=frame['timestamp'].dt.floor('D'))
+            .groupby(['hotel_id', 'date'], as_index=False)['price']
+            .mean()
+        )
+        price_analyzer.train_model(daily)
+        return len(daily)
 
     def get_price_history(self, hotel_id: int, days: int = 30) -> List[Dict]:
-        """Get price history for a hotel over the specified number of days"""
+        """Get price history for a hotel over the specified number of days
+
+        Observations older than the raw retention window come back as hourly or
+        daily rollups, with the bucket average as price plus min and max.
+        """
         cutoff_date = datetime.utcnow() - timedelta(days=days)
+        rollups = (
+            self.db.query(PriceHistoryRollup)
+            .filter(
+                PriceHistoryRollup.hotel_id == hotel_id,
+                PriceHistoryRollup.bucket_start >= cutoff_date
+            )
+            .order_by(PriceHistoryRollup.bucket_start)
+            .all()
+        )
         history = (
             self.db.query(PriceHistory)
             .filter(
@@ -28,9 +93,20 @@ class AnalyticsService:
         )
         
         return [
+            {
+                "price": r.avg_price,
+                "min_price": r.min_price,
+                "max_price": r.max_price,
+                "sample_count": r.sample_count,
+                "resolution": r.resolution,
+                "timestamp": r.bucket_start.isoformat()
+            }
+            for r in rollups
+        ] + [
             {
                 "price": h.price,
                 "currency": h.currency,
+                "resolution": "raw",
                 "timestamp": h.timestamp.isoformat()
             }
             for h in history
@@ -54,11 +130,13 @@ class AnalyticsService:
         df = pd.DataFrame(history)
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         
-        # Basic statistics
+        # Basic statistics (rollups carry their own extremes)
+        lows = df['min_price'].fillna(df['price']) if 'min_price' in df else df['price']
+        highs = df['max_price'].fillna(df['price']) if 'max_price' in df else df['price']
         stats = {
             "avg_price": float(df['price'].mean()),
-            "min_price": float(df['price'].min()),
-            "max_price": float(df['price'].max()),
+            "min_price": float(lows.min()),
+            "max_price": float(highs.max()),
             "price_volatility": float(df['price'].std()) if len(df) > 1 else 0
         }
         
@@ -107,31 +185,26 @@ class AnalyticsService:
 
     def get_seasonal_analysis(self, hotel_id: int) -> Dict:
         """Analyze seasonal price patterns"""
-        one_year_ago = datetime.utcnow() - timedelta(days=365)
-        history = (
-            self.db.query(PriceHistory)
-            .filter(
-                PriceHistory.hotel_id == hotel_id,
-                PriceHistory.timestamp >= one_year_ago
-            )
-            .order_by(PriceHistory.timestamp)
-            .all()
-        )
+        history = self.get_price_history(hotel_id, 365)
         
         if not history:
             return {"seasonal_patterns": "insufficient_data"}
             
         df = pd.DataFrame([
             {
-                "price": h.price,
-                "timestamp": h.timestamp
+                "price": h["price"],
+                "weight": h.get("sample_count", 1),
+                "timestamp": h["timestamp"]
             }
             for h in history
         ])
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
         
-        # Group by month and calculate average prices
+        # Group by month and calculate average prices, weighting rollups by their sample count
         df['month'] = df['timestamp'].dt.month
-        monthly_avg = df.groupby('month')['price'].mean()
+        df['weighted_price'] = df['price'] * df['weight']
+        monthly = df.groupby('month')[['weighted_price', 'weight']].sum()
+        monthly_avg = monthly['weighted_price'] / monthly['weight']
         
         # Find peak and low seasons
         peak_month = monthly_avg.idxmax()
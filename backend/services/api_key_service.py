@@ -2,15 +2,69 @@ from fastapi import Request, HTTPException, Security, Depends
 from fastapi.security.api_key import APIKeyHeader, APIKey
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from typing import Optional, List, Dict
+import logging
+import os
 import secrets
 import hashlib
+import time
+from redis import asyncio as aioredis
 from models import APIKeyModel, User
 from database import get_db
+from services.broadcast_cache import BroadcastCache
+
+logger = logging.getLogger(__name__)
+
+# Validated keys by key hash, per worker; revocations are broadcast on this channel
+_validated_keys = BroadcastCache("api_keys:revoked")
+
+# Per-key request counts and last-use times, accumulated here between flushes to the database
+USAGE_COUNT_KEY = "api_key_usage:count"
+USAGE_LAST_USED_KEY = "api_key_usage:last_used"
+
+
+class ValidatedAPIKey:
+    """The fields of a valid API key that requests need, copied off the ORM row
+
+    Cached and shared between requests, so it holds no session state and
+    nothing lazily loaded.
+    """
+
+    def __init__(
+        self,
+        id: int,
+        user_id: int,
+        name: str,
+        scopes: List[str],
+        expires_at: Optional[datetime]
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.name = name
+        self.scopes = tuple(scopes or ())
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_model(cls, api_key_model: "APIKeyModel") -> "ValidatedAPIKey":
+        return cls(
+            api_key_model.id,
+            api_key_model.user_id,
+            api_key_model.name,
+            api_key_model.scopes,
+            api_key_model.expires_at
+        )
+
 
 class APIKeyService:
     def __init__(self):
         self.api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+        self.validated_keys = _validated_keys
+        self.cache_ttl = float(os.getenv("API_KEY_CACHE_TTL", "60"))
+        self.redis = aioredis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=True
+        )
         
     def generate_api_key(self) -> str:
         """Generate a new API key"""
@@ -63,38 +117,94 @@ class APIKeyService:
         self,
         db: Session,
         api_key: str
-    ) -> Optional[APIKeyModel]:
-        """Validate API key and return associated model"""
+    ) -> Optional[ValidatedAPIKey]:
+        """Validate API key and return its id, owner, name, scopes and expiry
+        
+        Valid keys are cached per worker for up to cache_ttl seconds (never past
+        their expiry), so a cached key costs no database query.
+        """
         if not api_key:
             return None
             
         hashed_key = self.hash_api_key(api_key)
-        api_key_model = db.query(APIKeyModel).filter(
-            APIKeyModel.key_hash == hashed_key,
-            APIKeyModel.is_active == True
-        ).first()
-        
-        if not api_key_model:
-            return None
+        validated_key = self.validated_keys.get(hashed_key)
+        if validated_key is None:
+            api_key_model = db.query(APIKeyModel).filter(
+                APIKeyModel.key_hash == hashed_key,
+                APIKeyModel.is_active == True
+            ).first()
+            
+            if not api_key_model:
+                return None
+                
+            validated_key = ValidatedAPIKey.from_model(api_key_model)
+            ttl = self.cache_ttl
+            if validated_key.expires_at:
+                ttl = min(ttl, (validated_key.expires_at - datetime.utcnow()).total_seconds())
+            if ttl > 0:
+                self.validated_keys.set(hashed_key, validated_key, ttl)
             
         # Check expiration
-        if api_key_model.expires_at and api_key_model.expires_at < datetime.utcnow():
-            api_key_model.is_active = False
+        if validated_key.expires_at and validated_key.expires_at < datetime.utcnow():
+            db.query(APIKeyModel).filter(APIKeyModel.id == validated_key.id).update(
+                {APIKeyModel.is_active: False}, synchronize_session=False
+            )
             db.commit()
             return None
             
-        # Update last used
-        api_key_model.last_used_at = datetime.utcnow()
-        api_key_model.usage_count += 1
-        db.commit()
+        await self.record_usage(validated_key.id)
         
-        return api_key_model
+        return validated_key
+        
+    async def record_usage(self, key_id: int):
+        """Count a request in Redis; flush_usage moves the totals to the database"""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(USAGE_COUNT_KEY, key_id, 1)
+                pipe.hset(USAGE_LAST_USED_KEY, key_id, time.time())
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error recording usage of API key {key_id}: {str(e)}")
+            
+    async def flush_usage(self, db: Session) -> int:
+        """Apply usage accumulated in Redis to usage_count and last_used_at; returns keys updated"""
+        # Read and reset atomically, so requests counted meanwhile go into the next flush
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(USAGE_COUNT_KEY)
+            pipe.hgetall(USAGE_LAST_USED_KEY)
+            pipe.delete(USAGE_COUNT_KEY, USAGE_LAST_USED_KEY)
+            counts, last_used, _ = await pipe.execute()
+        if not counts:
+            return 0
+            
+        try:
+            for key_id, count in counts.items():
+                used_at = datetime.utcfromtimestamp(float(last_used.get(key_id, time.time())))
+                db.query(APIKeyModel).filter(APIKeyModel.id == int(key_id)).update({
+                    APIKeyModel.usage_count: APIKeyModel.usage_count + int(count),
+                    APIKeyModel.last_used_at: func.greatest(
+                        func.coalesce(APIKeyModel.last_used_at, used_at), used_at
+                    )
+                }, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the counts back for the next flush
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key_id, count in counts.items():
+                    pipe.hincrby(USAGE_COUNT_KEY, key_id, int(count))
+                for key_id, used_at in last_used.items():
+                    pipe.hsetnx(USAGE_LAST_USED_KEY, key_id, used_at)
+                await pipe.execute()
+            raise
+            
+        return len(counts)
         
     async def get_api_key(
         self,
         request: Request,
         db: Session = Depends(get_db)
-    ) -> Optional[APIKeyModel]:
+    ) -> Optional[ValidatedAPIKey]:
         """Get and validate API key from request"""
         api_key = await self.api_key_header(request)
         if api_key:
@@ -108,7 +218,7 @@ class APIKeyService:
         request: Request,
         db: Session = Depends(get_db),
         required_scopes: List[str] = None
-    ) -> APIKeyModel:
+    ) -> ValidatedAPIKey:
         """Require valid API key with optional scope requirements"""
         api_key_model = await self.get_api_key(request, db)
         if not api_key_model:
@@ -158,6 +268,8 @@ class APIKeyService:
         api_key.revoked_at = datetime.utcnow()
         db.commit()
         
+        await self.validated_keys.invalidate(api_key.key_hash)
+        
         return True
         
     def get_available_scopes(self) -> Dict[str, str]:
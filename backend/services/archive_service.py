@@ -0,0 +1,227 @@
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+import os
+import logging
+import uuid
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+
+from models import PriceHistory
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("hotel_id", pa.int32()),
+    ("price", pa.float64()),
+    ("currency", pa.string()),
+    ("provider", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+])
+
+# year=YYYY/month=MM directories; declared up front so opening the dataset
+# doesn't read a file footer to discover the schema
+ARCHIVE_PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.int16()), ("month", pa.int8())]),
+    flavor="hive"
+)
+
+
+def month_start(value: datetime) -> datetime:
+    """Truncate a datetime to the first instant of its month"""
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(value: datetime) -> datetime:
+    """First instant of the month after the given month start"""
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+class PriceArchiveService:
+    """Moves cold price history out of Postgres into per-month Parquet files
+
+    Each run over a month writes a new part file next to any earlier ones, so
+    re-archiving late-arriving rows never replaces rows already archived.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        archive_uri: Optional[str] = None,
+        batch_size: int = 10000
+    ):
+        self.db = db
+        self.archive_uri = archive_uri or os.getenv(
+            "PRICE_ARCHIVE_URI",
+            "/var/lib/hoteltracker/archive/price_history"
+        )
+        self.batch_size = batch_size
+        self.filesystem, self.root = self._resolve_filesystem(self.archive_uri)
+
+    def _resolve_filesystem(self, uri: str) -> Tuple[fs.FileSystem, str]:
+        """Resolve the archive URI to a pyarrow filesystem and root path"""
+        if uri.startswith("s3://"):
+            # S3-compatible stores (MinIO, R2, ...) are selected through an endpoint override
+            s3 = fs.S3FileSystem(
+                endpoint_override=os.getenv("PRICE_ARCHIVE_S3_ENDPOINT"),
+                region=os.getenv("AWS_DEFAULT_REGION", "us-east-1")
+            )
+            return s3, uri[len("s3://"):].rstrip("/")
+
+        # Local archives are read through memory maps
+        path = os.path.abspath(uri[len("file://"):] if uri.startswith("file://") else uri)
+        return fs.LocalFileSystem(use_mmap=True), path
+
+    def _month_dir(self, start: datetime) -> str:
+        return f"{self.root}/year={start.year}/month={start.month:02d}"
+
+    def archive_month(self, start: datetime) -> int:
+        """Write one month of price history to Parquet and delete it from the database"""
+        start = month_start(start)
+        end = next_month(start)
+        part = f"part-{uuid.uuid4().hex}.parquet"
+        path = f"{self._month_dir(start)}/{part}"
+        # Dataset discovery skips names starting with "_", so readers never see partial files
+        tmp_path = f"{self._month_dir(start)}/_{part}.tmp"
+
+        rows = (
+            self.db.query(
+                PriceHistory.id,
+                PriceHistory.hotel_id,
+                PriceHistory.price,
+                PriceHistory.currency,
+                PriceHistory.provider,
+                PriceHistory.timestamp
+            )
+            .filter(
+                PriceHistory.timestamp >= start,
+                PriceHistory.timestamp < end
+            )
+            .order_by(PriceHistory.hotel_id, PriceHistory.timestamp)
+            .yield_per(self.batch_size)
+        )
+
+        self.filesystem.create_dir(self._month_dir(start), recursive=True)
+
+        archived = 0
+        max_archived_id = None
+        batch: List[Tuple] = []
+        with pq.ParquetWriter(
+            tmp_path,
+            ARCHIVE_SCHEMA,
+            filesystem=self.filesystem,
+            compression="zstd"
+        ) as writer:
+            for row in rows:
+                batch.append(tuple(row))
+                if max_archived_id is None or row.id > max_archived_id:
+                    max_archived_id = row.id
+                if len(batch) >= self.batch_size:
+                    writer.write_batch(self._to_record_batch(batch))
+                    archived += len(batch)
+                    batch = []
+            if batch:
+                writer.write_batch(self._to_record_batch(batch))
+                archived += len(batch)
+
+        if not archived:
+            self.filesystem.delete_file(tmp_path)
+            return 0
+
+        # Only drop rows from Postgres once the Parquet file is complete, and only
+        # those the read saw: rows inserted since have higher ids and wait for the next run
+        self.filesystem.move(tmp_path, path)
+        self.db.query(PriceHistory).filter(
+            PriceHistory.timestamp >= start,
+            PriceHistory.timestamp < end,
+            PriceHistory.id <= max_archived_id
+        ).delete(synchronize_session=False)
+        self.db.commit()
+
+        logger.info(f"Archived {archived} price history rows for {start:%Y-%m} to {path}")
+        return archived
+
+    def _to_record_batch(self, rows: List[Tuple]) -> pa.RecordBatch:
+        columns = list(zip(*rows))
+        return pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, ARCHIVE_SCHEMA)],
+            schema=ARCHIVE_SCHEMA
+        )
+
+    def archive_cold_history(self, cutoff: datetime) -> Dict[str, int]:
+        """Archive every complete month older than the cutoff
+
+        Called by PriceRetentionService with the raw retention cutoff, once the
+        rows have been rolled up.
+        """
+        oldest = self.db.query(func.min(PriceHistory.timestamp)).scalar()
+        if not oldest:
+            return {}
+
+        results = {}
+        start = month_start(oldest)
+        while next_month(start) <= cutoff:
+            try:
+                results[f"{start:%Y-%m}"] = self.archive_month(start)
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"Error archiving price history for {start:%Y-%m}: {str(e)}")
+                break
+            start = next_month(start)
+
+        return results
+
+    def read_history(
+        self,
+        columns: Optional[List[str]] = None,
+        hotel_ids: Optional[List[int]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> pa.Table:
+        """Read archived price history with column projection and partition pruning"""
+        try:
+            dataset = ds.dataset(
+                self.root,
+                filesystem=self.filesystem,
+                format="parquet",
+                schema=ARCHIVE_SCHEMA.append(pa.field("year", pa.int16())).append(pa.field("month", pa.int8())),
+                partitioning=ARCHIVE_PARTITIONING
+            )
+        except FileNotFoundError:
+            return ARCHIVE_SCHEMA.empty_table().select(columns or ARCHIVE_SCHEMA.names)
+
+        conditions = []
+        if hotel_ids:
+            conditions.append(ds.field("hotel_id").isin(hotel_ids))
+        if start:
+            conditions.append(ds.field("timestamp") >= pa.scalar(start, type=pa.timestamp("us")))
+            # Prune whole months before opening any file
+            conditions.append(
+                (ds.field("year") > start.year) |
+                ((ds.field("year") == start.year) & (ds.field("month") >= start.month))
+            )
+        if end:
+            conditions.append(ds.field("timestamp") < pa.scalar(end, type=pa.timestamp("us")))
+            conditions.append(
+                (ds.field("year") < end.year) |
+                ((ds.field("year") == end.year) & (ds.field("month") <= end.month))
+            )
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        return dataset.to_table(
+            columns=columns or ARCHIVE_SCHEMA.names,
+            filter=expression
+        )
+
+    def read_history_frame(self, **kwargs):
+        """Read archived price history as a pandas DataFrame for analytics and model training"""
+        return self.read_history(**kwargs).to_pandas()
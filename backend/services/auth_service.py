@@ -3,31 +3,63 @@ from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from redis import asyncio as aioredis
 from models import User
 from database import get_db
+from services.broadcast_cache import BroadcastCache
+from services.local_cache import LocalCache
+from services.password_hasher import password_hasher
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+# Resolved users by token subject, per worker, as (token version, user)
+_principals = BroadcastCache("auth:principals")
+
+# Bumped on logout; tokens carry the version they were issued under ("ver")
+TOKEN_VERSION_KEY = "auth:token_version:{user_id}"
+
+# Last token version this worker read per user, used while Redis is unreachable
+_seen_token_versions = LocalCache()
+
 class AuthService:
     def __init__(self):
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+        self.password_hasher = password_hasher
+        self.pwd_context = password_hasher.pwd_context
+        self.oauth2_scheme = oauth2_scheme
         self.SECRET_KEY = os.getenv("JWT_SECRET_KEY")
         self.ALGORITHM = "HS256"
         self.ACCESS_TOKEN_EXPIRE_MINUTES = 30
         self.REFRESH_TOKEN_EXPIRE_DAYS = 7
+        self.principals = _principals
+        self.principal_cache_ttl = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))
+        self.seen_token_versions = _seen_token_versions
+        self.token_version_fallback_ttl = float(os.getenv("AUTH_TOKEN_VERSION_FALLBACK_TTL", "300"))
+        self.redis = aioredis.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=True
+        )
 
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verify a password against its hash"""
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash
+        
+        Raises PasswordHasherBusy when the hashing pool is saturated.
+        """
+        return await self.password_hasher.verify(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str) -> str:
-        """Generate password hash"""
-        return self.pwd_context.hash(password)
+    async def get_password_hash(self, password: str) -> str:
+        """Generate password hash
+        
+        Raises PasswordHasherBusy when the hashing pool is saturated.
+        """
+        return await self.password_hasher.hash(password)
 
     def create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """Create JWT access token"""
@@ -49,12 +81,54 @@ class AuthService:
         encoded_jwt = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_jwt
 
+    async def get_token_version(self, user_id: Any) -> int:
+        """Current token version for a user
+        
+        If Redis is unreachable, falls back to the last version this worker
+        read within token_version_fallback_ttl seconds. Without one, tokens
+        can't be checked for revocation, so this fails closed with a 503.
+        """
+        try:
+            version = await self.redis.get(TOKEN_VERSION_KEY.format(user_id=user_id))
+        except Exception as e:
+            logger.warning(f"Error reading token version for user {user_id}: {str(e)}")
+            version = self.seen_token_versions.get(str(user_id))
+            if version is None:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication temporarily unavailable",
+                    headers={"Retry-After": "5"}
+                )
+            return version
+        version = int(version) if version is not None else 0
+        self.seen_token_versions.set(str(user_id), version, self.token_version_fallback_ttl)
+        return version
+
+    async def invalidate_user(self, user_id: Any, revoke_tokens: bool = False):
+        """Drop the cached principal in every worker, e.g. after deactivation or a role change
+        
+        With revoke_tokens, tokens issued before now stop being accepted.
+        """
+        if revoke_tokens:
+            version = await self.redis.incr(TOKEN_VERSION_KEY.format(user_id=user_id))
+            self.seen_token_versions.set(str(user_id), version, self.token_version_fallback_ttl)
+        await self.principals.invalidate(str(user_id))
+
+    async def logout(self, user_id: Any):
+        """Revoke the user's access and refresh tokens"""
+        await self.invalidate_user(user_id, revoke_tokens=True)
+
     async def get_current_user(
         self,
         token: str = Depends(oauth2_scheme),
         db: Session = Depends(get_db)
     ) -> User:
-        """Get current user from JWT token"""
+        """Get current user from JWT token
+        
+        The user is cached per worker for principal_cache_ttl seconds, so most
+        requests resolve it without a database query. The cached user is
+        detached and shared between requests; treat it as read-only.
+        """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -65,6 +139,7 @@ class AuthService:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             user_id: str = payload.get("sub")
             token_type: str = payload.get("type")
+            token_version = payload.get("ver", 0)
             
             if user_id is None or token_type != "access":
                 raise credentials_exception
@@ -72,21 +147,44 @@ class AuthService:
         except JWTError:
             raise credentials_exception
             
+        cached = self.principals.get(user_id)
+        if cached is not None and cached[0] == token_version:
+            return cached[1]
+            
         user = db.query(User).filter(User.id == user_id).first()
         if user is None:
             raise credentials_exception
             
+        current_version = await self.get_token_version(user.id)
+        if token_version != current_version:
+            raise credentials_exception
+        db.expunge(user)
+        self.principals.set(user_id, (current_version, user), self.principal_cache_ttl)
+        
         return user
 
     async def get_current_active_user(
         self,
-        current_user: User = Depends(get_current_user)
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_db)
     ) -> User:
         """Get current active user"""
+        current_user = await self.get_current_user(token, db)
         if not current_user.is_active:
             raise HTTPException(status_code=400, detail="Inactive user")
         return current_user
 
+    async def get_current_admin_user(
+        self,
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_db)
+    ) -> User:
+        """Get current active user, who must be a superuser"""
+        current_user = await self.get_current_active_user(token, db)
+        if not current_user.is_superuser:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        return current_user
+
     async def authenticate_user(
         self,
         email: str,
@@ -97,18 +195,19 @@ class AuthService:
         user = db.query(User).filter(User.email == email).first()
         if not user:
             return None
-        if not self.verify_password(password, user.hashed_password):
+        if not await self.verify_password(password, user.hashed_password):
             return None
         return user
 
-    def create_tokens(self, user_id: int) -> Dict[str, str]:
+    async def create_tokens(self, user_id: int) -> Dict[str, str]:
         """Create access and refresh tokens for user"""
+        version = await self.get_token_version(user_id)
         access_token = self.create_access_token(
-            data={"sub": str(user_id)},
+            data={"sub": str(user_id), "ver": version},
             expires_delta=timedelta(minutes=self.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
         refresh_token = self.create_refresh_token(
-            data={"sub": str(user_id)}
+            data={"sub": str(user_id), "ver": version}
         )
         return {
             "access_token": access_token,
@@ -140,7 +239,14 @@ class AuthService:
                     detail="User not found",
                 )
                 
-            return self.create_tokens(user.id)
+            current_version = await self.get_token_version(user.id)
+            if payload.get("ver", 0) != current_version:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid refresh token",
+                )
+                
+            return await self.create_tokens(user.id)
             
         except JWTError:
             raise HTTPException(
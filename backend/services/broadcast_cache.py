@@ -0,0 +1,79 @@
+from typing import Any, Optional
+import logging
+import os
+import threading
+import time
+from redis import Redis, asyncio as aioredis
+
+from services.local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastCache:
+    """Per-worker LocalCache whose invalidations reach every worker
+
+    invalidate() drops keys here and publishes them on a Redis channel; each
+    process (uvicorn or Celery worker) runs one listener thread that drops
+    them from its own copy. Entries should still have short TTLs: if the
+    listener loses its connection the whole cache is cleared, but a message
+    published while a worker was starting up can be missed.
+    """
+
+    def __init__(self, channel: str, redis_url: Optional[str] = None, max_entries: int = 10000):
+        self.channel = channel
+        self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.local_cache = LocalCache(max_entries=max_entries)
+        self._redis: Optional[aioredis.Redis] = None
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    def _listen(self):
+        while True:
+            try:
+                client = Redis.from_url(self.redis_url, decode_responses=True)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.local_cache.delete(message["data"])
+            except Exception as e:
+                # Invalidations may have been missed while disconnected
+                logger.warning(f"{self.channel} listener error: {str(e)}")
+                self.local_cache.clear()
+                time.sleep(5)
+
+    def _ensure_listener(self):
+        if self._listener_pid != os.getpid():
+            with self._listener_lock:
+                if self._listener_pid != os.getpid():
+                    # Entries inherited across a fork were never subscribed to
+                    self.local_cache.clear()
+                    threading.Thread(target=self._listen, name=self.channel, daemon=True).start()
+                    self._listener_pid = os.getpid()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self._ensure_listener()
+        return self.local_cache.get(key, default)
+
+    def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._ensure_listener()
+        self.local_cache.set(key, value, ttl_seconds)
+
+    async def invalidate(self, *keys: str) -> None:
+        """Drop keys in this worker and every other one"""
+        for key in keys:
+            self.local_cache.delete(key)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.publish(self.channel, key)
+                await pipe.execute()
+        except Exception as e:
+            # Other workers keep their copies until the entry TTL runs out
+            logger.error(f"Error publishing {self.channel} invalidation: {str(e)}")
@@ -0,0 +1,154 @@
+from typing import Any, Dict, Optional, Sequence, Tuple
+from bisect import bisect_left
+import threading
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+TTL_BUCKETS = (10, 30, 60, 300, 900, 1800, 3600, 21600, 86400)
+
+
+def key_prefix(key: str) -> str:
+    """Metric label for a cache key: everything before the first colon"""
+    return key.split(":", 1)[0]
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def cumulative(self):
+        """Prometheus-style (le, cumulative count) pairs"""
+        total = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            pairs.append(("+Inf" if bound == float("inf") else str(bound), total))
+        return pairs
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = self.count
+        return {
+            "count": count,
+            "avg": self.sum / count if count else 0,
+            "buckets": dict(self.cumulative())
+        }
+
+
+class _PrefixStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.latency = _Histogram(LATENCY_BUCKETS)
+        self.value_size = _Histogram(SIZE_BUCKETS)
+        self.ttl_remaining = _Histogram(TTL_BUCKETS)
+
+
+class CacheAnalytics:
+    """Per-tier, per-key-prefix cache statistics for this process
+
+    The same numbers back /api/cache/stats and the Prometheus scrape, which
+    reads them through collect() rather than keeping a second copy.
+    """
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], _PrefixStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, tier: str, key: str) -> _PrefixStats:
+        ident = (tier, key_prefix(key))
+        stats = self._stats.get(ident)
+        if stats is None:
+            stats = self._stats.setdefault(ident, _PrefixStats())
+        return stats
+
+    def record_lookup(
+        self,
+        tier: str,
+        key: str,
+        hit: bool,
+        latency: Optional[float] = None,
+        ttl_remaining: Optional[float] = None
+    ):
+        with self._lock:
+            stats = self._get(tier, key)
+            if hit:
+                stats.hits += 1
+            else:
+                stats.misses += 1
+            if latency is not None:
+                stats.latency.observe(latency)
+            if ttl_remaining is not None and ttl_remaining >= 0:
+                stats.ttl_remaining.observe(ttl_remaining)
+
+    def record_write(self, tier: str, key: str, size: int):
+        with self._lock:
+            self._get(tier, key).value_size.observe(size)
+
+    def snapshot(self, *tiers: str) -> Dict[str, Dict[str, Any]]:
+        """Stats by tier, then prefix; all tiers when none are given"""
+        result: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for (tier, prefix), stats in sorted(self._stats.items()):
+                if tiers and tier not in tiers:
+                    continue
+                lookups = stats.hits + stats.misses
+                result.setdefault(tier, {})[prefix] = {
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "hit_ratio": stats.hits / lookups if lookups else 0,
+                    "latency_seconds": stats.latency.snapshot(),
+                    "value_size_bytes": stats.value_size.snapshot(),
+                    "ttl_remaining_seconds": stats.ttl_remaining.snapshot()
+                }
+        return result
+
+    def collect(self):
+        lookups = CounterMetricFamily(
+            'cache_prefix_lookups',
+            'Cache lookups by tier and key prefix',
+            labels=['tier', 'prefix', 'result']
+        )
+        histograms = {
+            'latency': HistogramMetricFamily(
+                'cache_prefix_latency_seconds',
+                'Cache lookup latency by tier and key prefix',
+                labels=['tier', 'prefix']
+            ),
+            'value_size': HistogramMetricFamily(
+                'cache_prefix_value_size_bytes',
+                'Encoded size of cached values by tier and key prefix',
+                labels=['tier', 'prefix']
+            ),
+            'ttl_remaining': HistogramMetricFamily(
+                'cache_prefix_ttl_remaining_seconds',
+                'Remaining TTL of entries at hit time by tier and key prefix',
+                labels=['tier', 'prefix']
+            )
+        }
+        with self._lock:
+            for (tier, prefix), stats in self._stats.items():
+                lookups.add_metric([tier, prefix, 'hit'], stats.hits)
+                lookups.add_metric([tier, prefix, 'miss'], stats.misses)
+                for name, family in histograms.items():
+                    histogram = getattr(stats, name)
+                    if histogram.count:
+                        family.add_metric([tier, prefix], histogram.cumulative(), histogram.sum)
+        yield lookups
+        yield from histograms.values()
+
+
+# Process-wide instance shared by CacheService and RedisCache
+cache_analytics = CacheAnalytics()
+REGISTRY.register(cache_analytics)
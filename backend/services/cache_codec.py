@@ -0,0 +1,102 @@
+from typing import Any, Dict
+from datetime import date, datetime
+from decimal import Decimal
+import pickle
+import zlib
+import msgpack
+import orjson
+
+# Every stored value starts with one header byte: the codec tag, plus this bit when compressed
+COMPRESSED_FLAG = 0x80
+
+
+class CacheCodecError(ValueError):
+    """Raised when a stored value cannot be decoded (unknown header or corrupt payload)"""
+
+
+def _msgpack_default(value: Any) -> Any:
+    # Match what the JSON-backed database tier would return
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__} for the cache")
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    tag = 1
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class OrjsonCodec:
+    name = "orjson"
+    tag = 2
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class PickleCodec:
+    """For trusted values that are not JSON-like; never use for data from outside the process"""
+    name = "pickle"
+    tag = 3
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+CODECS: Dict[str, Any] = {
+    codec.name: codec
+    for codec in (MsgpackCodec(), OrjsonCodec(), PickleCodec())
+}
+_CODECS_BY_TAG = {codec.tag: codec for codec in CODECS.values()}
+
+
+class CacheSerializer:
+    """Encodes values with a codec and compresses them above a size threshold
+
+    Decoding reads the header byte, so values written with another codec or
+    compression setting stay readable after a configuration change.
+    """
+
+    def __init__(self, codec: str = "msgpack", compress_min_bytes: int = 1024, compress_level: int = 3):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown cache codec: {codec}")
+        self.codec = CODECS[codec]
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+
+    def dumps(self, value: Any) -> bytes:
+        payload = self.codec.dumps(value)
+        if self.compress_min_bytes and len(payload) >= self.compress_min_bytes:
+            compressed = zlib.compress(payload, self.compress_level)
+            if len(compressed) < len(payload):
+                return bytes((self.codec.tag | COMPRESSED_FLAG,)) + compressed
+        return bytes((self.codec.tag,)) + payload
+
+    def loads(self, data: bytes) -> Any:
+        if not data:
+            raise CacheCodecError("Empty cache value")
+        header = data[0]
+        codec = _CODECS_BY_TAG.get(header & ~COMPRESSED_FLAG)
+        if codec is None:
+            raise CacheCodecError(f"Unknown cache value header: {header:#x}")
+        payload = memoryview(data)[1:]
+        try:
+            if header & COMPRESSED_FLAG:
+                payload = zlib.decompress(payload)
+            return codec.loads(payload)
+        except (zlib.error, ValueError, TypeError, pickle.UnpicklingError) as e:
+            raise CacheCodecError(str(e)) from e
@@ -0,0 +1,68 @@
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import math
+import random
+import time
+import uuid
+
+# Suffix of the companion key holding how long the last recompute took, in milliseconds
+RECOMPUTE_SUFFIX = ":recompute_ms"
+
+# Delete the lock only if this holder still owns it, so an expired lock taken over
+# by another worker is never released by the original holder
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RecomputeLock:
+    """Cluster-wide lock that lets a single worker rebuild a cache key
+
+    The lock expires on its own after `timeout` seconds, so a crashed holder
+    cannot block a key for longer than that.
+    """
+
+    def __init__(self, redis, key: str, timeout: float = 30.0):
+        self.redis = redis
+        self.name = f"lock:{key}"
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self) -> bool:
+        return bool(await self.redis.set(self.name, self.token, nx=True, px=int(self.timeout * 1000)))
+
+    async def release(self) -> None:
+        await self.redis.eval(RELEASE_SCRIPT, 1, self.name, self.token)
+
+
+def should_refresh_early(ttl_remaining: float, recompute_time: float, beta: float = 1.0) -> bool:
+    """Probabilistic early expiration (XFetch)
+
+    The chance of refreshing grows as the entry nears expiry and with how
+    long the value takes to rebuild, so one request usually refreshes a hot
+    key shortly before it expires instead of many at once after it expires.
+    """
+    if ttl_remaining <= 0 or recompute_time <= 0 or beta <= 0:
+        return False
+    return recompute_time * beta * -math.log(1.0 - random.random()) >= ttl_remaining
+
+
+async def wait_for_value(
+    fetch: Callable[[], Awaitable[Optional[Any]]],
+    timeout: float,
+    initial_delay: float = 0.05,
+    max_delay: float = 0.5
+) -> Optional[Any]:
+    """Poll for a value another worker is computing, with exponential backoff"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        value = await fetch()
+        if value is not None:
+            return value
+        delay = min(delay * 2, max_delay)
+    return None
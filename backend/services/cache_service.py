@@ -1,93 +1,373 @@
-from typing import Optional, Any, Callable
+from typing import Optional, Any, Callable, Dict, Iterable, Tuple
 from datetime import datetime, timedelta
+import asyncio
 import json
 import logging
+import os
+import threading
+import time
+import uuid
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-import aioredis
-import pickle
+from sqlalchemy.dialects.postgresql import insert
+from redis import Redis, asyncio as aioredis
 
+from database import SessionLocal
 from models import CacheEntry
-from services.monitoring_service import MonitoringService
+from services.cache_analytics import cache_analytics
+from services.cache_codec import CacheSerializer, CacheCodecError
+from services.cache_lock import RecomputeLock, RECOMPUTE_SUFFIX, should_refresh_early, wait_for_value
+from services.cache_tags import add_tags, pop_tagged_keys
+from services.popularity import request_popularity
+from services.local_cache import LocalCache, MISSING
+from services.monitoring_service import MonitoringService, register_local_cache
 
 logger = logging.getLogger(__name__)
 
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Process-wide L1 tier shared by every CacheService instance
+_local_cache = LocalCache(max_entries=int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000")))
+register_local_cache(_local_cache)
+
+_listener_lock = threading.Lock()
+_listener_pid: Optional[int] = None
+_worker_id: Optional[str] = None
+
+
+class CacheWriteBuffer:
+    """Write-behind buffer for the database cache tier
+
+    Writes are coalesced by key and flushed as batched upserts on a session
+    of their own, so a cache fill never waits on Postgres. The database tier
+    is a warm-restart fallback for Redis, so a failed flush is logged and
+    dropped rather than retried.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple[Any, datetime]] = {}
+        self._lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Loop time at which the scheduled task starts flushing
+        self._flush_at = 0.0
+
+    def add(self, key: str, value: Any, expires_at: datetime):
+        with self._lock:
+            self._pending[key] = (value, expires_at)
+            full = len(self._pending) >= self.batch_size
+        self._schedule(0 if full else self.flush_interval)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def _schedule(self, delay: float):
+        loop = asyncio.get_running_loop()
+        task = self._flush_task
+        # The buffer is process-wide but tasks belong to a loop; one created on a loop
+        # that has since closed (Celery run_until_complete callers) will never finish
+        if task is not None and not task.done() and task.get_loop() is loop:
+            if loop.time() + delay >= self._flush_at:
+                return
+            # A full batch shouldn't wait out the interval; the task is still sleeping
+            task.cancel()
+        self._flush_at = loop.time() + delay
+        self._flush_task = loop.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self.flush()
+        # Entries added while flushing may already make up another batch
+        while self.pending_count >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write every pending entry now"""
+        return await asyncio.to_thread(self.flush_sync)
+
+    def flush_sync(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        rows = [
+            {"key": key, "value": value, "expires_at": expires_at}
+            for key, (value, expires_at) in pending.items()
+        ]
+        db = SessionLocal()
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                stmt = insert(CacheEntry).values(rows[start:start + self.batch_size])
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=[CacheEntry.key],
+                    set_={"value": stmt.excluded.value, "expires_at": stmt.excluded.expires_at}
+                ))
+            db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Cache write-behind flush error ({len(rows)} entries dropped): {str(e)}")
+            return 0
+        finally:
+            db.close()
+
+
+# Process-wide, since CacheService instances are per request
+_write_buffer = CacheWriteBuffer(
+    batch_size=int(os.getenv("CACHE_DB_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("CACHE_DB_FLUSH_INTERVAL", "1.0"))
+)
+
+
+async def flush_cache_writes() -> int:
+    """Flush buffered database-tier writes, e.g. on shutdown"""
+    return await _write_buffer.flush()
+
+
+def _apply_invalidation(message: str, worker_id: str):
+    """Drop L1 entries named in an invalidation message from another worker"""
+    data = json.loads(message)
+    if data.get("origin") == worker_id:
+        return
+    if data["op"] == "delete":
+        _local_cache.delete(data["key"])
+    elif data["op"] == "keys":
+        for key in data["key"]:
+            _local_cache.delete(key)
+    elif data["op"] == "prefix":
+        _local_cache.delete_prefix(data["key"])
+    elif data["op"] == "clear":
+        _local_cache.clear()
+
+
+def _listen_for_invalidations(redis_url: str, worker_id: str):
+    while True:
+        try:
+            client = Redis.from_url(redis_url, decode_responses=True)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                _apply_invalidation(message["data"], worker_id)
+        except Exception as e:
+            # Messages may have been missed while disconnected
+            logger.warning(f"Cache invalidation listener error: {str(e)}")
+            _local_cache.clear()
+            time.sleep(5)
+
+
+def _ensure_invalidation_listener(redis_url: str) -> str:
+    """Start the pub/sub listener once per process (uvicorn or Celery worker) and return its id"""
+    global _listener_pid, _worker_id
+    if _listener_pid != os.getpid():
+        with _listener_lock:
+            if _listener_pid != os.getpid():
+                # Entries inherited across a fork were never subscribed to
+                _local_cache.clear()
+                _worker_id = uuid.uuid4().hex
+                threading.Thread(
+                    target=_listen_for_invalidations,
+                    args=(redis_url, _worker_id),
+                    name="cache-invalidation",
+                    daemon=True
+                ).start()
+                _listener_pid = os.getpid()
+    return _worker_id
+
+
 class CacheService:
     def __init__(
         self,
         db: Session,
         monitoring_service: MonitoringService,
-        redis_url: str = "redis://localhost:6379"
+        redis_url: str = "redis://localhost:6379",
+        local_cache: Optional[LocalCache] = None
     ):
         self.db = db
         self.monitoring_service = monitoring_service
-        self.redis = aioredis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+        self.redis_url = redis_url
+        # Values are binary (codec header + payload), so responses are not decoded
+        self.redis = aioredis.from_url(redis_url)
+        self.serializer = CacheSerializer(
+            codec=os.getenv("CACHE_CODEC", "msgpack"),
+            compress_min_bytes=int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024")),
+            compress_level=int(os.getenv("CACHE_COMPRESS_LEVEL", "3"))
+        )
+        
+        # L1 holds only small, very hot keys; its TTL is capped in case an invalidation is lost
+        self.local_cache = local_cache or _local_cache
+        self.l1_prefixes: Tuple[str, ...] = tuple(
+            p for p in os.getenv(
+                "CACHE_L1_PREFIXES",
+                "hotel_search,price_statistics,real_time_prices"
+            ).split(",") if p
+        )
+        self.l1_max_ttl = float(os.getenv("CACHE_L1_MAX_TTL", "60"))
+        
+        # Only these prefixes are persisted to cache_entries; everything else lives in Redis alone
+        self.db_prefixes: Tuple[str, ...] = tuple(
+            p for p in os.getenv("CACHE_DB_PREFIXES", "hotel_search,price_history").split(",") if p
+        )
+        self.write_buffer = _write_buffer
+        
+        # Stampede protection for get_or_set
+        self.lock_timeout = float(os.getenv("CACHE_LOCK_TIMEOUT", "30"))
+        self.lock_wait_timeout = float(os.getenv("CACHE_LOCK_WAIT_TIMEOUT", "10"))
+        self.refresh_beta = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+        
+    def _use_l1(self, key: str) -> bool:
+        return bool(self.l1_prefixes) and key.startswith(self.l1_prefixes)
+        
+    def _use_db(self, key: str) -> bool:
+        return bool(self.db_prefixes) and key.startswith(self.db_prefixes)
+        
+    async def _publish_invalidation(self, op: str, key: Optional[Any] = None, pipe=None):
+        """Tell other workers to drop their L1 copy"""
+        message = json.dumps({
+            "origin": _ensure_invalidation_listener(self.redis_url),
+            "op": op,
+            "key": key
+        })
+        if pipe is not None:
+            pipe.publish(INVALIDATION_CHANNEL, message)
+        else:
+            await self.redis.publish(INVALIDATION_CHANNEL, message)
+        
+    def _encode(self, key: str, value: Any) -> bytes:
+        data = self.serializer.dumps(value)
+        cache_analytics.record_write("redis", key, len(data))
+        return data
         
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
+        value, _ = await self._lookup(key)
+        return value
+        
+    async def _lookup(self, key: str, with_refresh: bool = False) -> Tuple[Optional[Any], bool]:
+        """Get value from cache, and with with_refresh whether it is due for an early refresh"""
+        request_popularity.add(key)
+        use_l1 = self._use_l1(key)
+        if use_l1:
+            _ensure_invalidation_listener(self.redis_url)
+            value = self.local_cache.get(key, MISSING)
+            cache_analytics.record_lookup("l1", key, value is not MISSING)
+            if value is not MISSING:
+                return value, False
+                
+        refresh = False
         try:
-            # Try Redis first
-            value = await self.redis.get(key)
-            if value:
+            # Try Redis next; PTTL rides along in the same round trip
+            started = time.perf_counter()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key).pttl(key)
+                if with_refresh:
+                    pipe.get(f"{key}{RECOMPUTE_SUFFIX}")
+                value, ttl_ms, *recompute_ms = await pipe.execute()
+            latency = time.perf_counter() - started
+            if with_refresh:
+                refresh = should_refresh_early(
+                    ttl_ms / 1000, int(recompute_ms[0] or 0) / 1000, self.refresh_beta
+                )
+            if value is not None:
+                try:
+                    value = self.serializer.loads(value)
+                except CacheCodecError as e:
+                    # Written by an older release or corrupt: drop it and fall through
+                    logger.warning(f"Discarding undecodable cache value for {key}: {str(e)}")
+                    await self.redis.delete(key)
+                    value = None
+            cache_analytics.record_lookup(
+                "redis", key, value is not None, latency, ttl_ms / 1000 if value is not None else None
+            )
+            if value is not None:
                 self.monitoring_service.track_cache_operation("get", "hit", True)
-                return pickle.loads(value.encode())
+                self.monitoring_service.track_cache_tier("redis", "hit")
+                if use_l1 and ttl_ms > 0:
+                    self.local_cache.set(key, value, min(ttl_ms / 1000, self.l1_max_ttl))
+                return value, refresh
+            self.monitoring_service.track_cache_tier("redis", "miss")
+            
+            if not self._use_db(key):
+                self.monitoring_service.track_cache_operation("get", "miss", False)
+                return None, False
                 
             # Try database
+            started = time.perf_counter()
             cache_entry = self.db.query(CacheEntry).filter(
                 CacheEntry.key == key,
                 CacheEntry.expires_at > datetime.utcnow()
             ).first()
+            cache_analytics.record_lookup(
+                "database",
+                key,
+                cache_entry is not None,
+                time.perf_counter() - started,
+                (cache_entry.expires_at - datetime.utcnow()).total_seconds() if cache_entry else None
+            )
             
             if cache_entry:
+                self.monitoring_service.track_cache_tier("database", "hit")
                 # Store in Redis for next time
                 await self.redis.set(
                     key,
-                    pickle.dumps(cache_entry.value),
+                    self._encode(key, cache_entry.value),
                     ex=int((cache_entry.expires_at - datetime.utcnow()).total_seconds())
                 )
                 self.monitoring_service.track_cache_operation("get", "hit", True)
-                return cache_entry.value
+                return cache_entry.value, False
                 
+            self.monitoring_service.track_cache_tier("database", "miss")
             self.monitoring_service.track_cache_operation("get", "miss", False)
-            return None
+            return None, False
             
         except Exception as e:
             logger.error(f"Cache get error: {str(e)}")
             self.monitoring_service.track_cache_operation("get", "error")
-            return None
+            return None, False
             
     async def set(
         self,
         key: str,
         value: Any,
-        ttl: timedelta
+        ttl: timedelta,
+        recompute_time: Optional[float] = None,
+        tags: Optional[Iterable[str]] = None
     ) -> bool:
-        """Set value in cache"""
+        """Set value in cache
+        
+        recompute_time (seconds) enables early refresh in get_or_set; tags
+        (e.g. hotel:42, city:paris) make the key removable with invalidate().
+        """
         try:
             # Store in Redis
-            await self.redis.set(
-                key,
-                pickle.dumps(value),
-                ex=int(ttl.total_seconds())
-            )
+            expire = int(ttl.total_seconds())
+            use_l1 = self._use_l1(key)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, self._encode(key, value), ex=expire)
+                if recompute_time is not None:
+                    pipe.set(f"{key}{RECOMPUTE_SUFFIX}", int(recompute_time * 1000), ex=expire)
+                if tags:
+                    add_tags(pipe, key, tags, expire)
+                if use_l1:
+                    await self._publish_invalidation("delete", key, pipe)
+                await pipe.execute()
+            if use_l1:
+                self.local_cache.set(key, value, min(ttl.total_seconds(), self.l1_max_ttl))
             
-            # Store in database
-            expires_at = datetime.utcnow() + ttl
-            cache_entry = self.db.query(CacheEntry).filter(
-                CacheEntry.key == key
-            ).first()
-            
-            if cache_entry:
-                cache_entry.value = value
-                cache_entry.expires_at = expires_at
-            else:
-                cache_entry = CacheEntry(
-                    key=key,
-                    value=value,
-                    expires_at=expires_at
-                )
-                self.db.add(cache_entry)
+            # Queue for the database tier
+            if self._use_db(key):
+                self.write_buffer.add(key, value, datetime.utcnow() + ttl)
                 
-            self.db.commit()
             self.monitoring_service.track_cache_operation("set", "success")
             return True
             
@@ -100,14 +380,19 @@ class CacheService:
         """Delete value from cache"""
         try:
             # Delete from Redis
-            await self.redis.delete(key)
+            await self.redis.delete(key, f"{key}{RECOMPUTE_SUFFIX}")
+            if self._use_l1(key):
+                self.local_cache.delete(key)
+                await self._publish_invalidation("delete", key)
             
             # Delete from database
-            self.db.query(CacheEntry).filter(
-                CacheEntry.key == key
-            ).delete()
+            if self._use_db(key):
+                self.write_buffer.discard(key)
+                self.db.query(CacheEntry).filter(
+                    CacheEntry.key == key
+                ).delete()
+                self.db.commit()
             
-            self.db.commit()
             self.monitoring_service.track_cache_operation("delete", "success")
             return True
             
@@ -116,13 +401,56 @@ class CacheService:
             self.monitoring_service.track_cache_operation("delete", "error")
             return False
             
+    async def invalidate(self, *tags: str) -> int:
+        """Delete every entry written under any of the tags"""
+        try:
+            keys = [
+                key.decode() if isinstance(key, bytes) else key
+                for key in await pop_tagged_keys(self.redis, tags)
+            ]
+            if not keys:
+                return 0
+                
+            # Delete from Redis
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for start in range(0, len(keys), 500):
+                    batch = keys[start:start + 500]
+                    pipe.unlink(*batch, *(f"{key}{RECOMPUTE_SUFFIX}" for key in batch))
+                l1_keys = [key for key in keys if self._use_l1(key)]
+                if l1_keys:
+                    await self._publish_invalidation("keys", l1_keys, pipe)
+                await pipe.execute()
+            for key in l1_keys:
+                self.local_cache.delete(key)
+                
+            # Delete from database
+            db_keys = [key for key in keys if self._use_db(key)]
+            if db_keys:
+                for key in db_keys:
+                    self.write_buffer.discard(key)
+                self.db.query(CacheEntry).filter(
+                    CacheEntry.key.in_(db_keys)
+                ).delete(synchronize_session=False)
+                self.db.commit()
+                
+            self.monitoring_service.track_cache_operation("invalidate", "success")
+            return len(keys)
+            
+        except Exception as e:
+            logger.error(f"Cache invalidate error: {str(e)}")
+            self.monitoring_service.track_cache_operation("invalidate", "error")
+            return 0
+            
     async def clear(self) -> bool:
         """Clear all cache entries"""
         try:
             # Clear Redis
             await self.redis.flushdb()
+            self.local_cache.clear()
+            await self._publish_invalidation("clear")
             
             # Clear database
+            self.write_buffer.clear()
             self.db.query(CacheEntry).delete()
             self.db.commit()
             
@@ -141,14 +469,15 @@ class CacheService:
             redis_info = await self.redis.info()
             redis_keys = await self.redis.dbsize()
             
-            # Get database stats
-            total_entries = self.db.query(CacheEntry).count()
-            expired_entries = self.db.query(CacheEntry).filter(
-                CacheEntry.expires_at <= datetime.utcnow()
-            ).count()
-            active_entries = total_entries - expired_entries
+            # Planner estimate instead of a full-table count
+            estimated_entries = self.db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+                {"table": CacheEntry.__tablename__}
+            ).scalar()
             
             return {
+                "prefixes": cache_analytics.snapshot("l1", "redis", "database"),
+                "l1": self.local_cache.stats(),
                 "redis": {
                     "keys": redis_keys,
                     "used_memory": redis_info["used_memory"],
@@ -157,9 +486,8 @@ class CacheService:
                     "uptime": redis_info["uptime_in_seconds"]
                 },
                 "database": {
-                    "total_entries": total_entries,
-                    "active_entries": active_entries,
-                    "expired_entries": expired_entries
+                    "estimated_entries": max(estimated_entries or 0, 0),
+                    "pending_writes": self.write_buffer.pending_count
                 }
             }
             
@@ -167,15 +495,25 @@ class CacheService:
             logger.error(f"Cache stats error: {str(e)}")
             return {}
             
-    async def cleanup_expired(self) -> int:
-        """Clean up expired cache entries"""
+    async def cleanup_expired(self, chunk_size: int = 1000) -> int:
+        """Clean up expired cache entries, one short transaction per chunk"""
         try:
-            # Delete expired entries from database
-            expired = self.db.query(CacheEntry).filter(
-                CacheEntry.expires_at <= datetime.utcnow()
-            ).delete()
+            now = datetime.utcnow()
+            expired = 0
+            while True:
+                ids = self.db.query(CacheEntry.id).filter(
+                    CacheEntry.expires_at <= now
+                ).limit(chunk_size).subquery()
+                deleted = self.db.query(CacheEntry).filter(
+                    CacheEntry.id.in_(ids.select())
+                ).delete(synchronize_session=False)
+                self.db.commit()
+                expired += deleted
+                if deleted < chunk_size:
+                    break
+                # Let other transactions at the table between chunks
+                await asyncio.sleep(0)
             
-            self.db.commit()
             self.monitoring_service.track_cache_operation("cleanup", "success")
             return expired
             
@@ -188,13 +526,48 @@ class CacheService:
         self,
         key: str,
         value_func: Callable[[], Any],
-        ttl: timedelta
+        ttl: timedelta,
+        tags: Optional[Iterable[str]] = None
     ) -> Any:
-        """Get value from cache or compute and store it"""
-        value = await self.get(key)
+        """Get value from cache or compute and store it
+        
+        Only one worker cluster-wide recomputes a key; concurrent callers wait
+        for its result instead of calling value_func themselves. Hot keys are
+        refreshed shortly before they expire while the current value is served.
+        """
+        value, refresh = await self._lookup(key, with_refresh=True)
+        if value is not None and not refresh:
+            return value
+            
+        lock = RecomputeLock(self.redis, key, self.lock_timeout)
+        if await lock.acquire():
+            self.monitoring_service.track_cache_operation("recompute", "early" if value is not None else "miss")
+            try:
+                return await self._recompute(key, value_func, ttl, tags)
+            finally:
+                await lock.release()
+                
+        if value is not None:
+            # Someone else is already refreshing it
+            return value
+            
+        self.monitoring_service.track_cache_operation("recompute", "wait")
+        value = await wait_for_value(lambda: self.get(key), self.lock_wait_timeout)
         if value is not None:
             return value
             
+        # The lock holder is too slow or died; compute without it
+        self.monitoring_service.track_cache_operation("recompute", "wait_timeout")
+        return await self._recompute(key, value_func, ttl, tags)
+        
+    async def _recompute(
+        self,
+        key: str,
+        value_func: Callable[[], Any],
+        ttl: timedelta,
+        tags: Optional[Iterable[str]] = None
+    ) -> Any:
+        started = time.monotonic()
         value = await value_func()
-        await self.set(key, value, ttl)
+        await self.set(key, value, ttl, recompute_time=time.monotonic() - started, tags=tags)
         return value
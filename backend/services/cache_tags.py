@@ -0,0 +1,79 @@
+from typing import Any, Iterable, List, Optional, Set
+
+# Each tag is a Redis set of the cache keys written under it
+TAG_PREFIX = "tag:"
+
+# Tag sets outlive their longest member; cleared with the set on invalidation
+MIN_TAG_TTL = 3600
+
+
+def hotel_tag(hotel_id: Any) -> str:
+    """Tag for a hotel by database id"""
+    return f"hotel:{hotel_id}"
+
+
+def provider_hotel_tag(hotel_id: Any) -> str:
+    """Tag for a hotel by the external id providers return it under"""
+    return f"provider_hotel:{hotel_id}"
+
+
+def city_tag(city: str) -> str:
+    return f"city:{city.strip().lower()}"
+
+
+def city_prices_version(city: str) -> str:
+    """Data version bumped whenever a price in the city changes"""
+    return f"prices:{city.strip().lower()}"
+
+
+def provider_tag(provider: str) -> str:
+    return f"provider:{provider.strip().lower()}"
+
+
+def hotel_result_tags(hotels: Optional[Iterable[dict]], city: Optional[str] = None) -> Set[str]:
+    """Tags for a list of provider hotel results: every hotel and provider in it, plus the city
+
+    Provider results carry the provider's hotel id, not the database id, so
+    hotels are tagged with provider_hotel_tag; price ingest invalidates both.
+    """
+    tags = {city_tag(city)} if city else set()
+    for hotel in hotels or ():
+        if not isinstance(hotel, dict):
+            continue
+        hotel_id = hotel.get("id", hotel.get("hotel_id"))
+        if hotel_id is not None:
+            tags.add(provider_hotel_tag(hotel_id))
+        if hotel.get("provider"):
+            tags.add(provider_tag(hotel["provider"]))
+    return tags
+
+
+def add_tags(pipe, key: str, tags: Iterable[str], ttl_seconds: int) -> None:
+    """Queue the commands registering key under each tag on a pipeline"""
+    tag_ttl = max(ttl_seconds, MIN_TAG_TTL)
+    for tag in tags:
+        tag_key = f"{TAG_PREFIX}{tag}"
+        pipe.sadd(tag_key, key)
+        # Give new sets a TTL, then only ever extend it (Redis 7 EXPIRE NX/GT)
+        pipe.expire(tag_key, tag_ttl, nx=True)
+        pipe.expire(tag_key, tag_ttl, gt=True)
+
+
+async def pop_tagged_keys(redis, tags: Iterable[str]) -> List[Any]:
+    """Read and delete tag sets atomically, returning every key they held
+
+    Keys that have already expired are included; unlinking them is a no-op.
+    """
+    tag_keys = [f"{TAG_PREFIX}{tag}" for tag in tags]
+    if not tag_keys:
+        return []
+    async with redis.pipeline(transaction=True) as pipe:
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        pipe.unlink(*tag_keys)
+        results = await pipe.execute()
+
+    keys = set()
+    for members in results[:-1]:
+        keys.update(members)
+    return list(keys)
@@ -0,0 +1,136 @@
+from typing import Iterator, List, Optional, Tuple
+from datetime import datetime
+import csv
+import io
+import json
+import logging
+import pyarrow as pa
+
+from database import SessionLocal
+from models import Hotel, PriceHistory
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ["hotel_id", "price", "currency", "provider", "timestamp"]
+
+EXPORT_SCHEMA = pa.schema([
+    ("hotel_id", pa.int32()),
+    ("price", pa.float64()),
+    ("currency", pa.string()),
+    ("provider", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+])
+
+# Arrow IPC end-of-stream marker: continuation token followed by a zero length
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class PriceExportService:
+    """Streams price history exports without materializing the result set
+
+    The first batch is small so bytes go out as soon as the first rows
+    arrive; later batches are batch_size rows.
+    """
+
+    def __init__(self, batch_size: int = 5000, first_batch_size: int = 100):
+        self.batch_size = batch_size
+        self.first_batch_size = first_batch_size
+
+    def iter_batches(
+        self,
+        hotel_id: Optional[int] = None,
+        city: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Iterator[List[Tuple]]:
+        """Page through price history with a server-side cursor"""
+        # The export outlives the request-scoped session, so it owns its own
+        db = SessionLocal()
+        try:
+            query = db.query(
+                PriceHistory.hotel_id,
+                PriceHistory.price,
+                PriceHistory.currency,
+                PriceHistory.provider,
+                PriceHistory.timestamp
+            )
+            if city:
+                query = query.join(Hotel, Hotel.id == PriceHistory.hotel_id).filter(Hotel.city == city)
+            if hotel_id is not None:
+                query = query.filter(PriceHistory.hotel_id == hotel_id)
+            if start:
+                query = query.filter(PriceHistory.timestamp >= start)
+            if end:
+                query = query.filter(PriceHistory.timestamp < end)
+
+            # A Core result on a server-side cursor fetches a few rows first and grows
+            # its buffer up to max_row_buffer, unlike yield_per's fixed-size fetches
+            rows = db.execute(
+                query.order_by(PriceHistory.hotel_id, PriceHistory.timestamp).statement,
+                execution_options={"stream_results": True, "max_row_buffer": self.batch_size}
+            )
+
+            batch = []
+            batch_size = self.first_batch_size
+            for row in rows:
+                batch.append(tuple(row))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+                    batch_size = self.batch_size
+            if batch:
+                yield batch
+        finally:
+            db.close()
+
+    def stream(self, export_format: str, **filters) -> Iterator[bytes]:
+        """Encode the export in the requested format, one chunk per batch"""
+        encoders = {
+            "ndjson": self._encode_ndjson,
+            "csv": self._encode_csv,
+            "arrow": self._encode_arrow,
+        }
+        return encoders[export_format](self.iter_batches(**filters))
+
+    def _encode_ndjson(self, batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+        for batch in batches:
+            yield "".join(
+                json.dumps({
+                    "hotel_id": hotel_id,
+                    "price": price,
+                    "currency": currency,
+                    "provider": provider,
+                    "timestamp": timestamp.isoformat() if timestamp else None
+                }) + "\n"
+                for hotel_id, price, currency, provider, timestamp in batch
+            ).encode()
+
+    def _encode_csv(self, batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+        # Header goes out before the query runs
+        yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+        for batch in batches:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows(
+                (hotel_id, price, currency, provider, timestamp.isoformat() if timestamp else "")
+                for hotel_id, price, currency, provider, timestamp in batch
+            )
+            yield buffer.getvalue().encode()
+
+    def _encode_arrow(self, batches: Iterator[List[Tuple]]) -> Iterator[bytes]:
+        # An IPC stream is the schema message, record batch messages and an EOS marker
+        yield EXPORT_SCHEMA.serialize().to_pybytes()
+        for batch in batches:
+            columns = list(zip(*batch))
+            record_batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, EXPORT_SCHEMA)],
+                schema=EXPORT_SCHEMA
+            )
+            yield record_batch.serialize().to_pybytes()
+        yield ARROW_EOS
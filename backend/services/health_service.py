@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable
 import psutil
 import aiohttp
 import asyncio
@@ -12,8 +12,8 @@ import socket
 logger = logging.getLogger(__name__)
 
 class HealthService:
-    def __init__(self, db_session: Session, redis_client: Redis):
-        self.db_session = db_session
+    def __init__(self, session_factory: Callable[[], Session], redis_client: Redis):
+        self.session_factory = session_factory
         self.redis_client = redis_client
         self.external_services = [
             {
@@ -32,7 +32,7 @@ class HealthService:
         """Check database connectivity and performance"""
         try:
             start_time = datetime.now()
-            self.db_session.execute(text("SELECT 1"))
+            await asyncio.to_thread(self._ping_database)
             response_time = (datetime.now() - start_time).total_seconds()
             
             return {
@@ -48,14 +48,21 @@ class HealthService:
                 "message": f"Database error: {str(e)}"
             }
 
+    def _ping_database(self):
+        db = self.session_factory()
+        try:
+            db.execute(text("SELECT 1"))
+        finally:
+            db.close()
+
     async def check_redis(self) -> Dict[str, Any]:
         """Check Redis connectivity and performance"""
         try:
             start_time = datetime.now()
-            self.redis_client.ping()
+            await asyncio.to_thread(self.redis_client.ping)
             response_time = (datetime.now() - start_time).total_seconds()
             
-            info = self.redis_client.info()
+            info = await asyncio.to_thread(self.redis_client.info)
             return {
                 "status": "healthy",
                 "response_time": response_time,
@@ -8,7 +8,10 @@ from sqlalchemy import desc
 import logging
 
 from models import Hotel, PriceHistory
+import cache
 from services.cache_service import CacheService
+from services.cache_tags import city_prices_version, hotel_tag, hotel_result_tags
+from services.ttl_policy import ttl_policy
 
 logger = logging.getLogger(__name__)
 
@@ -67,17 +70,29 @@ class HotelService:
                     hotels = [h for h in hotels if all(a in h.get("amenities", []) for a in amenities)]
                 
                 # Store in database
-                for hotel_data in hotels:
-                    await self._store_hotel(hotel_data)
+                stored = [await self._store_hotel(hotel_data) for hotel_data in hotels]
+                
+                # New prices make other cached results for these hotels stale
+                if stored:
+                    await self.cache_service.invalidate(*(hotel_tag(hotel.id) for hotel in stored))
+                    cities = {city_prices_version(hotel.city) for hotel in stored if hotel.city}
+                    await cache.cache.bump_version("prices", *cities)
                 
                 # Cache results
-                await self.cache_service.set(cache_key, hotels, ttl=timedelta(hours=1))
+                ttl = await ttl_policy.ttl(cache_key, timedelta(hours=1), city=city)
+                await self.cache_service.set(
+                    cache_key,
+                    hotels,
+                    ttl=timedelta(seconds=ttl),
+                    tags=hotel_result_tags(hotels, city) | {hotel_tag(hotel.id) for hotel in stored}
+                )
                 
                 return hotels
                 
-    async def _store_hotel(self, hotel_data: Dict[str, Any]):
+    async def _store_hotel(self, hotel_data: Dict[str, Any]) -> Hotel:
         """Store or update hotel in database"""
         hotel = self.db.query(Hotel).filter(Hotel.name == hotel_data["name"]).first()
+        observed_at = datetime.utcnow()
         
         if not hotel:
             hotel = Hotel(
@@ -85,23 +100,30 @@ class HotelService:
                 city=hotel_data["city"],
                 description=hotel_data.get("description", ""),
                 amenities=hotel_data.get("amenities", []),
-                rating=hotel_data.get("rating"),
-                current_price=hotel_data["price"]
+                rating=hotel_data.get("rating")
             )
             self.db.add(hotel)
         else:
-            hotel.current_price = hotel_data["price"]
             hotel.rating = hotel_data.get("rating", hotel.rating)
             hotel.amenities = hotel_data.get("amenities", hotel.amenities)
             
+        previous_price = hotel.current_price
+        price_applied = hotel.apply_price(hotel_data["price"], hotel_data.get("provider"), observed_at)
+            
         # Add price history
         price_history = PriceHistory(
             hotel=hotel,
-            price=hotel_data["price"]
+            price=hotel_data["price"],
+            currency=hotel_data.get("currency"),
+            provider=hotel_data.get("provider"),
+            timestamp=observed_at
         )
         self.db.add(price_history)
         
         self.db.commit()
+        if price_applied:
+            await ttl_policy.record_price(hotel.id, hotel.city, previous_price, hotel_data["price"])
+        return hotel
         
     async def get_hotel(self, hotel_id: int) -> Optional[Dict[str, Any]]:
         """Get hotel details by ID"""
@@ -148,7 +170,8 @@ class HotelService:
         ]
         
         # Cache results
-        await self.cache_service.set(cache_key, results, ttl=timedelta(minutes=30))
+        ttl = await ttl_policy.ttl(cache_key, timedelta(minutes=30), hotel_id=hotel_id)
+        await self.cache_service.set(cache_key, results, ttl=timedelta(seconds=ttl), tags=[hotel_tag(hotel_id)])
         
         return results
         
@@ -6,6 +6,20 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Served until search traffic has been recorded
+DEFAULT_POPULAR_DESTINATIONS = [
+    {"name": "New York", "country": "United States", "id": "NYC"},
+    {"name": "London", "country": "United Kingdom", "id": "LON"},
+    {"name": "Paris", "country": "France", "id": "PAR"},
+    {"name": "Tokyo", "country": "Japan", "id": "TYO"},
+    {"name": "Dubai", "country": "United Arab Emirates", "id": "DXB"},
+    {"name": "Singapore", "country": "Singapore", "id": "SIN"},
+    {"name": "Rome", "country": "Italy", "id": "ROM"},
+    {"name": "Barcelona", "country": "Spain", "id": "BCN"},
+    {"name": "Sydney", "country": "Australia", "id": "SYD"},
+    {"name": "Hong Kong", "country": "China", "id": "HKG"}
+]
+
 class LocationService:
     """Service for location search and validation"""
     
@@ -83,21 +97,23 @@ class LocationService:
             logger.error(f"Error searching cities: {str(e)}")
             return []
             
-    async def get_popular_destinations(self) -> List[Dict]:
-        """Get list of popular travel destinations"""
-        popular_cities = [
-            {"name": "New York", "country": "United States", "id": "NYC"},
-            {"name": "London", "country": "United Kingdom", "id": "LON"},
-            {"name": "Paris", "country": "France", "id": "PAR"},
-            {"name": "Tokyo", "country": "Japan", "id": "TYO"},
-            {"name": "Dubai", "country": "United Arab Emirates", "id": "DXB"},
-            {"name": "Singapore", "country": "Singapore", "id": "SIN"},
-            {"name": "Rome", "country": "Italy", "id": "ROM"},
-            {"name": "Barcelona", "country": "Spain", "id": "BCN"},
-            {"name": "Sydney", "country": "Australia", "id": "SYD"},
-            {"name": "Hong Kong", "country": "China", "id": "HKG"}
+    async def get_popular_destinations(self, limit: int = 10) -> List[Dict]:
+        """Get the most searched destinations, or a default list before there is traffic"""
+        try:
+            from services.search_warming_service import SearchWarmingService
+            top_cities = await SearchWarmingService().top_cities(limit)
+        except Exception as e:
+            logger.error(f"Error loading search traffic: {str(e)}")
+            top_cities = []
+            
+        if not top_cities:
+            return DEFAULT_POPULAR_DESTINATIONS[:limit]
+            
+        known = {city["name"].lower(): city for city in DEFAULT_POPULAR_DESTINATIONS}
+        return [
+            {**known.get(name.lower(), {"name": name}), "searches": int(searches)}
+            for name, searches in top_cities
         ]
-        return popular_cities
         
     async def get_city_details(self, city_id: str) -> Dict:
         """Get detailed information about a specific city"""
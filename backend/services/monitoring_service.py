@@ -1,6 +1,10 @@
 import logging
-from typing import Dict, Any, Optional
-from prometheus_client import Counter, Histogram, Gauge, start_http_server
+from typing import Dict, Any, Optional, Callable
+from prometheus_client import Counter, Histogram, Gauge, start_http_server, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp
+from fastapi import Request
 import psutil
 import time
 import asyncio
@@ -48,6 +52,11 @@ class MonitoringService:
             'cache_misses_total',
             'Total cache misses'
         )
+        self.cache_tier_lookups_total = Counter(
+            'cache_tier_lookups_total',
+            'Cache lookups per tier',
+            ['tier', 'result']
+        )
         
         # Business metrics
         self.hotel_searches_total = Counter(
@@ -139,6 +148,10 @@ class MonitoringService:
             else:
                 self.cache_misses_total.inc()
                 
+    def track_cache_tier(self, tier: str, result: str):
+        """Track a lookup against a single cache tier (redis, database)"""
+        self.cache_tier_lookups_total.labels(tier=tier, result=result).inc()
+        
     def track_hotel_search(self, city: str):
         """Track hotel search metrics"""
         self.hotel_searches_total.labels(city=city).inc()
@@ -204,3 +217,67 @@ class MonitoringService:
                 "disk_usage_gb": self.system_disk_usage._value.get() / (1024 ** 3)
             }
         }
+
+
+class LocalCacheCollector:
+    """Exports in-process cache counters at scrape time, keeping the hit path free of metric calls"""
+    
+    def __init__(self, local_cache, tier: str = "l1"):
+        self.local_cache = local_cache
+        self.tier = tier
+        
+    def collect(self):
+        stats = self.local_cache.stats()
+        lookups = CounterMetricFamily(
+            'cache_local_lookups',
+            'In-process cache lookups',
+            labels=['tier', 'result']
+        )
+        lookups.add_metric([self.tier, 'hit'], stats['hits'])
+        lookups.add_metric([self.tier, 'miss'], stats['misses'])
+        yield lookups
+        
+        evictions = CounterMetricFamily(
+            'cache_local_evictions',
+            'In-process cache entries evicted for space',
+            labels=['tier']
+        )
+        evictions.add_metric([self.tier], stats['evictions'])
+        yield evictions
+        
+        entries = GaugeMetricFamily(
+            'cache_local_entries',
+            'In-process cache entries',
+            labels=['tier']
+        )
+        entries.add_metric([self.tier], stats['entries'])
+        yield entries
+
+
+def register_local_cache(local_cache, tier: str = "l1"):
+    """Register an in-process cache with the default Prometheus registry"""
+    REGISTRY.register(LocalCacheCollector(local_cache, tier))
+
+
+class PrometheusMiddleware(BaseHTTPMiddleware):
+    """Records HTTP request metrics through the monitoring service"""
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        monitoring_service_factory: Callable[[], MonitoringService]
+    ):
+        super().__init__(app)
+        # Resolved on the first request so the service is created inside the running event loop
+        self.monitoring_service_factory = monitoring_service_factory
+        
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        self.monitoring_service_factory().track_http_request(
+            method=request.method,
+            endpoint=request.url.path,
+            status=response.status_code,
+            duration=time.time() - start_time
+        )
+        return response
@@ -1,13 +1,16 @@
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
+import asyncio
 import httpx
-import json
+import logging
 from datetime import datetime
 import os
 from models import User, OAuthAccount
 from database import get_db
 
+logger = logging.getLogger(__name__)
+
 class OAuthService:
     def __init__(self):
         # Google OAuth settings
@@ -20,6 +23,52 @@ class OAuthService:
         self.github_client_secret = os.getenv("GITHUB_CLIENT_SECRET")
         self.github_redirect_uri = os.getenv("GITHUB_REDIRECT_URI")
         
+        # Provider endpoints; override to point at scripts/oauth_stub_server.py locally
+        self.google_auth_url = os.getenv("GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/v2/auth")
+        self.google_token_url = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+        self.google_userinfo_url = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+        self.github_auth_url = os.getenv("GITHUB_AUTH_URL", "https://github.com/login/oauth/authorize")
+        self.github_token_url = os.getenv("GITHUB_TOKEN_URL", "https://github.com/login/oauth/access_token")
+        self.github_api_url = os.getenv("GITHUB_API_URL", "https://api.github.com")
+        
+        # One pooled client for all provider calls, kept open for the life of
+        # the process so callbacks reuse warm TLS connections
+        self.client = None
+        self.max_connections = int(os.getenv("OAUTH_HTTP_MAX_CONNECTIONS", "20"))
+        self.keepalive_timeout = float(os.getenv("OAUTH_HTTP_KEEPALIVE", "60"))
+        self.request_timeout = float(os.getenv("OAUTH_HTTP_TIMEOUT", "10"))
+        
+    def _ensure_client(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_timeout
+                ),
+                timeout=self.request_timeout
+            )
+        return self.client
+        
+    async def _request_json(self, method: str, url: str, **kwargs) -> Optional[Any]:
+        """JSON body of a provider response, or None on a non-200 status or network error"""
+        client = self._ensure_client()
+        try:
+            response = await client.request(method, url, **kwargs)
+            if response.status_code != 200:
+                logger.warning(f"OAuth provider returned {response.status_code} for {url}")
+                return None
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"OAuth provider request to {url} failed: {str(e)}")
+            return None
+            
+    async def close(self):
+        """Close the pooled provider client"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        
     async def get_google_auth_url(self) -> str:
         """Get Google OAuth authorization URL"""
         params = {
@@ -32,7 +81,7 @@ class OAuthService:
         }
         
         query_string = "&".join(f"{k}={v}" for k, v in params.items())
-        return f"https://accounts.google.com/o/oauth2/v2/auth?{query_string}"
+        return f"{self.google_auth_url}?{query_string}"
         
     async def get_github_auth_url(self) -> str:
         """Get GitHub OAuth authorization URL"""
@@ -44,7 +93,7 @@ class OAuthService:
         }
         
         query_string = "&".join(f"{k}={v}" for k, v in params.items())
-        return f"https://github.com/login/oauth/authorize?{query_string}"
+        return f"{self.github_auth_url}?{query_string}"
         
     async def handle_google_callback(
         self,
@@ -53,7 +102,6 @@ class OAuthService:
     ) -> Tuple[User, str, str]:
         """Handle Google OAuth callback"""
         # Exchange code for tokens
-        token_url = "https://oauth2.googleapis.com/token"
         token_data = {
             "client_id": self.google_client_id,
             "client_secret": self.google_client_secret,
@@ -62,32 +110,23 @@ class OAuthService:
             "grant_type": "authorization_code"
         }
         
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(token_url, data=token_data)
-            
-        if token_response.status_code != 200:
+        tokens = await self._request_json("POST", self.google_token_url, data=token_data)
+        if not tokens or "access_token" not in tokens:
             raise HTTPException(
                 status_code=400,
                 detail="Failed to get access token from Google"
             )
             
-        tokens = token_response.json()
-        
         # Get user info
-        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
         headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        user_info = await self._request_json("GET", self.google_userinfo_url, headers=headers)
         
-        async with httpx.AsyncClient() as client:
-            user_response = await client.get(user_info_url, headers=headers)
-            
-        if user_response.status_code != 200:
+        if not user_info:
             raise HTTPException(
                 status_code=400,
                 detail="Failed to get user info from Google"
             )
             
-        user_info = user_response.json()
-        
         # Create or update user
         return await self._handle_oauth_user(
             db,
@@ -106,7 +145,6 @@ class OAuthService:
     ) -> Tuple[User, str, str]:
         """Handle GitHub OAuth callback"""
         # Exchange code for access token
-        token_url = "https://github.com/login/oauth/access_token"
         token_data = {
             "client_id": self.github_client_id,
             "client_secret": self.github_client_secret,
@@ -115,37 +153,32 @@ class OAuthService:
         }
         headers = {"Accept": "application/json"}
         
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(token_url, json=token_data, headers=headers)
-            
-        if token_response.status_code != 200:
+        # GitHub reports a bad code as a 200 with an "error" field
+        tokens = await self._request_json("POST", self.github_token_url, json=token_data, headers=headers)
+        if not tokens or "access_token" not in tokens:
             raise HTTPException(
                 status_code=400,
                 detail="Failed to get access token from GitHub"
             )
             
-        tokens = token_response.json()
-        
-        # Get user info
-        user_url = "https://api.github.com/user"
+        # Get user info and emails concurrently
+        user_url = f"{self.github_api_url}/user"
         headers = {
             "Authorization": f"Bearer {tokens['access_token']}",
             "Accept": "application/json"
         }
         
-        async with httpx.AsyncClient() as client:
-            user_response = await client.get(user_url, headers=headers)
-            email_response = await client.get(f"{user_url}/emails", headers=headers)
-            
-        if user_response.status_code != 200 or email_response.status_code != 200:
+        user_info, emails = await asyncio.gather(
+            self._request_json("GET", user_url, headers=headers),
+            self._request_json("GET", f"{user_url}/emails", headers=headers)
+        )
+        
+        if user_info is None or emails is None:
             raise HTTPException(
                 status_code=400,
                 detail="Failed to get user info from GitHub"
             )
             
-        user_info = user_response.json()
-        emails = email_response.json()
-        
         # Get primary email
         primary_email = next(
             (email["email"] for email in emails if email["primary"]),
@@ -223,7 +256,7 @@ class OAuthService:
         # Generate JWT tokens
         from services.auth_service import AuthService
         auth_service = AuthService()
-        tokens = auth_service.create_tokens(user.id)
+        tokens = await auth_service.create_tokens(user.id)
         
         return user, tokens["access_token"], tokens["refresh_token"]
         
@@ -234,7 +267,6 @@ class OAuthService:
     ) -> Dict[str, str]:
         """Refresh OAuth access token"""
         if provider == "google":
-            token_url = "https://oauth2.googleapis.com/token"
             data = {
                 "client_id": self.google_client_id,
                 "client_secret": self.google_client_secret,
@@ -242,16 +274,14 @@ class OAuthService:
                 "grant_type": "refresh_token"
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(token_url, data=data)
-                
-            if response.status_code != 200:
+            tokens = await self._request_json("POST", self.google_token_url, data=data)
+            if tokens is None:
                 raise HTTPException(
                     status_code=400,
                     detail="Failed to refresh Google token"
                 )
                 
-            return response.json()
+            return tokens
             
         else:
             raise HTTPException(
@@ -0,0 +1,115 @@
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+from passlib.context import CryptContext
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes are already queued in this worker"""
+
+
+class PasswordHasher:
+    """bcrypt hashing and verification off the event loop, in a bounded thread pool
+
+    bcrypt releases the GIL while it hashes, so pool threads use separate
+    cores without the pickling and start-up cost of a process pool. At most
+    max_pending operations may be queued or running per worker; past that,
+    callers get PasswordHasherBusy at once rather than queueing behind a
+    burst of logins while the event loop keeps serving everything else.
+    """
+
+    def __init__(
+        self,
+        pwd_context: Optional[CryptContext] = None,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None
+    ):
+        self.pwd_context = pwd_context or CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.max_workers = max_workers or int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+        self.max_pending = max_pending or int(os.getenv("PASSWORD_HASH_MAX_PENDING", self.max_workers * 8))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        # Operations admitted and not yet finished or abandoned, and those on a pool thread
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        # Released here rather than on the pool thread, so a caller cancelled before
+        # its job starts (the job is then dropped from the queue) doesn't leak a slot
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.pwd_context.hash, password)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "queued": max(self._pending - self._running, 0),
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected
+            }
+
+    def collect(self):
+        stats = self.get_stats()
+        queued = GaugeMetricFamily(
+            'password_hash_queue_depth',
+            'Password hash operations waiting for a pool thread'
+        )
+        queued.add_metric([], stats['queued'])
+        yield queued
+
+        running = GaugeMetricFamily(
+            'password_hash_running',
+            'Password hash operations in progress'
+        )
+        running.add_metric([], stats['running'])
+        yield running
+
+        operations = CounterMetricFamily(
+            'password_hash_operations',
+            'Password hash operations by outcome',
+            labels=['result']
+        )
+        operations.add_metric(['completed'], stats['completed'])
+        operations.add_metric(['rejected'], stats['rejected'])
+        yield operations
+
+    def close(self) -> None:
+        """Stop accepting work; operations already submitted still finish"""
+        self._executor.shutdown(wait=False)
+
+
+# Process-wide pool shared by every AuthService
+password_hasher = PasswordHasher()
+REGISTRY.register(password_hasher)
@@ -0,0 +1,57 @@
+from typing import List
+from array import array
+import os
+import random
+import threading
+import time
+
+
+class CountMinSketch:
+    """Approximate per-key request counts in fixed memory
+
+    Counts never undercount and overcount by a small fraction of the total,
+    whatever the number of distinct keys. Every decay_interval seconds all
+    counters are halved, so the estimates follow recent popularity.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4, decay_interval: float = 300):
+        self.width = width
+        self.decay_interval = decay_interval
+        self._seeds = [random.getrandbits(32) for _ in range(depth)]
+        self._rows = [array("L", [0]) * width for _ in range(depth)]
+        self._decay_at = time.monotonic() + decay_interval
+        self._lock = threading.Lock()
+
+    def _indexes(self, item: str) -> List[int]:
+        return [hash((seed, item)) % self.width for seed in self._seeds]
+
+    def _decay(self) -> None:
+        for row in self._rows:
+            for i, count in enumerate(row):
+                if count:
+                    row[i] = count >> 1
+        self._decay_at = time.monotonic() + self.decay_interval
+
+    def add(self, item: str) -> None:
+        indexes = self._indexes(item)
+        with self._lock:
+            if time.monotonic() >= self._decay_at:
+                self._decay()
+            # Conservative update: only raise the counters at the current minimum
+            current = min(row[i] for row, i in zip(self._rows, indexes))
+            for row, i in zip(self._rows, indexes):
+                if row[i] == current:
+                    row[i] = current + 1
+
+    def estimate(self, item: str) -> int:
+        indexes = self._indexes(item)
+        with self._lock:
+            return min(row[i] for row, i in zip(self._rows, indexes))
+
+
+# Requests per cache key in this process, recorded by the cache lookups
+request_popularity = CountMinSketch(
+    width=int(os.getenv("TTL_POPULARITY_WIDTH", "2048")),
+    depth=int(os.getenv("TTL_POPULARITY_DEPTH", "4")),
+    decay_interval=float(os.getenv("TTL_POPULARITY_DECAY_INTERVAL", "300"))
+)
@@ -6,11 +6,12 @@ from sqlalchemy import func
 import pandas as pd
 import numpy as np
 from fastapi import WebSocket
-import json
 
 from models import Hotel, PriceHistory
 from services.cache_service import CacheService
+from services.cache_tags import city_tag, hotel_tag
 from services.monitoring_service import MonitoringService
+from services.ttl_policy import ttl_policy
 
 class PriceTrackingService:
     def __init__(self, db: Session, cache_service: CacheService, monitoring_service: MonitoringService):
@@ -65,11 +66,11 @@ class PriceTrackingService:
 
     async def get_real_time_prices(self, city: str) -> Optional[Dict]:
         """Get real-time prices for all hotels in a city"""
-        cache_key = f"real_time_prices_{city}"
+        cache_key = f"real_time_prices:{city}"
         cached_data = await self.cache_service.get(cache_key)
         
         if cached_data:
-            return json.loads(cached_data)
+            return cached_data
 
         try:
             # Get all hotels in the city
@@ -78,26 +79,34 @@ class PriceTrackingService:
             if not hotels:
                 return None
 
+            # Get price history for the last 30 days for every hotel in one query
+            history = (self.db.query(PriceHistory.hotel_id, PriceHistory.price, PriceHistory.timestamp)
+                     .join(Hotel, Hotel.id == PriceHistory.hotel_id)
+                     .filter(Hotel.city == city)
+                     .filter(PriceHistory.timestamp >= datetime.utcnow() - timedelta(days=30))
+                     .order_by(PriceHistory.hotel_id, PriceHistory.timestamp)
+                     .all())
+            
+            history_by_hotel: Dict[int, List] = {}
+            for row in history:
+                history_by_hotel.setdefault(row.hotel_id, []).append(row)
+
             # Get current prices and historical data
             current_prices = {}
             historical_trends = {}
             price_changes = {}
             
             for hotel in hotels:
-                # Get price history for last 30 days
-                history = (self.db.query(PriceHistory)
-                         .filter(PriceHistory.hotel_id == hotel.id)
-                         .filter(PriceHistory.date >= datetime.now() - timedelta(days=30))
-                         .order_by(PriceHistory.date)
-                         .all())
+                hotel_history = history_by_hotel.get(hotel.id)
                 
-                if history:
-                    prices = [h.price for h in history]
-                    dates = [h.date.isoformat() for h in history]
+                if hotel_history:
+                    prices = [h.price for h in hotel_history]
+                    dates = [h.timestamp.isoformat() for h in hotel_history]
                     
                     current_prices[hotel.id] = {
                         'hotel_name': hotel.name,
-                        'current_price': prices[-1],
+                        'current_price': hotel.current_price if hotel.current_price is not None else prices[-1],
+                        'provider': hotel.current_price_provider,
                         'min_price': min(prices),
                         'max_price': max(prices),
                         'avg_price': sum(prices) / len(prices)
@@ -122,8 +131,14 @@ class PriceTrackingService:
                 'updated_at': datetime.now().isoformat()
             }
 
-            # Cache for 5 minutes
-            await self.cache_service.set(cache_key, json.dumps(result), 300)
+            # 5 minutes by default, shorter for volatile, busy cities
+            ttl = await ttl_policy.ttl(cache_key, timedelta(minutes=5), city=city)
+            await self.cache_service.set(
+                cache_key,
+                result,
+                timedelta(seconds=ttl),
+                tags=[city_tag(city), *(hotel_tag(hotel.id) for hotel in hotels)]
+            )
             
             return result
 
@@ -134,8 +149,10 @@ class PriceTrackingService:
     async def get_price_statistics(self, city: str) -> Dict:
         """Get statistical analysis of hotel prices in a city"""
         try:
-            # Get all hotels in the city
-            hotels = self.db.query(Hotel).filter(Hotel.city == city).all()
+            # Latest prices are materialized on the hotel row, so one indexed query covers the city
+            hotels = (self.db.query(Hotel.current_price, Hotel.rating)
+                      .filter(Hotel.city == city)
+                      .all())
             
             if not hotels:
                 return {}
@@ -156,13 +173,8 @@ class PriceTrackingService:
 
             prices = []
             for hotel in hotels:
-                latest_price = (self.db.query(PriceHistory)
-                              .filter(PriceHistory.hotel_id == hotel.id)
-                              .order_by(PriceHistory.date.desc())
-                              .first())
-                
-                if latest_price:
-                    price = latest_price.price
+                if hotel.current_price is not None:
+                    price = hotel.current_price
                     prices.append(price)
                     
                     # Categorize by price range
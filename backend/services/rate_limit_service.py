@@ -1,15 +1,290 @@
-from fastapi import Request, HTTPException, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
-from typing import Optional, Dict, Tuple, List
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp
+from typing import Optional, Dict, Iterable, Tuple, Callable
+import asyncio
+import logging
+import os
+import math
 import time
-from redis import Redis
-from datetime import datetime
-import hashlib
-import json
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# Generic cell rate algorithm: the key holds one number, the theoretical arrival
+# time (TAT, in ms) of the next request. Each request pushes it forward by
+# period / rate; a request is refused if that would put the TAT more than one
+# period ahead of now. Uses the server clock so every worker agrees on "now".
+#
+# ARGV: rate, period (s), cost, partial. cost=0 peeks; a negative cost hands
+# unused tokens back. With partial=1 as many of the cost tokens as are
+# available are granted (used to lease tokens in bulk).
+# Returns {granted, remaining, retry_after_ms, reset_after_ms}.
+GCRA_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local period = tonumber(ARGV[2]) * 1000
+local cost = tonumber(ARGV[3])
+local partial = ARGV[4] == '1'
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+
+local interval = period / rate
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+if cost < 0 then
+    tat = math.max(tat + interval * cost, now)
+    if tat > now then
+        redis.call('SET', KEYS[1], tat, 'PX', math.ceil(tat - now))
+    else
+        redis.call('DEL', KEYS[1])
+    end
+    return {0, math.floor((now - tat + period) / interval), 0, math.ceil(tat - now)}
+end
+
+local available = math.floor((now - tat + period) / interval)
+local granted = cost
+if cost > available then
+    if not partial or available < 1 then
+        local needed = partial and 1 or cost
+        return {0, 0, math.ceil(tat + interval * needed - period - now), math.ceil(tat - now)}
+    end
+    granted = available
+end
+local new_tat = tat + interval * granted
+if granted > 0 then
+    redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+end
+return {granted, available - granted, 0, math.ceil(new_tat - now)}
+"""
+
+
+class RateLimitResult:
+    """Outcome of one rate limit check"""
+
+    def __init__(
+        self,
+        allowed: bool,
+        limit: int,
+        remaining: int,
+        retry_after: float,
+        reset_after: float,
+        granted: int = 0
+    ):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        # Seconds until a request would be allowed (0 when allowed)
+        self.retry_after = retry_after
+        # Seconds until the full limit is available again
+        self.reset_after = reset_after
+        # Tokens taken from the global budget by this call
+        self.granted = granted
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(time.time() + self.reset_after))
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class GCRALimiter:
+    """Rate limiting with one atomic Lua call per request and one Redis key per client
+
+    Allows `rate` requests per `per` seconds, including bursts of up to `rate`.
+    If Redis is unavailable requests are let through rather than refused.
+    """
+
+    KEY = "throttle:{key}"
+
+    def __init__(self, redis_client: Redis):
+        self.redis = redis_client
+        # EVALSHA, reloading the script if Redis has dropped it
+        self._script = self.redis.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, rate: int, per: int, cost: int = 1, partial: bool = False) -> RateLimitResult:
+        """Count a request (cost=0 only reads the current state)
+
+        With partial, up to cost tokens are granted, as many as are available.
+        """
+        try:
+            granted, remaining, retry_after_ms, reset_after_ms = await self._script(
+                keys=[self.KEY.format(key=key)], args=[rate, per, cost, int(partial)]
+            )
+        except Exception as e:
+            logger.warning(f"Rate limit check failed for {key}, allowing request: {str(e)}")
+            return RateLimitResult(True, rate, rate, 0, 0, granted=max(cost, 0))
+        return RateLimitResult(
+            granted > 0 or cost <= 0,
+            rate,
+            remaining,
+            retry_after_ms / 1000,
+            reset_after_ms / 1000,
+            granted=granted
+        )
+
+    async def refund(self, refunds: Iterable[Tuple[str, int, int, int]]) -> None:
+        """Hand unused tokens back, as (key, rate, per, tokens), in one pipelined round trip"""
+        refunds = [refund for refund in refunds if refund[3] > 0]
+        if not refunds:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, rate, per, tokens in refunds:
+                    await self._script(keys=[self.KEY.format(key=key)], args=[rate, per, -tokens, 0], client=pipe)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Rate limit refund failed for {len(refunds)} keys: {str(e)}")
+
+
+class _Lease:
+    """Tokens a worker holds for one client, already charged to the global budget"""
+
+    def __init__(self, rate: int, per: int):
+        self.rate = rate
+        self.per = per
+        self.tokens = 0
+        self.expires_at = 0.0
+        # Global state when the tokens were leased, for the response headers
+        self.remaining = 0
+        self.reset_at = 0.0
+
+
+class LeasedRateLimiter:
+    """Local token buckets in front of a GCRALimiter
+
+    Each worker leases a batch of tokens for a client from the global budget
+    and admits that client's requests locally until the batch runs out, so
+    Redis is consulted once per batch rather than once per request. Leases
+    shrink as the global budget runs low, down to a single token (one round
+    trip per request) near the limit and for small limits.
+
+    Tokens are charged to Redis when leased, so the global limit is never
+    exceeded. The error is one-sided: unused leased tokens are unavailable to
+    the client's requests on other workers until they are handed back. A
+    background task returns the unused tokens of expired leases in batches.
+
+    A lease is at most rate * lease_fraction / expected_workers tokens (at
+    least one), and a worker holds at most one lease's worth less the token
+    it just used. With W workers the tokens held back from a client are at
+    most W * (lease size - 1), which stays within lease_fraction of the limit
+    as long as W <= expected_workers; more workers than that widen it in
+    proportion.
+
+    A lease lasts lease_ttl seconds, or by default the limit's period, so
+    clients that send a few requests a minute still mostly skip Redis.
+    """
+
+    def __init__(
+        self,
+        limiter: GCRALimiter,
+        lease_fraction: float = 0.1,
+        lease_ttl: Optional[float] = None,
+        reconcile_interval: float = 1.0,
+        expected_workers: int = 1
+    ):
+        self.limiter = limiter
+        self.lease_fraction = lease_fraction
+        self.expected_workers = max(expected_workers, 1)
+        self.lease_ttl = lease_ttl
+        self.reconcile_interval = reconcile_interval
+        self._leases: Dict[str, _Lease] = {}
+        self._reconciler: Optional[asyncio.Task] = None
+
+    def _lease_size(self, lease: _Lease) -> int:
+        size = int(lease.rate * self.lease_fraction / self.expected_workers)
+        # Near the limit take only a share of what is left, so other workers get some
+        size = min(size, lease.remaining // 2) if lease.expires_at else size
+        # Tokens still held from an expired lease count towards the new one
+        return max(size - lease.tokens, 1)
+
+    def _result(self, lease: _Lease) -> RateLimitResult:
+        return RateLimitResult(
+            True,
+            lease.rate,
+            lease.remaining + lease.tokens,
+            0,
+            max(lease.reset_at - time.time(), 0),
+            granted=1
+        )
+
+    async def hit(self, key: str, rate: int, per: int, cost: int = 1, partial: bool = False) -> RateLimitResult:
+        if cost != 1 or partial:
+            return await self.limiter.hit(key, rate, per, cost, partial)
+        if self._reconciler is None:
+            self._reconciler = asyncio.create_task(self._reconcile_loop())
+
+        lease = self._leases.get(key)
+        if lease is None or (lease.rate, lease.per) != (rate, per):
+            lease = self._leases[key] = _Lease(rate, per)
+        if lease.tokens > 0 and time.monotonic() < lease.expires_at:
+            lease.tokens -= 1
+            return self._result(lease)
+
+        result = await self.limiter.hit(key, rate, per, cost=self._lease_size(lease), partial=True)
+        if not result.allowed:
+            return result
+        # Reconciliation may have refunded and dropped the lease while we waited;
+        # its tokens are then gone, so start from a fresh one
+        lease = self._leases.get(key)
+        if lease is None or (lease.rate, lease.per) != (rate, per):
+            lease = self._leases[key] = _Lease(rate, per)
+        lease.tokens += result.granted - 1
+        lease.expires_at = time.monotonic() + (self.lease_ttl or per)
+        lease.remaining = result.remaining
+        lease.reset_at = time.time() + result.reset_after
+        return self._result(lease)
+
+    async def reconcile(self, expired_only: bool = True) -> None:
+        """Return unused tokens of expired (or all) leases to Redis and forget those leases"""
+        now = time.monotonic()
+        done = [
+            (key, lease) for key, lease in self._leases.items()
+            if not expired_only or now >= lease.expires_at
+        ]
+        refunds = []
+        for key, lease in done:
+            del self._leases[key]
+            # Zeroed so a hit() holding this lease across an await can't spend them again
+            refunds.append((key, lease.rate, lease.per, lease.tokens))
+            lease.tokens = 0
+        await self.limiter.refund(refunds)
+
+    async def _reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Rate limit reconciliation failed: {str(e)}")
+
+    async def close(self) -> None:
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            self._reconciler = None
+        await self.reconcile(expired_only=False)
+
 
 class RateLimiter:
     def __init__(self, redis_client: Redis):
         self.redis = redis_client
+        self.limiter = GCRALimiter(redis_client)
+        # "hybrid" admits most requests from per-worker leased tokens; "redis" checks every request
+        if os.getenv("RATE_LIMIT_MODE", "hybrid") == "hybrid":
+            self.limiter = LeasedRateLimiter(
+                self.limiter,
+                lease_fraction=float(os.getenv("RATE_LIMIT_LEASE_FRACTION", "0.1")),
+                lease_ttl=float(os.getenv("RATE_LIMIT_LEASE_TTL") or 0) or None,
+                reconcile_interval=float(os.getenv("RATE_LIMIT_RECONCILE_INTERVAL", "1.0")),
+                expected_workers=int(os.getenv("RATE_LIMIT_EXPECTED_WORKERS", "4"))
+            )
         
         # Define rate limit rules
         self.rate_limits = {
@@ -35,92 +310,76 @@ class RateLimiter:
         # Get client IP
         forwarded = request.headers.get("X-Forwarded-For")
         if forwarded:
-            ip = forwarded.split(",")[0]
+            ip = forwarded.split(",")[0].strip()
         else:
             ip = request.client.host
-            
+        
         # Get user ID if authenticated
         user_id = "anonymous"
         if hasattr(request.state, "user"):
             user_id = str(request.state.user.id)
-            
+        
         # Create unique key
-        key = f"rate_limit:{limit_type}:{ip}:{user_id}"
+        key = f"{limit_type}:{ip}:{user_id}"
         return key
 
     async def is_rate_limited(self, request: Request) -> Tuple[bool, Dict]:
         """Check if request should be rate limited"""
-        path = request.url.path
-        limit_type = self.endpoint_limits.get(path, "default")
+        limit_type = self.endpoint_limits.get(request.url.path, "default")
         limit_rules = self.rate_limits[limit_type]
         
-        key = self._generate_key(request, limit_type)
-        current_time = int(time.time())
-        window_start = current_time - limit_rules["per"]
-        
-        # Use pipeline for atomic operations
-        pipe = self.redis.pipeline()
-        
-        # Remove old entries
-        pipe.zremrangebyscore(key, 0, window_start)
-        
-        # Add current request
-        pipe.zadd(key, {str(current_time): current_time})
-        
-        # Count requests in window
-        pipe.zcard(key)
-        
-        # Set expiry on the key
-        pipe.expire(key, limit_rules["per"])
-        
-        # Execute pipeline
-        _, _, request_count, _ = pipe.execute()
-        
-        # Check if limit exceeded
-        is_limited = request_count > limit_rules["rate"]
-        
-        # Calculate remaining requests and reset time
-        remaining = max(0, limit_rules["rate"] - request_count)
-        reset_time = current_time + limit_rules["per"]
-        
-        headers = {
-            "X-RateLimit-Limit": str(limit_rules["rate"]),
-            "X-RateLimit-Remaining": str(remaining),
-            "X-RateLimit-Reset": str(reset_time)
-        }
-        
-        return is_limited, headers
+        result = await self.limiter.hit(
+            self._generate_key(request, limit_type),
+            limit_rules["rate"],
+            limit_rules["per"]
+        )
+        return not result.allowed, result.headers()
 
-    def get_usage_stats(self, request: Request) -> Dict:
+    async def get_usage_stats(self, request: Request) -> Dict:
         """Get current rate limit usage statistics"""
         stats = {}
-        current_time = int(time.time())
         
         for limit_type, rules in self.rate_limits.items():
-            key = self._generate_key(request, limit_type)
-            window_start = current_time - rules["per"]
-            
-            # Get request count in current window
-            count = self.redis.zcount(key, window_start, current_time)
-            
+            result = await self.limiter.hit(
+                self._generate_key(request, limit_type),
+                rules["rate"],
+                rules["per"],
+                cost=0
+            )
             stats[limit_type] = {
                 "limit": rules["rate"],
-                "remaining": max(0, rules["rate"] - count),
-                "reset": current_time + rules["per"],
+                "remaining": result.remaining,
+                "reset": math.ceil(time.time() + result.reset_after),
                 "window_size": rules["per"]
             }
-            
+        
         return stats
 
-class RateLimitMiddleware:
-    def __init__(self, rate_limiter: RateLimiter):
+    async def close(self):
+        """Hand leased tokens back before the worker exits"""
+        if isinstance(self.limiter, LeasedRateLimiter):
+            await self.limiter.close()
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate_limiter: Optional[RateLimiter] = None,
+        rate_limiter_factory: Optional[Callable[[], RateLimiter]] = None
+    ):
+        super().__init__(app)
         self.rate_limiter = rate_limiter
+        self.rate_limiter_factory = rate_limiter_factory
 
-    async def __call__(self, request: Request, call_next):
+    async def dispatch(self, request: Request, call_next):
         # Skip rate limiting for certain paths
-        if request.url.path.startswith(("/static/", "/docs", "/redoc")):
+        if request.url.path.startswith(("/static/", "/docs", "/redoc", "/ready")):
             return await call_next(request)
-            
+        
+        # Resolve the limiter lazily so building the app opens no connections
+        if self.rate_limiter is None:
+            self.rate_limiter = self.rate_limiter_factory()
+        
         # Check rate limit
         is_limited, headers = await self.rate_limiter.is_rate_limited(request)
         
@@ -133,7 +392,7 @@ class RateLimitMiddleware:
                 },
                 headers=headers
             )
-            
+        
         # Add rate limit headers to response
         response = await call_next(request)
         response.headers.update(headers)
@@ -0,0 +1,174 @@
+from typing import Any, Dict, Iterable, Optional
+import gzip
+import hashlib
+import logging
+import os
+import time
+import brotli
+import orjson
+from fastapi import Request, Response
+from redis.asyncio import ConnectionPool, Redis
+
+from services.cache_analytics import cache_analytics
+from services.cache_tags import add_tags
+from services.popularity import request_popularity
+
+logger = logging.getLogger(__name__)
+
+# Content codings a body is stored in, in order of preference
+ENCODINGS = ("br", "gzip")
+IDENTITY = "identity"
+
+RESPONSE_KEY = "response:{key}"
+
+
+def preferred_encoding(accept_encoding: Optional[str]) -> str:
+    """Best stored content coding the client accepts (RFC 9110 Accept-Encoding)"""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return IDENTITY
+
+
+class ResponseCache:
+    """Final JSON response bodies, stored ready to send
+
+    Each entry is a Redis hash holding the encoded body, its gzip and brotli
+    variants, a content hash and when the underlying data was produced. The
+    ETag is the hash plus the content coding, so variants never share a
+    strong validator. A hit fetches
+    only the variant the client accepts and returns it as-is: no JSON parse,
+    no validation and no re-encode. Bodies under compress_min_bytes are stored
+    uncompressed under every variant.
+    """
+
+    def __init__(self, url: Optional[str] = None, max_connections: int = 50):
+        self.url = url or os.getenv('REDIS_CACHE_URL', 'redis://redis-cache:6379/1')
+        self.max_connections = int(os.getenv('REDIS_CACHE_MAX_CONNECTIONS', max_connections))
+        self.compress_min_bytes = int(os.getenv('RESPONSE_CACHE_COMPRESS_MIN_BYTES', '512'))
+        self.gzip_level = int(os.getenv('RESPONSE_CACHE_GZIP_LEVEL', '6'))
+        self.brotli_quality = int(os.getenv('RESPONSE_CACHE_BROTLI_QUALITY', '5'))
+        self._redis: Optional[Redis] = None
+
+    @property
+    def redis(self) -> Redis:
+        """Binary client (the bodies are compressed bytes) on the cache Redis"""
+        if self._redis is None:
+            pool = ConnectionPool.from_url(self.url, max_connections=self.max_connections)
+            self._redis = Redis(connection_pool=pool)
+        return self._redis
+
+    @staticmethod
+    def _etag(digest: str, encoding: str) -> str:
+        digest = digest.strip('"')
+        return f'"{digest}"' if encoding == IDENTITY else f'"{digest}-{encoding}"'
+
+    @classmethod
+    def _response(
+        cls,
+        body: bytes,
+        encoding: str,
+        digest: str,
+        stored_at: float,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        response_headers = {
+            "ETag": cls._etag(digest, encoding),
+            "Vary": "Accept-Encoding",
+            "Age": str(max(int(time.time() - stored_at), 0)),
+            **(headers or {})
+        }
+        if encoding != IDENTITY:
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=response_headers)
+
+    async def get(self, key: str, request: Request, headers: Optional[Dict[str, str]] = None) -> Optional[Response]:
+        """The cached response in the client's preferred encoding, or None on a miss"""
+        request_popularity.add(key)
+        encoding = preferred_encoding(request.headers.get("accept-encoding"))
+        started = time.perf_counter()
+        try:
+            body, compressed, etag, stored_at = await self.redis.hmget(
+                RESPONSE_KEY.format(key=key), encoding, "compressed", "etag", "stored_at"
+            )
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed for {key}: {str(e)}")
+            return None
+        cache_analytics.record_lookup("response", key, body is not None, time.perf_counter() - started)
+        if body is None:
+            return None
+        return self._response(
+            body,
+            encoding if compressed == b"1" else IDENTITY,
+            etag.decode(),
+            float(stored_at),
+            headers
+        )
+
+    def _encode(self, content: Any) -> Dict[str, bytes]:
+        body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        compressed = len(body) >= self.compress_min_bytes
+        return {
+            IDENTITY: body,
+            "gzip": gzip.compress(body, compresslevel=self.gzip_level, mtime=0) if compressed else body,
+            "br": brotli.compress(body, quality=self.brotli_quality, mode=brotli.MODE_TEXT) if compressed else body,
+            "compressed": b"1" if compressed else b"0",
+            "etag": hashlib.sha256(body).hexdigest()[:32].encode()
+        }
+
+    async def set(
+        self,
+        key: str,
+        content: Any,
+        request: Request,
+        ttl: int,
+        stored_at: Optional[float] = None,
+        tags: Optional[Iterable[str]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        """Encode content once, cache it for ttl seconds and return the response for this request
+
+        stored_at is when the data was produced (for the Age header), if not now.
+        Nothing is cached when ttl is not positive.
+        """
+        fields = self._encode(content)
+        stored_at = time.time() if stored_at is None else stored_at
+        if ttl > 0:
+            cache_key = RESPONSE_KEY.format(key=key)
+            cache_analytics.record_write("response", key, len(fields[IDENTITY]))
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.hset(cache_key, mapping={**fields, "stored_at": repr(stored_at)})
+                    pipe.expire(cache_key, ttl)
+                    if tags:
+                        add_tags(pipe, cache_key, tags, ttl)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Response cache store failed for {key}: {str(e)}")
+
+        encoding = preferred_encoding(request.headers.get("accept-encoding"))
+        if fields["compressed"] != b"1":
+            encoding = IDENTITY
+        return self._response(fields[encoding], encoding, fields["etag"].decode(), stored_at, headers)
+
+    async def close(self) -> None:
+        """Close the client and its connection pool."""
+        if self._redis is not None:
+            await self._redis.close()
+            await self._redis.connection_pool.disconnect()
+            self._redis = None
+
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,162 @@
+from typing import Dict, Optional
+from datetime import datetime, timedelta
+import os
+import logging
+from sqlalchemy.orm import Session
+from sqlalchemy import func, select, literal
+from sqlalchemy.dialects.postgresql import insert
+
+from models import PriceHistory, PriceHistoryRollup
+from services.archive_service import PriceArchiveService, month_start
+
+logger = logging.getLogger(__name__)
+
+
+def day_start(value: datetime) -> datetime:
+    """Truncate a datetime to midnight"""
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class PriceRetentionService:
+    """Downsamples price observations into hourly and daily rollups
+
+    Raw rows are kept for the hot window, then rolled up into hourly buckets.
+    Hourly buckets older than the hourly window are rolled up again into daily
+    buckets. Every bucket keeps min and max so alert back-testing stays valid.
+    Buckets are always rebuilt from complete source windows, so reruns replace
+    rather than double-count.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        archive_service: Optional[PriceArchiveService] = None
+    ):
+        self.db = db
+        self.archive_service = archive_service
+        self.raw_retention_days = int(os.getenv("PRICE_RAW_RETENTION_DAYS", "30"))
+        self.hourly_retention_days = int(os.getenv("PRICE_HOURLY_RETENTION_DAYS", "180"))
+
+    def run(self) -> Dict[str, int]:
+        """Apply the retention policy"""
+        now = datetime.utcnow()
+        raw_cutoff = day_start(now - timedelta(days=self.raw_retention_days))
+        if self.archive_service:
+            # Raw rows past the hot window move to the archive rather than being deleted.
+            # The archive works in whole months, so they stay until their month is
+            # complete: up to a month longer than PRICE_RAW_RETENTION_DAYS.
+            raw_cutoff = month_start(raw_cutoff)
+        hourly_cutoff = day_start(now - timedelta(days=self.hourly_retention_days))
+
+        return {
+            "raw_rows_rolled_up": self.rollup_raw(raw_cutoff),
+            "hourly_rows_rolled_up": self.rollup_hourly(hourly_cutoff)
+        }
+
+    def _upsert_rollups(self, rows_select) -> None:
+        stmt = insert(PriceHistoryRollup).from_select(
+            ["hotel_id", "resolution", "bucket_start", "min_price", "max_price", "avg_price", "sample_count"],
+            rows_select
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_price_history_rollup_bucket",
+            set_={
+                "min_price": stmt.excluded.min_price,
+                "max_price": stmt.excluded.max_price,
+                "avg_price": stmt.excluded.avg_price,
+                "sample_count": stmt.excluded.sample_count
+            }
+        )
+        self.db.execute(stmt)
+
+    def rollup_raw(self, cutoff: datetime) -> int:
+        """Roll raw observations older than the cutoff into hourly buckets, one day at a time"""
+        oldest = self.db.query(func.min(PriceHistory.timestamp)).scalar()
+        if not oldest or oldest >= cutoff:
+            return 0
+
+        rolled_up = 0
+        window_start = day_start(oldest)
+        while window_start < cutoff:
+            window_end = min(window_start + timedelta(days=1), cutoff)
+            window = (
+                PriceHistory.timestamp >= window_start,
+                PriceHistory.timestamp < window_end
+            )
+            try:
+                bucket = func.date_trunc("hour", PriceHistory.timestamp)
+                self._upsert_rollups(
+                    select(
+                        PriceHistory.hotel_id,
+                        literal("hour"),
+                        bucket,
+                        func.min(PriceHistory.price),
+                        func.max(PriceHistory.price),
+                        func.avg(PriceHistory.price),
+                        func.count(PriceHistory.id)
+                    )
+                    .where(*window)
+                    .group_by(PriceHistory.hotel_id, bucket)
+                )
+
+                # With an archive configured, raw rows leave Postgres through the Parquet job instead
+                if not self.archive_service:
+                    rolled_up += self.db.query(PriceHistory).filter(*window).delete(synchronize_session=False)
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"Error rolling up price history for {window_start:%Y-%m-%d}: {str(e)}")
+                return rolled_up
+
+            window_start = window_end
+
+        if self.archive_service:
+            archived = self.archive_service.archive_cold_history(cutoff)
+            rolled_up += sum(archived.values())
+
+        return rolled_up
+
+    def rollup_hourly(self, cutoff: datetime) -> int:
+        """Roll hourly buckets older than the cutoff into daily buckets, one day at a time"""
+        oldest = (
+            self.db.query(func.min(PriceHistoryRollup.bucket_start))
+            .filter(PriceHistoryRollup.resolution == "hour")
+            .scalar()
+        )
+        if not oldest or oldest >= cutoff:
+            return 0
+
+        rolled_up = 0
+        window_start = day_start(oldest)
+        while window_start < cutoff:
+            window_end = window_start + timedelta(days=1)
+            window = (
+                PriceHistoryRollup.resolution == "hour",
+                PriceHistoryRollup.bucket_start >= window_start,
+                PriceHistoryRollup.bucket_start < window_end
+            )
+            try:
+                total = func.sum(PriceHistoryRollup.sample_count)
+                self._upsert_rollups(
+                    select(
+                        PriceHistoryRollup.hotel_id,
+                        literal("day"),
+                        literal(window_start),
+                        func.min(PriceHistoryRollup.min_price),
+                        func.max(PriceHistoryRollup.max_price),
+                        func.sum(PriceHistoryRollup.avg_price * PriceHistoryRollup.sample_count) / total,
+                        total
+                    )
+                    .where(*window)
+                    .group_by(PriceHistoryRollup.hotel_id)
+                )
+                rolled_up += self.db.query(PriceHistoryRollup).filter(*window).delete(synchronize_session=False)
+                self.db.commit()
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"Error rolling up hourly prices for {window_start:%Y-%m-%d}: {str(e)}")
+                return rolled_up
+
+            window_start = window_end
+
+        return rolled_up
@@ -0,0 +1,219 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import os
+import logging
+
+import cache
+import database
+from services.aggregator import HotelAggregator
+from services.cache_lock import RecomputeLock
+from services.cache_tags import hotel_result_tags
+from services.ttl_policy import ttl_policy
+
+logger = logging.getLogger(__name__)
+
+HOTEL_SEARCH_SOFT_TTL = int(os.getenv("HOTEL_SEARCH_SOFT_TTL", "300"))
+HOTEL_SEARCH_HARD_TTL = int(os.getenv("HOTEL_SEARCH_HARD_TTL", "3600"))
+
+# Hourly sorted sets of searched (city, dates, party) combinations, and per-minute search counts
+TRAFFIC_KEY = "search_traffic:{hour}"
+LOAD_KEY = "search_load:{minute}"
+QUOTA_KEY = "warm_quota:{provider}:{day}"
+
+
+def hotel_search_key(city: str, checkin: str, checkout: str, guests: int, rooms: int) -> str:
+    return f"hotel_search:{city}:{checkin}:{checkout}:{guests}:{rooms}"
+
+
+async def fetch_hotel_search(
+    city: str,
+    checkin_date: datetime,
+    checkout_date: datetime,
+    guests: int,
+    rooms: int
+) -> List[Dict]:
+    """Fan a search out to every provider; may run after the request that started it"""
+    db = database.SessionLocal()
+    aggregator = HotelAggregator(db)
+    try:
+        return await aggregator.search_all_providers(
+            location=city,
+            check_in=checkin_date,
+            check_out=checkout_date,
+            guests=guests,
+            rooms=rooms
+        )
+    finally:
+        await aggregator.close()
+        db.close()
+
+
+class SearchWarmingService:
+    """Learns popular searches from traffic and keeps their cache entries warm
+
+    Every search is counted in an hourly sorted set. The warmer takes the top
+    combinations over the traffic window and refreshes any whose cached
+    results are close to going stale. It runs only when search load is low
+    and stays within a daily per-provider warming quota.
+    """
+
+    def __init__(self, redis_cache: Optional[cache.RedisCache] = None):
+        self.cache = redis_cache or cache.cache
+        self.window_hours = int(os.getenv("CACHE_WARM_WINDOW_HOURS", "24"))
+        self.top_n = int(os.getenv("CACHE_WARM_TOP_N", "50"))
+        # Refresh once an entry has used this fraction of its soft TTL
+        self.refresh_ahead = float(os.getenv("CACHE_WARM_REFRESH_AHEAD", "0.8"))
+        # Searches in the last five minutes above which warming is skipped
+        self.max_load = int(os.getenv("CACHE_WARM_MAX_LOAD", "300"))
+        self._recordings: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _member(city: str, checkin: str, checkout: str, guests: int, rooms: int) -> str:
+        return f"{city}|{checkin}|{checkout}|{guests}|{rooms}"
+
+    def record_search_later(self, city: str, checkin: str, checkout: str, guests: int, rooms: int):
+        """Count one search in the background, so the request doesn't wait on Redis"""
+        task = asyncio.create_task(self.record_search(city, checkin, checkout, guests, rooms))
+        self._recordings.add(task)
+        task.add_done_callback(self._recordings.discard)
+
+    async def record_search(self, city: str, checkin: str, checkout: str, guests: int, rooms: int):
+        """Count one search"""
+        now = datetime.utcnow()
+        traffic_key = TRAFFIC_KEY.format(hour=now.strftime("%Y%m%d%H"))
+        load_key = LOAD_KEY.format(minute=now.strftime("%Y%m%d%H%M"))
+        try:
+            async with self.cache.redis.pipeline(transaction=False) as pipe:
+                pipe.zincrby(traffic_key, 1, self._member(city, checkin, checkout, guests, rooms))
+                pipe.expire(traffic_key, (self.window_hours + 1) * 3600)
+                pipe.incr(load_key)
+                pipe.expire(load_key, 600)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error recording search traffic: {str(e)}")
+
+    async def top_searches(self, limit: Optional[int] = None) -> List[Tuple[Dict, float]]:
+        """Most searched combinations over the traffic window, busiest first (limit=0 for all)"""
+        now = datetime.utcnow()
+        keys = [
+            TRAFFIC_KEY.format(hour=(now - timedelta(hours=offset)).strftime("%Y%m%d%H"))
+            for offset in range(self.window_hours)
+        ]
+        ranked = await self.cache.redis.zunion(keys, withscores=True)
+        ranked.sort(key=lambda item: item[1], reverse=True)
+
+        searches = []
+        limit = self.top_n if limit is None else limit
+        for member, score in (ranked[:limit] if limit else ranked):
+            # The city is free text and may itself contain "|"
+            try:
+                city, checkin, checkout, guests, rooms = member.rsplit("|", 4)
+                guests, rooms = int(guests), int(rooms)
+            except ValueError:
+                logger.warning(f"Skipping malformed search traffic member: {member!r}")
+                continue
+            searches.append((
+                {"city": city, "checkin": checkin, "checkout": checkout, "guests": guests, "rooms": rooms},
+                score
+            ))
+        return searches
+
+    async def top_cities(self, limit: int = 10) -> List[Tuple[str, float]]:
+        """Most searched cities over the traffic window"""
+        totals: Dict[str, float] = {}
+        for search, score in await self.top_searches(limit=0):
+            totals[search["city"]] = totals.get(search["city"], 0) + score
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    async def recent_load(self, minutes: int = 5) -> int:
+        now = datetime.utcnow()
+        counts = await self.cache.redis.mget([
+            LOAD_KEY.format(minute=(now - timedelta(minutes=offset)).strftime("%Y%m%d%H%M"))
+            for offset in range(minutes)
+        ])
+        return sum(int(count) for count in counts if count)
+
+    def provider_quota(self, provider: str) -> int:
+        return int(os.getenv(f"PROVIDER_WARM_QUOTA_{provider.upper()}", "500"))
+
+    async def _reserve_quota(self, providers: Iterable[str]) -> bool:
+        """Take one call from each provider's daily warming quota, all or nothing"""
+        providers = list(providers)
+        if not providers:
+            return True
+        day = datetime.utcnow().strftime("%Y%m%d")
+        keys = [QUOTA_KEY.format(provider=provider, day=day) for provider in providers]
+        async with self.cache.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incr(key)
+                pipe.expire(key, 2 * 86400)
+            used = (await pipe.execute())[::2]
+
+        if all(count <= self.provider_quota(provider) for provider, count in zip(providers, used)):
+            return True
+        async with self.cache.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.decr(key)
+            await pipe.execute()
+        return False
+
+    async def warm(self) -> Dict[str, int]:
+        """Refresh popular searches that are about to go stale"""
+        results = {"warmed": 0, "fresh": 0, "skipped_quota": 0, "skipped_busy": 0}
+        if await self.recent_load() > self.max_load:
+            results["skipped_busy"] = 1
+            return results
+
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        db = database.SessionLocal()
+        aggregator = HotelAggregator(db)
+        try:
+            for search, _ in await self.top_searches():
+                if search["checkin"] < today:
+                    continue
+                key = hotel_search_key(**search)
+                age = await self.cache.get_age(key)
+                # Warmed searches are the most requested ones, so they get a hot key's TTL
+                soft_ttl = await ttl_policy.ttl(key, HOTEL_SEARCH_SOFT_TTL, city=search["city"], popularity=1.0)
+                if age is not None and age < soft_ttl * self.refresh_ahead:
+                    results["fresh"] += 1
+                    continue
+
+                checkin_date = datetime.strptime(search["checkin"], "%Y-%m-%d")
+                checkout_date = datetime.strptime(search["checkout"], "%Y-%m-%d")
+                needed = await aggregator.stale_providers(
+                    search["city"], checkin_date, checkout_date, search["guests"], search["rooms"]
+                )
+
+                # A request may already be refreshing it; only spend quota once we hold the lock
+                lock = RecomputeLock(self.cache.redis, key, self.cache.lock_timeout)
+                if not await lock.acquire():
+                    continue
+                try:
+                    if not await self._reserve_quota(needed):
+                        results["skipped_quota"] += 1
+                        continue
+                    hotels = await aggregator.search_all_providers(
+                        location=search["city"],
+                        check_in=checkin_date,
+                        check_out=checkout_date,
+                        guests=search["guests"],
+                        rooms=search["rooms"]
+                    )
+                    await self.cache.set_fresh(
+                        key,
+                        hotels,
+                        HOTEL_SEARCH_HARD_TTL,
+                        lambda value, city=search["city"]: hotel_result_tags(value, city)
+                    )
+                    results["warmed"] += 1
+                except Exception as e:
+                    logger.error(f"Error warming {key}: {str(e)}")
+                finally:
+                    await lock.release()
+        finally:
+            await aggregator.close()
+            db.close()
+
+        return results
@@ -0,0 +1,151 @@
+from typing import Any, Optional, Union
+from datetime import timedelta
+import logging
+import math
+import os
+import time
+
+import cache
+from services.local_cache import LocalCache, MISSING
+from services.popularity import CountMinSketch, request_popularity
+
+logger = logging.getLogger(__name__)
+
+VOLATILITY_KEY = "price_volatility:{subject}"
+
+# Fold one observed interval between price changes into the running average,
+# atomically, so concurrent ingesters for the same hotel or city don't race
+RECORD_CHANGE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local last = tonumber(redis.call('hget', KEYS[1], 'changed_at'))
+if last and now > last then
+    local observed = now - last
+    local interval = tonumber(redis.call('hget', KEYS[1], 'interval'))
+    if interval then
+        observed = ARGV[2] * observed + (1 - ARGV[2]) * interval
+    end
+    redis.call('hset', KEYS[1], 'interval', observed)
+end
+redis.call('hset', KEYS[1], 'changed_at', now)
+redis.call('expire', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class TTLPolicy:
+    """Cache TTLs from price volatility and request popularity
+
+    Ingest records every price change per hotel and per city, keeping a
+    running average of the time between changes. A key's TTL is a share of
+    that interval: a small share for keys requested often (serving them stale
+    is costly) and a larger one for rarely requested keys. The result stays
+    within min_factor..max_factor of the caller's base TTL, and is the base
+    TTL itself while nothing is known about the data's volatility.
+    """
+
+    def __init__(self, redis_cache: Optional[cache.RedisCache] = None, sketch: Optional[CountMinSketch] = None):
+        self.cache = redis_cache or cache.cache
+        self.sketch = sketch or request_popularity
+        # Requests per decay interval at which a key counts as fully hot
+        self.hot_count = int(os.getenv("TTL_HOT_COUNT", "100"))
+        self.hot_share = float(os.getenv("TTL_HOT_SHARE", "0.1"))
+        self.cold_share = float(os.getenv("TTL_COLD_SHARE", "0.5"))
+        self.min_factor = float(os.getenv("TTL_MIN_FACTOR", "0.25"))
+        self.max_factor = float(os.getenv("TTL_MAX_FACTOR", "4"))
+        # Relative price moves smaller than this are not counted as changes
+        self.change_threshold = float(os.getenv("TTL_PRICE_CHANGE_THRESHOLD", "0.01"))
+        self.smoothing = float(os.getenv("TTL_VOLATILITY_SMOOTHING", "0.3"))
+        self.volatility_retention = int(timedelta(days=30).total_seconds())
+        # Intervals are re-read from Redis at most this often per worker
+        self._intervals = LocalCache(max_entries=10000)
+        self.interval_cache_ttl = 60
+
+    @staticmethod
+    def _hotel_subject(hotel_id: Any) -> str:
+        return f"hotel:{hotel_id}"
+
+    @staticmethod
+    def _city_subject(city: str) -> str:
+        return f"city:{city.strip().lower()}"
+
+    def popularity(self, key: str) -> float:
+        """0 for unrequested keys up to 1 for hot ones, on a log scale"""
+        count = self.sketch.estimate(key)
+        return min(math.log1p(count) / math.log1p(self.hot_count), 1.0)
+
+    async def record_price(
+        self,
+        hotel_id: Any,
+        city: Optional[str],
+        previous_price: Optional[float],
+        price: Optional[float]
+    ) -> None:
+        """Note a newly ingested price; called after the hotel row is updated"""
+        if not previous_price or price is None:
+            return
+        if abs(price - previous_price) / previous_price < self.change_threshold:
+            return
+
+        subjects = [self._hotel_subject(hotel_id)]
+        if city:
+            subjects.append(self._city_subject(city))
+        try:
+            async with self.cache.redis.pipeline(transaction=False) as pipe:
+                for subject in subjects:
+                    pipe.eval(
+                        RECORD_CHANGE_SCRIPT,
+                        1,
+                        VOLATILITY_KEY.format(subject=subject),
+                        time.time(),
+                        self.smoothing,
+                        self.volatility_retention
+                    )
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error recording price volatility for hotel {hotel_id}: {str(e)}")
+
+    async def _change_interval(self, subject: str) -> Optional[float]:
+        interval = self._intervals.get(subject, MISSING)
+        if interval is not MISSING:
+            return interval
+        try:
+            value = await self.cache.redis.hget(VOLATILITY_KEY.format(subject=subject), "interval")
+        except Exception as e:
+            logger.warning(f"Error reading price volatility for {subject}: {str(e)}")
+            return None
+        interval = float(value) if value is not None else None
+        self._intervals.set(subject, interval, self.interval_cache_ttl)
+        return interval
+
+    async def ttl(
+        self,
+        key: str,
+        base_ttl: Union[int, timedelta],
+        hotel_id: Any = None,
+        city: Optional[str] = None,
+        popularity: Optional[float] = None
+    ) -> int:
+        """TTL in seconds for a key holding data about a hotel, or a whole city
+
+        popularity (0..1) overrides this worker's request count for the key,
+        for callers such as background jobs that see no requests themselves.
+        """
+        base = base_ttl.total_seconds() if isinstance(base_ttl, timedelta) else float(base_ttl)
+        if hotel_id is not None:
+            interval = await self._change_interval(self._hotel_subject(hotel_id))
+        elif city:
+            interval = await self._change_interval(self._city_subject(city))
+        else:
+            interval = None
+        if interval is None:
+            return int(base)
+
+        if popularity is None:
+            popularity = self.popularity(key)
+        share = self.cold_share - (self.cold_share - self.hot_share) * popularity
+        ttl = min(max(interval * share, base * self.min_factor), base * self.max_factor)
+        return max(int(ttl), 1)
+
+
+# Process-wide policy; request counts are per worker, volatility is shared in Redis
+ttl_policy = TTLPolicy()
@@ -3,7 +3,12 @@ from celery import Celery
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from services.aggregator import HotelAggregator
+from services.analytics_service import AnalyticsService
+from services.archive_service import PriceArchiveService
+from services.retention_service import PriceRetentionService
+from services.search_warming_service import SearchWarmingService
 from database import SessionLocal
+import cache
 from models import Hotel, PriceAlert, User
 import asyncio
 import logging
@@ -93,6 +98,70 @@ def check_price_alerts():
     finally:
         db.close()
 
+@celery.task
+def train_price_model():
+    """Retrain the price predictor on archived and recent price history"""
+    db = SessionLocal()
+    try:
+        archive_service = PriceArchiveService(db) if os.getenv('PRICE_ARCHIVE_URI') else None
+        rows = AnalyticsService(db, archive_service).train_price_model()
+        logger.info(f"Price model trained on {rows} daily prices")
+    except Exception as e:
+        logger.error(f"Error in price model training task: {str(e)}")
+    finally:
+        db.close()
+
+@celery.task
+def apply_price_retention():
+    """Downsample old price observations into hourly and daily rollups"""
+    db = SessionLocal()
+    try:
+        archive_service = PriceArchiveService(db) if os.getenv('PRICE_ARCHIVE_URI') else None
+        results = PriceRetentionService(db, archive_service).run()
+        logger.info(f"Price retention completed: {results}")
+    except Exception as e:
+        logger.error(f"Error in price retention task: {str(e)}")
+    finally:
+        db.close()
+
+async def _warm_search_cache():
+    try:
+        return await SearchWarmingService().warm()
+    finally:
+        # The pooled client belongs to this run's event loop
+        await cache.cache.close()
+
+@celery.task
+def warm_search_cache():
+    """Refresh popular hotel searches before their cached results go stale"""
+    try:
+        results = asyncio.run(_warm_search_cache())
+        logger.info(f"Search cache warming completed: {results}")
+    except Exception as e:
+        logger.error(f"Error in search cache warming task: {str(e)}")
+
+async def _flush_api_key_usage(db: Session) -> int:
+    # Imported here so a broken API key module can't stop the other tasks from loading
+    from services.api_key_service import APIKeyService
+    api_key_service = APIKeyService()
+    try:
+        return await api_key_service.flush_usage(db)
+    finally:
+        await api_key_service.redis.close()
+
+@celery.task
+def flush_api_key_usage():
+    """Move API key usage counted in Redis into the api key rows"""
+    db = SessionLocal()
+    try:
+        flushed = asyncio.run(_flush_api_key_usage(db))
+        if flushed:
+            logger.info(f"Flushed usage for {flushed} API keys")
+    except Exception as e:
+        logger.error(f"Error in API key usage flush task: {str(e)}")
+    finally:
+        db.close()
+
 # Schedule tasks
 @celery.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
@@ -109,3 +178,31 @@ def setup_periodic_tasks(sender, **kwargs):
         check_price_alerts.s(),
         name='check-price-alerts'
     )
+    
+    # Write API key usage counters to the database in batches
+    sender.add_periodic_task(
+        float(os.getenv('API_KEY_USAGE_FLUSH_INTERVAL', '60')),
+        flush_api_key_usage.s(),
+        name='flush-api-key-usage'
+    )
+    
+    # Warm popular searches; skipped while search traffic is high
+    sender.add_periodic_task(
+        120.0,
+        warm_search_cache.s(),
+        name='warm-search-cache'
+    )
+    
+    # Downsample and archive old price history once a day
+    sender.add_periodic_task(
+        86400.0,
+        apply_price_retention.s(),
+        name='apply-price-retention'
+    )
+    
+    # Retrain the price predictor once a week
+    sender.add_periodic_task(
+        604800.0,
+        train_price_model.s(),
+        name='train-price-model'
+    )
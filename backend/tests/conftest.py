@@ -0,0 +1,43 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+sys.path.insert(0, BACKEND_DIR)
+
+# models.py imports Base relatively, so load it inside the backend package and
+# register it under the flat names the services import it by
+import backend.database  # noqa: E402
+import backend.models  # noqa: E402
+
+sys.modules.setdefault("database", backend.database)
+sys.modules.setdefault("models", backend.models)
+
+
+@pytest.fixture
+def redis_server():
+    """In-memory Redis shared by every client made from it; Lua runs through lupa"""
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def make_redis(redis_server):
+    """Factory for async clients on the fake server, one per event loop"""
+    def factory(**kwargs):
+        return fakeredis.FakeAsyncRedis(server=redis_server, **kwargs)
+    return factory
+
+
+@pytest.fixture
+def make_redis_cache(make_redis):
+    """Factory for RedisCache instances on the fake server"""
+    import cache
+
+    def factory():
+        redis_cache = cache.RedisCache()
+        redis_cache._redis = make_redis(decode_responses=True)
+        return redis_cache
+    return factory
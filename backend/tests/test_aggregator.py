@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import cache
+from hotel_apis import ProviderError
+from services.aggregator import (
+    PROVIDER_EMPTY_CACHE_TTL,
+    PROVIDER_ERROR_CACHE_TTL,
+    HotelAggregator,
+    provider_calls_suppressed_total
+)
+
+CHECK_IN = datetime(2026, 11, 1)
+CHECK_OUT = datetime(2026, 11, 3)
+
+
+class FakeProvider:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    async def search_hotels(self, **kwargs):
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def aggregator(monkeypatch, make_redis_cache):
+    monkeypatch.setattr(cache, "cache", make_redis_cache())
+    aggregator = HotelAggregator(db=None)
+    aggregator.providers = {
+        "expedia": FakeProvider([{"hotel_id": "h1", "price": 120.0, "provider": "expedia"}]),
+        "booking": FakeProvider([]),
+        "hotels": FakeProvider(ProviderError("503 from upstream")),
+    }
+    return aggregator
+
+
+def suppressed(provider, reason):
+    return provider_calls_suppressed_total.labels(provider=provider, reason=reason)._value.get()
+
+
+def test_empty_and_failed_providers_are_cached_negatively(aggregator):
+    async def run():
+        first = await aggregator.search_all_providers("Paris", CHECK_IN, CHECK_OUT, 2)
+        keys = aggregator._segment_keys("Paris", CHECK_IN, CHECK_OUT, 2, 1)
+        ttls = {name: await cache.cache.redis.ttl(key) for name, key in keys.items()}
+        segments = await aggregator._get_segments(keys)
+        return first, ttls, segments
+
+    first, ttls, segments = asyncio.run(run())
+    assert first == [{"hotel_id": "h1", "price": 120.0, "provider": "expedia"}]
+    assert segments["booking"] == []
+    assert segments["hotels"] == {"error": "503 from upstream"}
+    assert 0 < ttls["hotels"] <= PROVIDER_ERROR_CACHE_TTL
+    assert PROVIDER_ERROR_CACHE_TTL < ttls["booking"] <= PROVIDER_EMPTY_CACHE_TTL
+    assert ttls["expedia"] == aggregator.provider_cache_ttl("expedia")
+
+
+def test_negative_entries_suppress_provider_calls(aggregator):
+    empty_before = suppressed("booking", "empty")
+    error_before = suppressed("hotels", "error")
+
+    async def run():
+        await aggregator.search_all_providers("Paris", CHECK_IN, CHECK_OUT, 2)
+        second = await aggregator.search_all_providers("Paris", CHECK_IN, CHECK_OUT, 2)
+        stale = await aggregator.stale_providers("Paris", CHECK_IN, CHECK_OUT, 2)
+        return second, stale
+
+    second, stale = asyncio.run(run())
+    assert [hotel["hotel_id"] for hotel in second] == ["h1"]
+    assert {name: provider.calls for name, provider in aggregator.providers.items()} == {
+        "expedia": 1, "booking": 1, "hotels": 1
+    }
+    assert stale == []
+    assert suppressed("booking", "empty") == empty_before + 1
+    assert suppressed("hotels", "error") == error_before + 1
+
+
+def test_only_expired_provider_segments_are_refetched(aggregator):
+    async def run():
+        await aggregator.search_all_providers("Paris", CHECK_IN, CHECK_OUT, 2)
+        keys = aggregator._segment_keys("Paris", CHECK_IN, CHECK_OUT, 2, 1)
+        # The error marker runs out first
+        await cache.cache.redis.delete(keys["hotels"])
+        aggregator.providers["hotels"].result = [{"hotel_id": "h1", "price": 99.0, "provider": "hotels"}]
+        return await aggregator.search_all_providers("Paris", CHECK_IN, CHECK_OUT, 2)
+
+    merged = asyncio.run(run())
+    assert merged == [{"hotel_id": "h1", "price": 99.0, "provider": "hotels"}]
+    assert [provider.calls for provider in aggregator.providers.values()] == [1, 1, 2]
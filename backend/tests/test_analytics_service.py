@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Hotel, PriceHistory, PriceHistoryRollup
+from services.analytics_service import AnalyticsService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    for model in (Hotel, PriceHistory, PriceHistoryRollup):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Hotel(id=1, name="Hotel", city="Paris"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_price_history_merges_rollups_before_raw_rows(db):
+    now = datetime.utcnow()
+    db.add_all([
+        PriceHistoryRollup(
+            hotel_id=1, resolution="day", bucket_start=now - timedelta(days=20),
+            min_price=80, max_price=140, avg_price=100, sample_count=24
+        ),
+        PriceHistoryRollup(
+            hotel_id=1, resolution="hour", bucket_start=now - timedelta(days=5),
+            min_price=110, max_price=130, avg_price=120, sample_count=4
+        ),
+        # Outside the requested window
+        PriceHistoryRollup(
+            hotel_id=1, resolution="day", bucket_start=now - timedelta(days=60),
+            min_price=10, max_price=500, avg_price=50, sample_count=24
+        ),
+        PriceHistory(hotel_id=1, price=125, currency="EUR", timestamp=now - timedelta(hours=2)),
+        PriceHistory(hotel_id=1, price=115, currency="EUR", timestamp=now - timedelta(hours=1)),
+    ])
+    db.commit()
+
+    history = AnalyticsService(db).get_price_history(1, days=30)
+
+    assert [entry["resolution"] for entry in history] == ["day", "hour", "raw", "raw"]
+    assert [entry["price"] for entry in history] == [100, 120, 125, 115]
+    assert history[0]["min_price"] == 80 and history[0]["sample_count"] == 24
+    assert history[-1]["currency"] == "EUR"
+    timestamps = [entry["timestamp"] for entry in history]
+    assert timestamps == sorted(timestamps)
+
+
+def test_trends_use_rollup_extremes(db):
+    now = datetime.utcnow()
+    db.add_all([
+        PriceHistoryRollup(
+            hotel_id=1, resolution="day", bucket_start=now - timedelta(days=20),
+            min_price=60, max_price=200, avg_price=100, sample_count=30
+        ),
+        PriceHistory(hotel_id=1, price=130, timestamp=now - timedelta(hours=1)),
+    ])
+    db.commit()
+
+    trends = AnalyticsService(db).get_price_trends(1, days=30)
+    assert trends["min_price"] == 60
+    assert trends["max_price"] == 200
+    assert trends["avg_price"] == 115
+
+
+def test_seasonal_averages_weight_rollups_by_sample_count(db):
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    db.add_all([
+        PriceHistoryRollup(
+            hotel_id=1, resolution="day", bucket_start=month_start,
+            min_price=60, max_price=200, avg_price=100, sample_count=30
+        ),
+        PriceHistory(hotel_id=1, price=130, timestamp=month_start + timedelta(minutes=30)),
+    ])
+    db.commit()
+
+    months = AnalyticsService(db).get_seasonal_analysis(1)["seasonal_patterns"]["monthly_averages"]
+    assert months == {month_start.month: pytest.approx((100 * 30 + 130) / 31)}
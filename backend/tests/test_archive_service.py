@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pyarrow as pa
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Hotel, PriceHistory
+from services.analytics_service import AnalyticsService
+from services.archive_service import PriceArchiveService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    for model in (Hotel, PriceHistory):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Hotel(id=1, name="One", city="Paris"), Hotel(id=2, name="Two", city="Rome")])
+    session.add_all([
+        PriceHistory(hotel_id=1, price=100, currency="EUR", provider="expedia", timestamp=datetime(2026, 1, 5)),
+        PriceHistory(hotel_id=2, price=200, currency="EUR", provider="booking", timestamp=datetime(2026, 1, 20)),
+        PriceHistory(hotel_id=1, price=110, currency="EUR", provider="expedia", timestamp=datetime(2026, 2, 10)),
+        PriceHistory(hotel_id=1, price=120, currency="EUR", provider="expedia", timestamp=datetime(2026, 3, 15)),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def archive(db, tmp_path):
+    return PriceArchiveService(db, archive_uri=str(tmp_path), batch_size=1)
+
+
+def parts(tmp_path, year, month):
+    return sorted(p.name for p in (tmp_path / f"year={year}" / f"month={month:02d}").iterdir())
+
+
+def test_complete_months_before_the_cutoff_move_to_parquet(db, archive, tmp_path):
+    results = archive.archive_cold_history(datetime(2026, 3, 1))
+
+    assert results == {"2026-01": 2, "2026-02": 1}
+    assert [row.timestamp for row in db.query(PriceHistory).all()] == [datetime(2026, 3, 15)]
+    assert len(parts(tmp_path, 2026, 1)) == 1
+    assert parts(tmp_path, 2026, 1)[0].startswith("part-")
+
+    table = archive.read_history()
+    assert sorted(table.column("price").to_pylist()) == [100, 110, 200]
+    assert table.column("provider").to_pylist().count("expedia") == 2
+
+
+def test_late_rows_go_to_a_new_part_file(db, archive, tmp_path):
+    archive.archive_month(datetime(2026, 1, 1))
+    db.add(PriceHistory(hotel_id=2, price=210, timestamp=datetime(2026, 1, 25)))
+    db.commit()
+
+    assert archive.archive_month(datetime(2026, 1, 1)) == 1
+    assert len(parts(tmp_path, 2026, 1)) == 2
+    assert sorted(archive.read_history().column("price").to_pylist()) == [100, 200, 210]
+    # A month with nothing left to archive leaves no file behind
+    assert archive.archive_month(datetime(2026, 1, 1)) == 0
+    assert len(parts(tmp_path, 2026, 1)) == 2
+
+
+def test_reads_project_columns_and_prune_months(archive, tmp_path):
+    archive.archive_cold_history(datetime(2026, 3, 1))
+    # Anything opened from January would fail to parse
+    (tmp_path / "year=2026" / "month=01" / "part-corrupt.parquet").write_bytes(b"not parquet")
+
+    table = archive.read_history(
+        columns=["hotel_id", "price"],
+        start=datetime(2026, 2, 1),
+        end=datetime(2026, 3, 1)
+    )
+    assert table.column_names == ["hotel_id", "price"]
+    assert table.to_pylist() == [{"hotel_id": 1, "price": 110}]
+    with pytest.raises(pa.ArrowInvalid):
+        archive.read_history(start=datetime(2026, 1, 1))
+
+
+def test_reads_filter_by_hotel(archive):
+    archive.archive_cold_history(datetime(2026, 3, 1))
+    table = archive.read_history(columns=["hotel_id", "price"], hotel_ids=[2])
+    assert table.to_pylist() == [{"hotel_id": 2, "price": 200}]
+
+
+def test_an_empty_archive_reads_as_an_empty_table(db, tmp_path):
+    archive = PriceArchiveService(db, archive_uri=str(tmp_path / "missing"))
+    assert archive.read_history(columns=["price"]).num_rows == 0
+
+
+def test_raw_price_frame_combines_archive_and_database(db, archive):
+    archive.archive_cold_history(datetime(2026, 3, 1))
+    frame = AnalyticsService(db, archive).get_raw_price_frame(hotel_ids=[1])
+    assert frame["price"].tolist() == [100, 110, 120]
+    assert frame["timestamp"].is_monotonic_increasing
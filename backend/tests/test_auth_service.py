@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+from redis import asyncio as aioredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import User
+from services.auth_service import AuthService
+from services.broadcast_cache import BroadcastCache
+from services.local_cache import LocalCache
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1))
+    session.commit()
+    yield session
+    session.close()
+
+
+def make_service(redis):
+    service = AuthService()
+    service.SECRET_KEY = "test-secret"
+    service.redis = redis
+    service.seen_token_versions = LocalCache()
+    principals = BroadcastCache("test:principals")
+    principals._redis = redis
+    # No listener thread; invalidate() still drops keys in this worker
+    principals._listener_pid = os.getpid()
+    service.principals = principals
+    return service
+
+
+def test_cached_principal_is_dropped_on_logout(make_redis, db):
+    async def run():
+        service = make_service(make_redis(decode_responses=True))
+        tokens = await service.create_tokens(1)
+        first = await service.get_current_user(tokens["access_token"], db)
+
+        # Served from the principal cache, without reading the user again
+        db.query(User).delete()
+        db.commit()
+        assert await service.get_current_user(tokens["access_token"], db) is first
+
+        await service.logout(1)
+        assert service.principals.get("1") is None
+        with pytest.raises(HTTPException) as excinfo:
+            await service.get_current_user(tokens["access_token"], db)
+        return excinfo.value
+
+    assert asyncio.run(run()).status_code == 401
+
+
+def test_revoked_token_is_rejected_after_logout(make_redis, db):
+    async def run():
+        service = make_service(make_redis(decode_responses=True))
+        old = await service.create_tokens(1)
+        await service.logout(1)
+        new = await service.create_tokens(1)
+        assert (await service.get_current_user(new["access_token"], db)).id == 1
+        with pytest.raises(HTTPException) as excinfo:
+            await service.get_current_user(old["access_token"], db)
+        return excinfo.value
+
+    assert asyncio.run(run()).status_code == 401
+
+
+def test_token_versions_fail_closed_without_redis(make_redis, db):
+    async def run():
+        service = make_service(make_redis(decode_responses=True))
+        tokens = await service.create_tokens(1)
+        # Nothing listens on port 1, so every Redis call fails
+        service.redis = aioredis.from_url("redis://127.0.0.1:1/0", decode_responses=True)
+        service.seen_token_versions = LocalCache()
+        with pytest.raises(HTTPException) as excinfo:
+            await service.get_current_user(tokens["access_token"], db)
+        return excinfo.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert error.headers["Retry-After"]
+
+
+def test_last_seen_token_version_is_used_while_redis_is_down(make_redis, db):
+    async def run():
+        service = make_service(make_redis(decode_responses=True))
+        old = await service.create_tokens(1)
+        await service.logout(1)
+        new = await service.create_tokens(1)
+        service.redis = aioredis.from_url("redis://127.0.0.1:1/0", decode_responses=True)
+        service.principals.local_cache.clear()
+
+        assert (await service.get_current_user(new["access_token"], db)).id == 1
+        service.principals.local_cache.clear()
+        with pytest.raises(HTTPException) as excinfo:
+            await service.get_current_user(old["access_token"], db)
+        return excinfo.value
+
+    assert asyncio.run(run()).status_code == 401
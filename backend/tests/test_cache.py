@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+import cache
+from services import cache_lock
+from services.cache_lock import should_refresh_early
+
+
+@pytest.mark.parametrize("draw, ttl_remaining, expected", [
+    # -log(1 - 0.5) * 2 s of recompute is about 1.4 s
+    (0.5, 1.0, True),
+    (0.5, 2.0, False),
+    # Unlucky draws refresh even far from expiry; typical ones don't
+    (0.999, 10.0, True),
+    (0.1, 10.0, False),
+])
+def test_early_refresh_grows_near_expiry(monkeypatch, draw, ttl_remaining, expected):
+    monkeypatch.setattr(cache_lock.random, "random", lambda: draw)
+    assert should_refresh_early(ttl_remaining, 2.0) is expected
+
+
+def test_early_refresh_needs_a_known_recompute_time():
+    assert not should_refresh_early(1.0, 0)
+    assert not should_refresh_early(0, 5.0)
+    assert not should_refresh_early(1.0, 5.0, beta=0)
+
+
+def test_cached_recomputes_a_missing_key_once_under_concurrency(make_redis_cache):
+    redis_cache = make_redis_cache()
+    calls = []
+
+    @redis_cache.cached(timeout=60, key_prefix="slow")
+    async def slow(city):
+        calls.append(city)
+        await asyncio.sleep(0.1)
+        return {"city": city}
+
+    async def run():
+        return await asyncio.gather(*(slow("paris") for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert results == [{"city": "paris"}] * 10
+    assert calls == ["paris"]
+
+
+def test_cached_refreshes_early_and_serves_the_old_value_meanwhile(make_redis_cache):
+    redis_cache = make_redis_cache()
+    version = {"value": 0}
+
+    @redis_cache.cached(timeout=60, key_prefix="early")
+    async def compute():
+        version["value"] += 1
+        await asyncio.sleep(0.01)
+        return version["value"]
+
+    async def run():
+        first = await compute()
+        # A large beta makes every lookup of a key with a known recompute time refresh
+        redis_cache.refresh_beta = 1e9
+        refreshed = await compute()
+        redis_cache.refresh_beta = 0
+        cached = await compute()
+        return first, refreshed, cached
+
+    assert asyncio.run(run()) == (1, 2, 2)
+
+
+def test_stale_values_are_served_while_one_refresh_runs(make_redis_cache):
+    redis_cache = make_redis_cache()
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.05)
+        return f"v{len(fetches)}"
+
+    async def run():
+        value, freshness, _ = await redis_cache.get_or_revalidate("search", fetch, soft_ttl=60, hard_ttl=600)
+        assert (value, freshness) == ("v1", cache.MISS)
+        assert (await redis_cache.get_or_revalidate("search", fetch, soft_ttl=60, hard_ttl=600))[:2] == ("v1", cache.FRESH)
+
+        # Age the entry past its soft TTL
+        await redis_cache.set("search", {"value": "v1", "stored_at": time.time() - 120}, expire=600)
+        stale = await asyncio.gather(*(
+            redis_cache.get_or_revalidate("search", fetch, soft_ttl=60, hard_ttl=600) for _ in range(5)
+        ))
+        await asyncio.gather(*redis_cache._refreshes)
+        fresh = await redis_cache.get_or_revalidate("search", fetch, soft_ttl=60, hard_ttl=600)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert all(value == "v1" and freshness == cache.STALE and age >= 120 for value, freshness, age in stale)
+    # Only one of the stale hits refreshed the entry
+    assert len(fetches) == 2
+    assert fresh[:2] == ("v2", cache.FRESH)
+
+
+def test_failed_background_refresh_keeps_serving_the_stale_value(make_redis_cache):
+    redis_cache = make_redis_cache()
+
+    async def failing():
+        raise RuntimeError("provider down")
+
+    async def run():
+        await redis_cache.set("search", {"value": "old", "stored_at": time.time() - 120}, expire=600)
+        first = await redis_cache.get_or_revalidate("search", failing, soft_ttl=60, hard_ttl=600)
+        await asyncio.gather(*redis_cache._refreshes)
+        # The lock was released, so the next stale hit tries again
+        lock_held = await redis_cache.redis.exists("lock:search")
+        second = await redis_cache.get_or_revalidate("search", failing, soft_ttl=60, hard_ttl=600)
+        await asyncio.gather(*redis_cache._refreshes)
+        return first, lock_held, second
+
+    first, lock_held, second = asyncio.run(run())
+    assert first[:2] == ("old", cache.STALE)
+    assert not lock_held
+    assert second[:2] == ("old", cache.STALE)
@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Hotel, PriceHistory
+from services import export_service
+from services.export_service import ARROW_EOS, EXPORT_COLUMNS, PriceExportService
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://")
+    for model in (Hotel, PriceHistory):
+        model.__table__.create(engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    session.add_all([Hotel(id=1, name="One", city="Paris"), Hotel(id=2, name="Two", city="Rome")])
+    session.add_all(
+        PriceHistory(
+            hotel_id=1 + i % 2,
+            price=100 + i,
+            currency="EUR",
+            provider="expedia",
+            timestamp=START + timedelta(hours=i)
+        )
+        for i in range(250)
+    )
+    session.commit()
+    session.close()
+    monkeypatch.setattr(export_service, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def exporter():
+    return PriceExportService(batch_size=1000, first_batch_size=100)
+
+
+def test_first_batch_is_small(exporter):
+    assert [len(batch) for batch in exporter.iter_batches()] == [100, 150]
+    assert [len(batch) for batch in exporter.iter_batches(city="Rome")] == [100, 25]
+
+
+def test_arrow_export_is_a_complete_ipc_stream(exporter):
+    chunks = list(exporter.stream("arrow", hotel_id=1))
+
+    assert len(chunks) == 4
+    assert chunks[-1] == ARROW_EOS
+    table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+    assert table.column_names == EXPORT_COLUMNS
+    assert table.num_rows == 125
+    assert table.column("timestamp").to_pylist()[:2] == [START, START + timedelta(hours=2)]
+
+
+def test_empty_arrow_export_still_ends_the_stream(exporter):
+    chunks = list(exporter.stream("arrow", start=START + timedelta(days=365)))
+
+    assert chunks[-1] == ARROW_EOS
+    assert pa.ipc.open_stream(b"".join(chunks)).read_all().num_rows == 0
+
+
+def test_csv_export_sends_the_header_first(exporter):
+    chunks = list(exporter.stream("csv", end=START + timedelta(hours=120)))
+
+    assert chunks[0] == b"hotel_id,price,currency,provider,timestamp\r\n"
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert len(rows) == 120
+    assert rows[0] == {
+        "hotel_id": "1",
+        "price": "100.0",
+        "currency": "EUR",
+        "provider": "expedia",
+        "timestamp": START.isoformat()
+    }
+
+
+def test_ndjson_export_is_one_object_per_line(exporter):
+    chunks = list(exporter.stream("ndjson", hotel_id=2))
+
+    assert len(chunks) == 2
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+    records = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert len(records) == 125
+    assert records[-1]["hotel_id"] == 2
+    assert records[-1]["timestamp"] == (START + timedelta(hours=249)).isoformat()
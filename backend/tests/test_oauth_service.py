@@ -0,0 +1,110 @@
+import asyncio
+import importlib.util
+import os
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import models
+
+# models has no OAuthAccount yet; only _handle_oauth_user uses it, and the tests replace that
+if not hasattr(models, "OAuthAccount"):
+    models.OAuthAccount = None
+
+from services.oauth_service import OAuthService  # noqa: E402
+
+STUB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "scripts",
+    "oauth_stub_server.py"
+)
+
+
+def load_stub():
+    spec = importlib.util.spec_from_file_location("oauth_stub_server", STUB_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run_callback(provider, latency=0.0):
+    """Run a provider callback against the stub, returning what was stored and the stub's traffic"""
+    stub = load_stub()
+    app = stub.create_app(latency)
+    hits = Counter()
+    in_flight = {"now": 0, "max": 0}
+
+    @web.middleware
+    async def track(request, handler):
+        hits[request.path] += 1
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        try:
+            return await handler(request)
+        finally:
+            in_flight["now"] -= 1
+
+    app.middlewares.insert(0, track)
+    async with TestServer(app) as server:
+        base = str(server.make_url("")).rstrip("/")
+        service = OAuthService()
+        service.google_client_id = "stub-client"
+        service.google_token_url = f"{base}/google/token"
+        service.google_userinfo_url = f"{base}/google/userinfo"
+        service.github_token_url = f"{base}/github/token"
+        service.github_api_url = f"{base}/github/api"
+
+        stored = {}
+
+        async def handle_oauth_user(db, provider, provider_user_id, email, full_name, access_token, refresh_token):
+            stored.update(provider=provider, provider_user_id=provider_user_id, email=email)
+            return None, "access", "refresh"
+
+        service._handle_oauth_user = handle_oauth_user
+        try:
+            # Ask the stub for a code the way the browser redirect would
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    f"{base}/{provider}/authorize",
+                    params={"redirect_uri": "http://app.test/callback"},
+                    allow_redirects=False
+                ) as response:
+                    code = response.headers["Location"].split("code=")[1]
+            hits.clear()
+            callback = getattr(service, f"handle_{provider}_callback")
+            await callback(code, db=None)
+        finally:
+            await service.close()
+    return stored, hits, in_flight["max"]
+
+
+def test_github_profile_and_emails_are_fetched_concurrently():
+    stored, hits, max_in_flight = asyncio.run(run_callback("github", latency=0.05))
+    assert stored == {"provider": "github", "provider_user_id": "424242", "email": "oauth.stub@example.com"}
+    assert hits["/github/api/user"] == 1
+    assert hits["/github/api/user/emails"] == 1
+    assert max_in_flight == 2
+
+
+def test_google_callback_takes_the_user_from_userinfo():
+    stored, hits, _ = asyncio.run(run_callback("google"))
+    assert stored == {"provider": "google", "provider_user_id": "424242", "email": "oauth.stub@example.com"}
+    assert hits["/google/token"] == 1
+    assert hits["/google/userinfo"] == 1
+
+
+def test_provider_calls_share_one_pooled_client():
+    async def run():
+        service = OAuthService()
+        first = service._ensure_client()
+        second = service._ensure_client()
+        await service.close()
+        third = service._ensure_client()
+        await service.close()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first is second
+    assert third is not first
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+class BlockingContext:
+    """Stands in for CryptContext; verify blocks its pool thread until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def verify(self, plain_password, hashed_password):
+        self.release.wait(5)
+        return plain_password == hashed_password
+
+    def hash(self, password):
+        return password
+
+
+@pytest.fixture
+def context():
+    return BlockingContext()
+
+
+@pytest.fixture
+def hasher(context):
+    hasher = PasswordHasher(pwd_context=context, max_workers=1, max_pending=2)
+    yield hasher
+    context.release.set()
+    hasher.close()
+
+
+async def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_rejects_past_max_pending_and_frees_slots(hasher, context):
+    async def scenario():
+        first = asyncio.create_task(hasher.verify("secret", "secret"))
+        second = asyncio.create_task(hasher.verify("secret", "other"))
+        await wait_for(lambda: hasher.get_stats()["running"] == 1)
+        assert hasher.get_stats()["queued"] == 1
+
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.verify("secret", "secret")
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.hash("secret")
+
+        context.release.set()
+        assert await first is True
+        assert await second is False
+        # Finished operations hand their slots back
+        assert await hasher.hash("secret") == "secret"
+
+    asyncio.run(scenario())
+    stats = hasher.get_stats()
+    assert stats["completed"] == 3
+    assert stats["rejected"] == 2
+    assert stats["queued"] == 0 and stats["running"] == 0
+
+
+def test_cancelled_caller_releases_its_slot(hasher, context):
+    async def scenario():
+        running = asyncio.create_task(hasher.verify("secret", "secret"))
+        queued = asyncio.create_task(hasher.verify("secret", "secret"))
+        await wait_for(lambda: hasher.get_stats()["queued"] == 1)
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        # The cancelled caller's slot is free before its job would have run
+        third = asyncio.create_task(hasher.hash("secret"))
+        await asyncio.sleep(0)
+        assert hasher.get_stats()["rejected"] == 0
+
+        context.release.set()
+        assert await running is True
+        assert await third == "secret"
+
+    asyncio.run(scenario())
+
+
+def test_metrics_report_rejections(hasher, context):
+    async def scenario():
+        tasks = [asyncio.create_task(hasher.verify("a", "a")) for _ in range(2)]
+        await wait_for(lambda: hasher.get_stats()["running"] == 1)
+        with pytest.raises(PasswordHasherBusy):
+            await hasher.verify("a", "a")
+        context.release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    samples = {
+        (sample.name, sample.labels.get("result")): sample.value
+        for family in hasher.collect()
+        for sample in family.samples
+    }
+    assert samples[("password_hash_operations_total", "rejected")] == 1
+    assert samples[("password_hash_operations_total", "completed")] == 2
+    assert samples[("password_hash_queue_depth", None)] == 0
@@ -0,0 +1,161 @@
+import asyncio
+
+from redis.asyncio import Redis
+
+from services.rate_limit_service import GCRALimiter, LeasedRateLimiter
+
+# A long period keeps the budget from refilling while a test runs
+RATE = 100
+PER = 3600
+
+
+def test_leased_limiters_sharing_a_key_stay_within_the_lease_bound(make_redis):
+    workers = 4
+    fraction = 0.2
+
+    async def run():
+        limiters = [
+            LeasedRateLimiter(GCRALimiter(make_redis()), lease_fraction=fraction, expected_workers=workers)
+            for _ in range(workers)
+        ]
+        admitted = 0
+        held = []
+        for i in range(RATE * 2):
+            result = await limiters[i % workers].hit("client", RATE, PER)
+            admitted += result.allowed
+            held.append(sum(lease.tokens for limiter in limiters for lease in limiter._leases.values()))
+        for limiter in limiters:
+            await limiter.close()
+        remaining = (await GCRALimiter(make_redis()).hit("client", RATE, PER, cost=0)).remaining
+        return admitted, held, remaining
+
+    admitted, held, remaining = asyncio.run(run())
+    # Tokens are charged before they are handed out, so the limit holds globally
+    assert admitted <= RATE
+    # Leased tokens held back from the client never exceed fraction of the limit
+    assert max(held) <= RATE * fraction
+    assert admitted >= RATE * (1 - fraction)
+    # Closing hands every unused token back
+    assert admitted + remaining == RATE
+
+
+def test_more_workers_than_expected_widen_the_bound_in_proportion(make_redis):
+    async def run():
+        limiters = [
+            LeasedRateLimiter(GCRALimiter(make_redis()), lease_fraction=0.2, expected_workers=2)
+            for _ in range(4)
+        ]
+        for limiter in limiters:
+            await limiter.hit("client", RATE, PER)
+        held = sum(lease.tokens for limiter in limiters for lease in limiter._leases.values())
+        for limiter in limiters:
+            await limiter.close()
+        return held
+
+    # Leases of 100 * 0.2 / 2 = 10 tokens, one used by each worker
+    assert asyncio.run(run()) == 4 * 9
+
+
+def test_reconcile_refunds_expired_leases_only(make_redis):
+    async def run():
+        limiter = LeasedRateLimiter(GCRALimiter(make_redis()), lease_fraction=0.1, lease_ttl=60)
+        await limiter.hit("idle", RATE, PER)
+        await limiter.hit("active", RATE, PER)
+        limiter._leases["idle"].expires_at = 0
+        await limiter.reconcile()
+        peek = GCRALimiter(make_redis())
+        idle = await peek.hit("idle", RATE, PER, cost=0)
+        active = await peek.hit("active", RATE, PER, cost=0)
+        await limiter.close()
+        return set(limiter._leases), idle.remaining, active.remaining
+
+    leases, idle_remaining, active_remaining = asyncio.run(run())
+    assert leases == set()
+    # The idle client's 9 unused tokens came back; the active client's are still leased
+    assert idle_remaining == RATE - 1
+    assert active_remaining == RATE - 10
+
+
+def test_expired_lease_tokens_count_towards_the_next_lease(make_redis):
+    async def run():
+        limiter = LeasedRateLimiter(GCRALimiter(make_redis()), lease_fraction=0.1)
+        await limiter.hit("client", RATE, PER)
+        limiter._leases["client"].expires_at = 0
+        await limiter.hit("client", RATE, PER)
+        tokens = limiter._leases["client"].tokens
+        await limiter.close()
+        return tokens
+
+    assert asyncio.run(run()) == 9
+
+
+def test_gcra_allows_a_burst_of_rate_then_refuses(make_redis):
+    async def run():
+        limiter = GCRALimiter(make_redis())
+        results = [await limiter.hit("burst", 5, 60) for _ in range(6)]
+        return results
+
+    results = asyncio.run(run())
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert [result.remaining for result in results[:5]] == [4, 3, 2, 1, 0]
+    refused = results[-1]
+    # One token comes back every period / rate = 12 s
+    assert 11 < refused.retry_after <= 12
+    assert 59 < refused.reset_after <= 60
+    assert refused.headers()["Retry-After"] == "12"
+
+
+def test_gcra_peek_does_not_spend_tokens(make_redis):
+    async def run():
+        limiter = GCRALimiter(make_redis())
+        await limiter.hit("peek", 5, 60)
+        first = await limiter.hit("peek", 5, 60, cost=0)
+        second = await limiter.hit("peek", 5, 60, cost=0)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.allowed and second.allowed
+    assert first.remaining == second.remaining == 4
+
+
+def test_gcra_partial_grants_what_is_left(make_redis):
+    async def run():
+        limiter = GCRALimiter(make_redis())
+        await limiter.hit("bulk", 10, 60, cost=7, partial=True)
+        partial = await limiter.hit("bulk", 10, 60, cost=7, partial=True)
+        exhausted = await limiter.hit("bulk", 10, 60, cost=7, partial=True)
+        whole = await GCRALimiter(make_redis()).hit("other", 10, 60, cost=11)
+        return partial, exhausted, whole
+
+    partial, exhausted, whole = asyncio.run(run())
+    assert partial.allowed and partial.granted == 3 and partial.remaining == 0
+    assert not exhausted.allowed and exhausted.granted == 0
+    # Without partial a request is all or nothing
+    assert not whole.allowed and whole.granted == 0
+
+
+def test_gcra_refunds_are_pipelined_and_capped_at_the_limit(make_redis):
+    async def run():
+        limiter = GCRALimiter(make_redis())
+        await limiter.hit("a", 10, 60, cost=6)
+        await limiter.hit("b", 10, 60, cost=6)
+        await limiter.refund([("a", 10, 60, 4), ("b", 10, 60, 20), ("c", 10, 60, 0)])
+        a = await limiter.hit("a", 10, 60, cost=0)
+        b = await limiter.hit("b", 10, 60, cost=0)
+        keys = await limiter.redis.keys("throttle:*")
+        return a, b, keys
+
+    a, b, keys = asyncio.run(run())
+    assert a.remaining == 8
+    assert b.remaining == 10
+    # A fully refunded key is deleted rather than left at "now"
+    assert keys == [b"throttle:a"]
+
+
+def test_gcra_lets_requests_through_when_redis_is_down():
+    async def run():
+        limiter = GCRALimiter(Redis.from_url("redis://127.0.0.1:1/0"))
+        return await limiter.hit("down", 5, 60)
+
+    result = asyncio.run(run())
+    assert result.allowed and result.remaining == 5
@@ -0,0 +1,88 @@
+import asyncio
+import gzip
+
+import brotli
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from middleware.http_cache import HTTPCacheMiddleware
+from services.response_cache import ResponseCache
+
+CONTENT = {"hotels": [{"id": i, "name": f"Hotel {i}", "price": 100 + i} for i in range(50)]}
+
+
+def make_request(accept_encoding=None):
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": headers})
+
+
+def test_each_content_coding_has_its_own_etag(make_redis):
+    async def run():
+        response_cache = ResponseCache()
+        response_cache._redis = make_redis()
+        await response_cache.set("search", CONTENT, make_request(), ttl=60)
+        return {
+            coding: await response_cache.get("search", make_request(coding))
+            for coding in ("br", "gzip", None)
+        }
+
+    responses = asyncio.run(run())
+    etags = {coding: response.headers["etag"] for coding, response in responses.items()}
+    assert len(set(etags.values())) == 3
+    assert etags["br"] == etags[None][:-1] + '-br"'
+    assert etags["gzip"] == etags[None][:-1] + '-gzip"'
+
+    assert responses["br"].headers["content-encoding"] == "br"
+    assert orjson.loads(brotli.decompress(responses["br"].body)) == CONTENT
+    assert orjson.loads(gzip.decompress(responses["gzip"].body)) == CONTENT
+    assert orjson.loads(responses[None].body) == CONTENT
+    assert "content-encoding" not in responses[None].headers
+
+
+def test_small_bodies_are_stored_uncompressed_under_the_identity_etag(make_redis):
+    async def run():
+        response_cache = ResponseCache()
+        response_cache._redis = make_redis()
+        stored = await response_cache.set("small", {"ok": True}, make_request("br"), ttl=60)
+        return stored, await response_cache.get("small", make_request("br"))
+
+    stored, cached = asyncio.run(run())
+    for response in (stored, cached):
+        assert "content-encoding" not in response.headers
+        assert not response.headers["etag"].endswith('-br"')
+    assert stored.headers["etag"] == cached.headers["etag"]
+
+
+def test_cached_response_answers_if_none_match_with_304(make_redis):
+    response_cache = ResponseCache()
+    calls = []
+
+    app = FastAPI()
+    app.add_middleware(HTTPCacheMiddleware)
+
+    @app.get("/api/hotels/search")
+    async def search(request: Request):
+        # The client is bound to the loop the test client runs requests on
+        response_cache._redis = make_redis()
+        cached = await response_cache.get("search", request)
+        if cached is not None:
+            return cached
+        calls.append(request)
+        return await response_cache.set("search", CONTENT, request, ttl=60)
+
+    client = TestClient(app)
+    first = client.get("/api/hotels/search", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["cache-control"].startswith("public")
+    etag = first.headers["etag"]
+
+    revalidated = client.get("/api/hotels/search", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+
+    # A validator for one coding doesn't match the body in another
+    other = client.get("/api/hotels/search", headers={"Accept-Encoding": "br", "If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["etag"] != etag
+    assert len(calls) == 1
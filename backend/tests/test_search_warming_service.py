@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime
+
+from services.search_warming_service import TRAFFIC_KEY, SearchWarmingService
+
+
+def test_searches_are_recorded_in_the_background(make_redis_cache):
+    async def run():
+        service = SearchWarmingService(make_redis_cache())
+        for _ in range(3):
+            service.record_search_later("Paris", "2026-11-01", "2026-11-03", 2, 1)
+        service.record_search_later("Rome", "2026-11-01", "2026-11-03", 2, 1)
+        # Scheduled, not yet run: the caller went on without waiting for Redis
+        assert len(service._recordings) == 4
+        assert await service.top_searches() == []
+        await asyncio.gather(*service._recordings)
+        assert not service._recordings
+        return await service.top_searches()
+
+    searches = asyncio.run(run())
+    assert [(search["city"], score) for search, score in searches] == [("Paris", 3.0), ("Rome", 1.0)]
+    assert searches[0][0] == {"city": "Paris", "checkin": "2026-11-01", "checkout": "2026-11-03", "guests": 2, "rooms": 1}
+
+
+def test_cities_containing_the_separator_survive_and_malformed_members_are_skipped(make_redis_cache):
+    async def run():
+        service = SearchWarmingService(make_redis_cache())
+        await service.record_search("A|B", "2026-11-01", "2026-11-03", 2, 1)
+        traffic_key = TRAFFIC_KEY.format(hour=datetime.utcnow().strftime("%Y%m%d%H"))
+        await service.cache.redis.zincrby(traffic_key, 5, "not-a-search")
+        return await service.top_searches()
+
+    searches = asyncio.run(run())
+    assert [search["city"] for search, _ in searches] == ["A|B"]
@@ -1,10 +1,14 @@
 import os
 import sys
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from backend.database import SessionLocal, engine, Base
+from sqlalchemy import text
+from backend import database
+from backend.database import SessionLocal, Base
 
 # Configure logging
 logging.basicConfig(
@@ -14,34 +18,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="Hotel Tracker API",
-    description="API for tracking hotel prices and managing alerts",
-    version="1.0.0"
-)
+router = APIRouter()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def initialize_database():
+    """Connect to the database and create tables without blocking the event loop."""
+    engine = await asyncio.to_thread(database.get_engine)
+    await asyncio.to_thread(Base.metadata.create_all, bind=engine)
+    logger.info("Database tables created successfully")
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup."""
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start serving immediately and connect to the database in the background."""
+    app.state.db_init = asyncio.create_task(initialize_database())
     try:
-        # Create database tables
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully")
-    except Exception as e:
-        logger.error(f"Failed to create database tables: {e}")
-        sys.exit(1)
+        yield
+    finally:
+        app.state.db_init.cancel()
+        await asyncio.to_thread(database.dispose_engine)
+
+def create_app() -> FastAPI:
+    """Build the FastAPI application."""
+    app = FastAPI(
+        title="Hotel Tracker API",
+        description="API for tracking hotel prices and managing alerts",
+        version="1.0.0",
+        lifespan=lifespan
+    )
 
-@app.get("/")
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.include_router(router)
+    return app
+
+@router.get("/")
 async def root():
     """Root endpoint with API information."""
     return JSONResponse({
@@ -50,19 +66,31 @@ async def root():
         "description": "API for tracking hotel prices and managing alerts",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "docs": "/docs",
             "openapi": "/openapi.json"
         }
     })
 
-@app.get("/health")
+def _check_database():
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+
+@router.get("/health")
 async def health_check():
     """Health check endpoint that verifies database connection."""
+    if not database.is_engine_ready():
+        return {
+            "status": "starting",
+            "version": "1.0.0",
+            "database": "connecting"
+        }
     try:
         # Verify database connection
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
+        await asyncio.to_thread(_check_database)
         return {
             "status": "healthy",
             "version": "1.0.0",
@@ -75,3 +103,16 @@ async def health_check():
             "version": "1.0.0",
             "database": str(e)
         }
+
+@router.get("/ready")
+async def readiness_check(request: Request):
+    """Readiness endpoint: 200 once the database is connected and migrated, 503 before."""
+    db_init = request.app.state.db_init
+    if not db_init.done():
+        return JSONResponse(status_code=503, content={"status": "starting", "database": "connecting"})
+    if db_init.cancelled() or db_init.exception():
+        error = "cancelled" if db_init.cancelled() else str(db_init.exception())
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": error})
+    return {"status": "ready", "database": "connected"}
+
+app = create_app()
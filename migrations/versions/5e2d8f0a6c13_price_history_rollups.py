@@ -0,0 +1,40 @@
+"""Add price history rollups
+
+Revision ID: 5e2d8f0a6c13
+Revises: a3c91e7d2b40
+Create Date: 2026-10-19 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2d8f0a6c13'
+down_revision = 'a3c91e7d2b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: create_all at startup already creates the table on fresh databases
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_history_rollups (
+            id SERIAL PRIMARY KEY,
+            hotel_id INTEGER NOT NULL REFERENCES hotels (id),
+            resolution VARCHAR NOT NULL,
+            bucket_start TIMESTAMP NOT NULL,
+            min_price FLOAT NOT NULL,
+            max_price FLOAT NOT NULL,
+            avg_price FLOAT NOT NULL,
+            sample_count INTEGER NOT NULL,
+            CONSTRAINT uq_price_history_rollup_bucket UNIQUE (hotel_id, resolution, bucket_start)
+        )
+        """
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_price_history_rollups_id ON price_history_rollups (id)")
+
+
+def downgrade() -> None:
+    op.drop_table("price_history_rollups")
@@ -0,0 +1,52 @@
+"""Materialize the latest hotel price
+
+Revision ID: a3c91e7d2b40
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e7d2b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # IF NOT EXISTS: create_all at startup already adds these on fresh databases
+    op.execute("ALTER TABLE hotels ADD COLUMN IF NOT EXISTS current_price_at TIMESTAMP")
+    op.execute("ALTER TABLE hotels ADD COLUMN IF NOT EXISTS current_price_provider VARCHAR")
+    op.execute("ALTER TABLE price_history ADD COLUMN IF NOT EXISTS currency VARCHAR")
+    op.execute("ALTER TABLE price_history ADD COLUMN IF NOT EXISTS provider VARCHAR")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_hotels_city_current_price ON hotels (city, current_price)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_price_history_hotel_timestamp ON price_history (hotel_id, timestamp)")
+
+    # Backfill latest prices from existing history
+    op.execute(
+        """
+        UPDATE hotels h
+        SET current_price = latest.price,
+            current_price_at = latest.timestamp,
+            current_price_provider = latest.provider
+        FROM (
+            SELECT DISTINCT ON (hotel_id) hotel_id, price, timestamp, provider
+            FROM price_history
+            ORDER BY hotel_id, timestamp DESC
+        ) latest
+        WHERE h.id = latest.hotel_id
+          AND (h.current_price_at IS NULL OR h.current_price_at < latest.timestamp)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_price_history_hotel_timestamp", table_name="price_history")
+    op.drop_index("ix_hotels_city_current_price", table_name="hotels")
+    op.drop_column("price_history", "provider")
+    op.drop_column("price_history", "currency")
+    op.drop_column("hotels", "current_price_provider")
+    op.drop_column("hotels", "current_price_at")
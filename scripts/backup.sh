@@ -27,6 +27,13 @@ echo "Uploading backups to S3..."
 aws s3 cp ${BACKUP_DIR}/${BACKUP_NAME}.dump s3://${BACKUP_S3_BUCKET}/database/
 aws s3 cp ${BACKUP_DIR}/${BACKUP_NAME}_logs.tar.gz s3://${BACKUP_S3_BUCKET}/logs/
 
+# Sync the price history archive (Parquet files are immutable, so this is incremental)
+PRICE_ARCHIVE_DIR=${PRICE_ARCHIVE_URI:-/var/lib/hoteltracker/archive/price_history}
+if [ -d "${PRICE_ARCHIVE_DIR}" ]; then
+    echo "Syncing price history archive to S3..."
+    aws s3 sync ${PRICE_ARCHIVE_DIR} s3://${BACKUP_S3_BUCKET}/archive/price_history/
+fi
+
 # Clean up old backups (keep last 7 days)
 echo "Cleaning up old backups..."
 find ${BACKUP_DIR} -type f -mtime +7 -delete
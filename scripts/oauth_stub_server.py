@@ -0,0 +1,127 @@
+"""Local stand-in for the Google and GitHub OAuth endpoints
+
+Lets the OAuth login flow run end to end without real provider accounts.
+Start it, then point the backend at it:
+
+    python scripts/oauth_stub_server.py --port 8765 --latency 0.05
+
+    GOOGLE_CLIENT_ID=stub-client
+    GOOGLE_AUTH_URL=http://localhost:8765/google/authorize
+    GOOGLE_TOKEN_URL=http://localhost:8765/google/token
+    GOOGLE_USERINFO_URL=http://localhost:8765/google/userinfo
+    GITHUB_AUTH_URL=http://localhost:8765/github/authorize
+    GITHUB_TOKEN_URL=http://localhost:8765/github/token
+    GITHUB_API_URL=http://localhost:8765/github/api
+
+The authorize endpoints redirect straight back to redirect_uri with a code.
+--latency delays every response, to see the effect of connection reuse and
+of concurrent provider calls. Request counts per path are logged on exit.
+"""
+import argparse
+import asyncio
+import secrets
+from collections import Counter
+from aiohttp import web
+
+USER = {
+    "id": 424242,
+    "email": "oauth.stub@example.com",
+    "name": "OAuth Stub"
+}
+
+
+def create_app(latency: float = 0.0) -> web.Application:
+    codes = set()
+    access_tokens = set()
+    hits = Counter()
+
+    @web.middleware
+    async def simulate(request, handler):
+        hits[request.path] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return await handler(request)
+
+    async def authorize(request):
+        code = secrets.token_urlsafe(16)
+        codes.add(code)
+        location = f"{request.query['redirect_uri']}?code={code}"
+        if "state" in request.query:
+            location += f"&state={request.query['state']}"
+        raise web.HTTPFound(location)
+
+    def issue_token(code):
+        if code not in codes:
+            return None
+        codes.discard(code)
+        token = secrets.token_urlsafe(24)
+        access_tokens.add(token)
+        return token
+
+    def authorized(request):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or token not in access_tokens:
+            raise web.HTTPUnauthorized()
+
+    async def google_token(request):
+        form = await request.post()
+        if form.get("grant_type") == "refresh_token":
+            token = secrets.token_urlsafe(24)
+            access_tokens.add(token)
+            return web.json_response({"access_token": token, "expires_in": 3600, "token_type": "Bearer"})
+        token = issue_token(form.get("code"))
+        if token is None:
+            return web.json_response({"error": "invalid_grant"}, status=400)
+        return web.json_response({
+            "access_token": token,
+            "refresh_token": secrets.token_urlsafe(24),
+            "expires_in": 3600,
+            "token_type": "Bearer"
+        })
+
+    async def google_userinfo(request):
+        authorized(request)
+        return web.json_response({"id": str(USER["id"]), "email": USER["email"], "name": USER["name"]})
+
+    async def github_token(request):
+        data = await request.json()
+        token = issue_token(data.get("code"))
+        if token is None:
+            # GitHub answers a bad code with 200 and an error field
+            return web.json_response({"error": "bad_verification_code"})
+        return web.json_response({"access_token": token, "token_type": "bearer", "scope": "read:user,user:email"})
+
+    async def github_user(request):
+        authorized(request)
+        return web.json_response({"id": USER["id"], "login": "oauth-stub", "name": USER["name"]})
+
+    async def github_emails(request):
+        authorized(request)
+        return web.json_response([
+            {"email": USER["email"], "primary": True, "verified": True},
+            {"email": "other@example.com", "primary": False, "verified": True}
+        ])
+
+    async def report(app):
+        for path, count in sorted(hits.items()):
+            print(f"{count:6d}  {path}")
+
+    app = web.Application(middlewares=[simulate])
+    app.router.add_get("/google/authorize", authorize)
+    app.router.add_post("/google/token", google_token)
+    app.router.add_get("/google/userinfo", google_userinfo)
+    app.router.add_get("/github/authorize", authorize)
+    app.router.add_post("/github/token", github_token)
+    app.router.add_get("/github/api/user", github_user)
+    app.router.add_get("/github/api/user/emails", github_emails)
+    app.on_cleanup.append(report)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency), host=args.host, port=args.port)